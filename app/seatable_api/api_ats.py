@@ -3,7 +3,7 @@ import logging
 from typing import List, Dict
 
 from config import Config
-from app.seatable_api.api_base import fetch_table, get_metadata
+from app.seatable_api.api_base import fetch_table, get_column_options
 
 logger = logging.getLogger(__name__)
 
@@ -37,28 +37,13 @@ async def get_employees() -> List[Dict]:
 
 async def get_department_list() -> List[str]:
     """
-    Обращается по АПИ в таблицу со справочником, получает метаданные таблицы.
-    Затем из метаданных формирует список отделов (только названия).
+    Берет из метаданных таблицы со справочником список отделов (только названия).
+    Метаданные кешируются, поэтому клавиатура отделов не запрашивает схему базы каждый раз.
     """
     try:
-        ats_table_metadata = await get_metadata(app='USER')
-
-        # Достаём список таблиц
-        tables_list = ats_table_metadata.get('metadata', {}).get('tables', [])
-
-        for table in tables_list:
-            if table.get('_id') == Config.SEATABLE_EMPLOYEE_BOOK_ID:
-                columns = table.get('columns', [])
-
-                # Ищем колонку Department
-                for column in columns:
-                    if column.get('name') == 'Department':
-                        options = column.get('data', {}).get('options', [])
-                        # Берём только названия отделов
-                        return [opt.get("name") for opt in options if isinstance(opt, dict)]
-        return []
+        # Варианты колонки Department берем из кеша схемы базы
+        return await get_column_options(Config.SEATABLE_EMPLOYEE_BOOK_ID, 'Department', app='USER')
 
     except Exception as e:
         print(f"Ошибка при получении списка отделов: {e}")
         return []
-
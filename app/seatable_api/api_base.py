@@ -1,33 +1,432 @@
+import os
+import re
+import json
 import asyncio
+import hashlib
 import pprint
 import time
 import aiohttp
 import logging
-from typing import List, Dict, Optional
+from collections import deque
+from contextlib import aclosing
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable, TypeVar, AsyncIterator, Deque
+
+from multidict import CIMultiDict
 
 from config import Config
+from app.seatable_api.api_client import seatable_client, SeaTableError, SeaTableResponse
+from app.seatable_api.scheduler import current_priority, INTERACTIVE
+from app.seatable_api.snapshot_store import snapshot_store, TableSnapshot
+from app.services.shared_cache import SharedCache
 
 logger = logging.getLogger(__name__)
 
-# Глобальный кэш токена основного приложения
-_token_app_cache: Dict[str, Optional[Dict]] = {
-    "token_data": None,
-    "timestamp": 0
-}
+T = TypeVar('T')
+
+_TOKEN_TTL = 244800  # время жизни токена в секундах — 68 часов
+_BACKGROUND_RETRY_INTERVAL = 60  # пауза между неудачными фоновыми обновлениями токена
+
+# Приложения (базы) SeaTable, для которых бот получает токены
+_APPS = ('HR', 'USER', 'PULSE')
+
+
+def _normalize_app(app: Optional[str]) -> str:
+    """Все, что не USER и не PULSE, — основное приложение HR"""
+    return app if app in _APPS else 'HR'
 
-# Глобальный кэш токена базы пользователей
-_token_user_cache: Dict[str, Optional[Dict]] = {
-    "token_data": None,
-    "timestamp": 0
-}
 
-# Глобальный кэш токена базы пульс-опросов
-_token_pulse_cache: Dict[str, Optional[Dict]] = {
-    "token_data": None,
-    "timestamp": 0
+def _api_token(app: str) -> Optional[str]:
+    """Ключ API приложения из конфига"""
+    if app == 'USER':
+        return Config.SEATABLE_API_USER_TOKEN
+    if app == 'PULSE':
+        return Config.SEATABLE_API_PULSE_TOKEN
+    return Config.SEATABLE_API_APP_TOKEN
+
+
+# Заголовки ответа, которые сохраняются в записи; остальные (куки, адреса серверов) не нужны при воспроизведении
+_RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+# uuid базы в пути запроса
+_REPLAY_UUID_RE = re.compile(r"/[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+# Поля ответа на запрос токена, которые заменяются в записи
+_TOKEN_PLACEHOLDERS = {
+    'access_token': 'replay-access-token',
+    'dtable_server': 'http://seatable.replay/dtable-server/',
+    'dtable_db': 'http://seatable.replay/dtable-db/',
+    'dtable_socket': 'http://seatable.replay/'
 }
 
-_TOKEN_TTL = 244800  # время жизни токена в секундах — 68 часов
+
+class ResponseRecorder:
+    """
+    Запись ответов SeaTable в файлы и их воспроизведение — для повторяемых замеров производительности без сети.
+
+    mode='record' — запросы идут в SeaTable как обычно, ответы сохраняются в каталог path.
+    mode='replay' — запросы в сеть не уходят, ответы берутся из записи: с исходной задержкой (timing='original')
+    или сразу (timing='zero').
+
+    Запись очищается от секретов: заголовки запроса не сохраняются, токен доступа и адреса серверов заменяются
+    заглушками, значения колонок из mask_columns маскируются с сохранением длины и вида (цифры остаются цифрами).
+    Ответы на одинаковые запросы сохраняются по порядку и воспроизводятся в том же порядке, последний повторяется.
+    """
+
+    def __init__(self, mode: str, path: str, timing: str = 'original', mask_columns: Optional[List[str]] = None):
+        self.mode = mode
+        self.path = Path(path)
+        self.timing = timing
+        self.mask_columns = set(mask_columns or [])
+
+        self._recorded: Dict[str, List[Dict]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+        # Счетчики для проверки, что прогон целиком покрыт записью
+        self.replayed = 0
+        self.missed = 0
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    @staticmethod
+    def _key(method: str, url: str, kwargs: Dict) -> str:
+        """
+        Имя записи: метод, путь без uuid базы, параметры и тело запроса.
+        Хост и uuid в ключ не входят — запись с одного сервера воспроизводится при любом SEATABLE_SERVER
+        """
+        parts = urlsplit(url)
+        path = _REPLAY_UUID_RE.sub('/{uuid}', parts.path)
+        params = sorted((str(k), str(v)) for k, v in (kwargs.get('params') or {}).items())
+        body = json.dumps(kwargs.get('json'), sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(f"{method} {path} {params} {body}".encode()).hexdigest()[:16]
+        segments = [segment for segment in path.split('/') if segment and segment != '{uuid}']
+        slug = segments[-1] if segments else 'root'
+        return f"{method.lower()}-{slug}-{digest}"
+
+    def _mask(self, value):
+        """Заменяет символы значения на псевдослучайные того же вида; одинаковые значения маскируются одинаково"""
+        if isinstance(value, list):
+            return [self._mask(item) for item in value]
+        if not isinstance(value, str) or not value:
+            return value
+        seed = hashlib.sha256(value.encode()).digest()
+        masked = []
+        for i, char in enumerate(value):
+            byte = seed[i % len(seed)]
+            if char.isdigit():
+                masked.append(str(byte % 10))
+            elif char.isalpha():
+                letters = 'абвгдежзиклмнопрстуфхцшэюя' if 'а' <= char.lower() <= 'я' else 'abcdefghijklmnopqrstuvwxyz'
+                letter = letters[byte % len(letters)]
+                masked.append(letter.upper() if char.isupper() else letter)
+            else:
+                masked.append(char)
+        return ''.join(masked)
+
+    def _sanitize(self, data):
+        """Убирает из тела ответа токен доступа и персональные данные"""
+        if isinstance(data, list):
+            return [self._sanitize(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        sanitized = {}
+        for key, value in data.items():
+            if key in _TOKEN_PLACEHOLDERS and isinstance(value, str):
+                sanitized[key] = _TOKEN_PLACEHOLDERS[key]
+            elif key in self.mask_columns:
+                sanitized[key] = self._mask(value)
+            else:
+                sanitized[key] = self._sanitize(value)
+        return sanitized
+
+    async def record(self, method: str, url: str, kwargs: Dict, response, elapsed: float) -> None:
+        """Добавляет ответ к записи и сохраняет ее файл"""
+        if self.mode != 'record':
+            return
+
+        try:
+            body = {'json': self._sanitize(response.json())}
+        except ValueError:
+            body = {'text': response.text}
+
+        entry = {
+            'status': response.status,
+            'headers': {name: response.headers[name] for name in _RECORDED_HEADERS if name in response.headers},
+            'elapsed': round(elapsed, 4),
+            **body
+        }
+        key = self._key(method, url, kwargs)
+        async with self._lock:
+            entries = self._recorded.setdefault(key, [])
+            entries.append(entry)
+            await asyncio.to_thread(self._write, key, {'request': f"{method} {urlsplit(url).path}",
+                                                       'responses': list(entries)})
+
+    def _write(self, key: str, data: Dict) -> None:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path / f"{key}.tmp"
+            tmp_file.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding='utf-8')
+            os.replace(tmp_file, self.path / f"{key}.json")
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить запись ответа SeaTable: {e}")
+
+    async def replay(self, method: str, url: str, kwargs: Dict) -> SeaTableResponse:
+        """Отдает записанный ответ. Если ответа нет в записи, бросает SeaTableError"""
+        key = self._key(method, url, kwargs)
+        entries = self._recorded.get(key)
+        if entries is None:
+            entries = await asyncio.to_thread(self._read, key)
+            self._recorded[key] = entries
+
+        if not entries:
+            self.missed += 1
+            logger.warning(f"В записи нет ответа на {method} {urlsplit(url).path} ({key})")
+            raise SeaTableError(f"В записи нет ответа на {method} {urlsplit(url).path}")
+
+        index = self._cursors.get(key, 0)
+        self._cursors[key] = index + 1
+        entry = entries[min(index, len(entries) - 1)]
+
+        if self.timing == 'original' and entry.get('elapsed'):
+            await asyncio.sleep(entry['elapsed'])
+
+        self.replayed += 1
+        if 'json' in entry:
+            body = json.dumps(entry['json'], ensure_ascii=False).encode('utf-8')
+        else:
+            body = entry.get('text', '').encode('utf-8')
+        return SeaTableResponse(entry['status'], CIMultiDict(entry.get('headers', {})), body)
+
+    def _read(self, key: str) -> List[Dict]:
+        fixture = self.path / f"{key}.json"
+        if not fixture.exists():
+            return []
+        try:
+            return json.loads(fixture.read_text(encoding='utf-8')).get('responses', [])
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать запись {fixture}: {e}")
+            return []
+
+    def rewind(self) -> None:
+        """Начинает воспроизведение заново — перед очередным прогоном замера"""
+        self._cursors.clear()
+        self.replayed = 0
+        self.missed = 0
+
+
+
+def enable_response_recording(mode: str, path: Optional[str] = None, timing: Optional[str] = None) -> None:
+    """Включает запись ('record'), воспроизведение ('replay') или выключает слой (пустой mode)"""
+    global response_recorder
+    if mode not in ('record', 'replay'):
+        response_recorder = None
+    else:
+        response_recorder = ResponseRecorder(
+            mode,
+            path or Config.SEATABLE_REPLAY_DIR,
+            timing or Config.SEATABLE_REPLAY_TIMING,
+            [c.strip() for c in Config.SEATABLE_REPLAY_MASK_COLUMNS.split(',') if c.strip()]
+        )
+        logger.info(f"Ответы SeaTable: режим {mode}, каталог {response_recorder.path}")
+    seatable_client.recorder = response_recorder
+
+
+# Глобальный экземпляр
+response_recorder: Optional[ResponseRecorder] = None
+enable_response_recording(Config.SEATABLE_REPLAY_MODE)
+
+
+class _TokenEntry:
+    """Токен одной базы и обновление, которое сейчас выполняется"""
+
+    __slots__ = ("token_data", "timestamp", "refresh_task", "last_attempt", "rejected_token")
+
+    def __init__(self):
+        self.token_data: Optional[Dict] = None
+        self.timestamp: float = 0
+        self.refresh_task: Optional[asyncio.Task] = None
+        self.last_attempt: float = 0
+        # Токен, который SeaTable отверг, — его нельзя снова взять из общего кеша
+        self.rejected_token: Optional[str] = None
+
+
+class TokenManager:
+    """
+    Хранит временные токены баз HR, USER и PULSE.
+    - Одновременно выполняется не больше одного запроса токена на базу, остальные ждут его результата.
+    - За SEATABLE_TOKEN_REFRESH_MARGIN секунд до истечения токен обновляется в фоне, вызывающие получают текущий.
+    - Токены сохраняются на диск, чтобы после перезапуска не запрашивать их заново.
+    - С Redis токены общие для всех процессов бота: новый токен запрашивает один процесс, остальные берут его.
+    """
+
+    def __init__(self, cache_file: str):
+        self._cache_file = Path(cache_file)
+        self._entries: Dict[str, _TokenEntry] = {app: _TokenEntry() for app in _APPS}
+        self._loaded = False
+
+    async def get(self, app: str) -> Optional[Dict]:
+        """Возвращает действующий токен, при необходимости дожидаясь его обновления"""
+        app = _normalize_app(app)
+        if not self._loaded:
+            self._load_from_disk()
+
+        entry = self._entries[app]
+        age = time.time() - entry.timestamp
+
+        if entry.token_data and age < _TOKEN_TTL:
+            # Токен скоро истечет — обновляем заранее, не задерживая текущий запрос.
+            # После неудачной попытки следующую делаем не раньше чем через минуту
+            if age > _TOKEN_TTL - Config.SEATABLE_TOKEN_REFRESH_MARGIN \
+                    and time.time() - entry.last_attempt > _BACKGROUND_RETRY_INTERVAL:
+                self._start_refresh(app)
+            return entry.token_data
+
+        return await asyncio.shield(self._start_refresh(app))
+
+    def invalidate(self, app: str, token_data: Optional[Dict] = None) -> None:
+        """
+        Сбрасывает токен базы.
+        Если передан token_data, сбрасывает только если в кеше все еще он —
+        так несколько запросов, получивших ошибку с одним и тем же токеном, не сбросят уже обновленный.
+        """
+        entry = self._entries[_normalize_app(app)]
+        if token_data is not None and entry.token_data is not None \
+                and entry.token_data.get('access_token') != token_data.get('access_token'):
+            return
+
+        if entry.token_data is not None:
+            entry.rejected_token = entry.token_data.get('access_token')
+        entry.token_data = None
+        entry.timestamp = 0
+
+    def _start_refresh(self, app: str) -> asyncio.Task:
+        """Запускает обновление токена или возвращает уже запущенное"""
+        entry = self._entries[app]
+        if entry.refresh_task is None or entry.refresh_task.done():
+            entry.last_attempt = time.time()
+            entry.refresh_task = asyncio.create_task(self._request_token(app))
+        return entry.refresh_task
+
+    async def _request_token(self, app: str) -> Optional[Dict]:
+        """Получает новый токен — из общего кеша, если его уже обновил другой процесс, иначе у SeaTable"""
+        entry = self._entries[app]
+        rejected = entry.rejected_token
+
+        def usable(shared: Dict) -> bool:
+            # Токен из общего кеша годится, если он не отвергнут и не требует обновления сам
+            return shared['token_data'].get('access_token') != rejected \
+                and time.time() - shared['issued_at'] < _TOKEN_TTL - Config.SEATABLE_TOKEN_REFRESH_MARGIN
+
+        try:
+            shared = await shared_tokens.get_or_load(
+                f"{app}:{_api_key_hash(app)}", lambda: self._fetch_token(app), ttl=_TOKEN_TTL, accept=usable
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            shared = None
+
+        if shared is None:
+            # Фоновое обновление не удалось — пока старый токен действует, продолжаем работать с ним
+            return entry.token_data if time.time() - entry.timestamp < _TOKEN_TTL else None
+
+        if entry.token_data is None or entry.token_data.get('access_token') != shared['token_data'].get('access_token'):
+            entry.token_data = shared['token_data']
+            entry.timestamp = shared['issued_at']
+
+            # Воспроизведенный токен — заглушка, он не должен затереть настоящий на диске
+            if response_recorder is None or not response_recorder.replaying:
+                await asyncio.to_thread(self._write_to_disk, self._dump())
+        return entry.token_data
+
+    async def _fetch_token(self, app: str) -> Optional[Dict]:
+        """Запрашивает новый токен у SeaTable. Возвращает {'token_data', 'issued_at'} или None"""
+        # URL одинаковый для всех приложений
+        url = f"{Config.SEATABLE_SERVER}/api/v2.1/dtable/app-access-token/"
+
+        # В заголовок передаем ключ API нужного приложения
+        headers = {
+            "accept": "application/json",
+            "authorization": f"Bearer {_api_token(app)}"
+        }
+
+        try:
+            response = await seatable_client.get(url, headers=headers)
+            if response.status != 200:
+                logger.error(f"API request failed: {response.status} - {response.text}")
+                return None
+
+            logger.debug(f"Base token for {app} successfully obtained and cached")
+            return {'token_data': response.json(), 'issued_at': time.time()}
+
+        except aiohttp.ClientError as e:
+            logger.error(f"API request failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+        return None
+
+    def _load_from_disk(self) -> None:
+        """Загружает сохраненные токены. Токены, выданные под другой ключ API, пропускаются"""
+        self._loaded = True
+        try:
+            if not self._cache_file.exists():
+                return
+            saved = json.loads(self._cache_file.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать сохраненные токены SeaTable: {e}")
+            return
+
+        now = time.time()
+        for app, item in saved.items():
+            if app not in self._entries or not isinstance(item, dict):
+                continue
+            if item.get('api_key_hash') != _api_key_hash(app):
+                continue
+            if now - item.get('timestamp', 0) >= _TOKEN_TTL:
+                continue
+
+            entry = self._entries[app]
+            entry.token_data = item.get('token_data')
+            entry.timestamp = item.get('timestamp', 0)
+            logger.info(f"Токен SeaTable для {app} загружен с диска")
+
+    def _dump(self) -> Dict:
+        """Токены в виде, пригодном для записи на диск"""
+        return {
+            app: {
+                'token_data': entry.token_data,
+                'timestamp': entry.timestamp,
+                'api_key_hash': _api_key_hash(app)
+            }
+            for app, entry in self._entries.items()
+            if entry.token_data
+        }
+
+    def _write_to_disk(self, data: Dict) -> None:
+        """Атомарно записывает токены в файл, доступный только владельцу процесса"""
+        try:
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self._cache_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                os.chmod(tmp_file, 0o600)
+                json.dump(data, f)
+            os.replace(tmp_file, self._cache_file)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить токены SeaTable на диск: {e}")
+
+
+def _api_key_hash(app: str) -> str:
+    """Отпечаток ключа API — чтобы не использовать сохраненный токен после смены ключа"""
+    return hashlib.sha256((_api_token(app) or '').encode()).hexdigest()[:16]
+
+
+# Глобальные экземпляры
+shared_tokens = SharedCache('seatable_tokens', ttl=_TOKEN_TTL, local_maxsize=len(_APPS))
+token_manager = TokenManager(Config.SEATABLE_TOKEN_CACHE_FILE)
 
 
 async def get_base_token(app='HR') -> Optional[Dict]:
@@ -36,6 +435,7 @@ async def get_base_token(app='HR') -> Optional[Dict]:
 
     На вход нужно передать:
     - Если нужен токен для базы пользователей, передать 'USER'.
+    - Если нужен токен для базы пульс-опросов, передать 'PULSE'.
     - Если нужен токен для основного приложения, то либо передать 'HR', либо ничего не передавать.
 
     Возвращает словарь:
@@ -48,86 +448,73 @@ async def get_base_token(app='HR') -> Optional[Dict]:
     'dtable_uuid': '5ce74477-6800-492d-b92e-00d9cd0589a6',
     'workspace_id': 11}
     """
+    return await token_manager.get(app)
 
-    # Запрашиваем из кеша токен для основного приложения HR или для телефонного справочника —
-    # в зависимости от того, что передано на вход
-    now = time.time()
 
-    if app == 'USER':
-        cached = _token_user_cache["token_data"]
-        cached_time = _token_user_cache["timestamp"]
-    elif app == 'PULSE':
-        cached = _token_pulse_cache["token_data"]
-        cached_time = _token_pulse_cache["timestamp"]
-    else:
-        cached = _token_app_cache["token_data"]
-        cached_time = _token_app_cache["timestamp"]
+# Чтения, которые выполняются прямо сейчас: (ключ запроса, класс приоритета) -> задача
+_inflight_reads: Dict[Tuple[Tuple, int], asyncio.Task] = {}
 
-    if cached and (now - cached_time) < _TOKEN_TTL:
-        return cached
 
-    # URL одинаковый для всех приложений
-    url = f"{Config.SEATABLE_SERVER}/api/v2.1/dtable/app-access-token/"
+async def coalesce(key: Tuple, factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    Объединяет одинаковые одновременные чтения.
+    Пока запрос с таким ключом выполняется, новые вызовы ждут его результата, а не отправляют свой:
+    сотня пользователей, одновременно нажавших кнопку рассылки, дает один HTTP-запрос и один разбор JSON.
+    Запрос идет в классе приоритета того, кто его начал, поэтому пользователь не ждет фоновое чтение,
+    пропускающее всех вперед, — он запускает свое. Фоновые вызовы ждут и интерактивные чтения
+    """
+    priority = current_priority()
+    task = _inflight_reads.get((key, INTERACTIVE))
+    if task is None and priority != INTERACTIVE:
+        task = _inflight_reads.get((key, priority))
+    if task is None:
+        inflight_key = (key, priority)
+        task = asyncio.create_task(factory())
+        _inflight_reads[inflight_key] = task
 
-    # В заголовок передаем ключ API для основного приложения HR или для базы пользователей USER, или базы пульс-опросов
-    if app == 'USER':
-        headers = {
-            "accept": "application/json",
-            "authorization": f"Bearer {Config.SEATABLE_API_USER_TOKEN}"
-        }
-    elif app == 'PULSE':
-        headers = {
-            "accept": "application/json",
-            "authorization": f"Bearer {Config.SEATABLE_API_PULSE_TOKEN}"
-        }
-    else:
-        headers = {
-            "accept": "application/json",
-            "authorization": f"Bearer {Config.SEATABLE_API_APP_TOKEN}"
-        }
+        def _forget(finished: asyncio.Task) -> None:
+            if _inflight_reads.get(inflight_key) is finished:
+                del _inflight_reads[inflight_key]
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status()
-                token_data = await response.json()
-                logger.debug("Base token successfully obtained and cached")
-
-                # Обновляем кэш
-                if app == 'USER':
-                    _token_user_cache["token_data"] = token_data
-                    _token_user_cache["timestamp"] = now
-                else:
-                    _token_app_cache["token_data"] = token_data
-                    _token_app_cache["timestamp"] = now
-
-                return token_data
-
-    except aiohttp.ClientError as e:
-        logger.error(f"API request failed: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        task.add_done_callback(_forget)
 
-    return None
+    # shield — отмена одного ожидающего не должна отменять общий запрос
+    return await asyncio.shield(task)
 
 
-async def fetch_table(table_id: str = '0000', app: str = "HR") -> List[Dict]:
+async def _fetch_rows(table_id: str, app: str, generation: Optional[Tuple[int, int]] = None) -> Optional[List[Dict]]:
     """
-    Получает строки таблицы.
-    Аргументом принимает '_id'. В http таблицы указан как tid.
-    Если _id при вызове не указан, то выставляет _id главного меню — 0000.
+    Загружает строки таблицы из SeaTable. При ошибке возвращает None.
+    Одновременные загрузки одной и той же таблицы объединяются в один запрос.
+    generation — поколение таблицы в кеше (TableCache.generation): загрузка, начатая до записи в таблицу,
+    с загрузками после записи не объединяется
     """
-    # Запрашиваем токен для нужного приложения — Мавис-HR или база пользователей
-    if app == 'USER':
-        token_data = await get_base_token('USER')
-    elif app == 'PULSE':
-        token_data = await get_base_token('PULSE')
-    else:
-        token_data = await get_base_token()
+    app = _normalize_app(app)
+    return await coalesce(('rows', app, table_id, generation), lambda: _load_rows(table_id, app))
+
+
+async def _load_rows(table_id: str, app: str) -> Optional[List[Dict]]:
+    """Загружает все строки таблицы постранично"""
+    rows = []
+    try:
+        async with aclosing(iter_table_pages(table_id, app, prefetch=Config.SEATABLE_PAGE_PREFETCH)) as pages:
+            async for page in pages:
+                rows.extend(page)
+    except SeaTableError as e:
+        logger.error(f"Все варианты не сработали для table_id: {table_id}: {e}")
+        return None
+
+    logger.debug(f"Успешный запрос: таблица {table_id}, строк {len(rows)}")
+    return rows
+
+
+async def _load_page(table_id: str, app: str, start: int, limit: int) -> List[Dict]:
+    """Запрашивает одну страницу строк таблицы. При ошибке бросает SeaTableError"""
+    # Запрашиваем токен для нужного приложения — Мавис-HR, база пользователей или пульс-опросов
+    token_data = await get_base_token(app)
 
     if not token_data:
-        logger.error("Не удалось получить токен SeaTable")
-        return []
+        raise SeaTableError("Не удалось получить токен SeaTable")
 
     url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}/rows/"
 
@@ -136,60 +523,572 @@ async def fetch_table(table_id: str = '0000', app: str = "HR") -> List[Dict]:
         "Accept": "application/json"
     }
 
-    params = {"table_id": table_id}
+    params = {"table_id": table_id, "start": start, "limit": limit}
+
+    response = await seatable_client.get(url, headers=headers, params=params)
+    if response.status == 200:
+        data = response.json()
+        return data.get("rows", [])
+
+    # Если ошибка 404 - пробуем сбросить токен и запросить новый
+    if response.status == 404:
+        logger.info(f"Таблица {table_id} не найдена, сбрасываем токен")
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                logger.debug(f"Успешный запрос: {url} {params}")
+        # Сбрасываем кеш токена
+        token_manager.invalidate(app, token_data)
+        token_data = await get_base_token(app)
+
+        if token_data:
+            # Пробуем запросить с новым токеном
+            url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}/rows/"
+            headers["Authorization"] = f"Bearer {token_data['access_token']}"
+
+            retry_response = await seatable_client.get(url, headers=headers, params=params)
+            if retry_response.status == 200:
+                data = retry_response.json()
+                logger.info(f"Успешный запрос после сброса токена")
                 return data.get("rows", [])
 
-            # Если ошибка 404 - пробуем сбросить токен и запросить новый
-            if response.status == 404:
-                logger.info(f"Таблица {table_id} не найдена, сбрасываем токен")
-
-                # Сбрасываем кеш токена
-                if app == 'USER':
-                    _token_user_cache["token_data"] = None
-                    _token_user_cache["timestamp"] = 0
-                    token_data = await get_base_token('USER')
-                elif app == 'PULSE':
-                    _token_pulse_cache["token_data"] = None
-                    _token_pulse_cache["timestamp"] = 0
-                    token_data = await get_base_token('PULSE')
-                else:
-                    _token_app_cache["token_data"] = None
-                    _token_app_cache["timestamp"] = 0
-                    token_data = await get_base_token()
-
-                if token_data:
-                    # Пробуем запросить с новым токеном
-                    url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}/rows/"
-                    headers["Authorization"] = f"Bearer {token_data['access_token']}"
-
-                    async with session.get(url, headers=headers, params=params) as retry_response:
-                        if retry_response.status == 200:
-                            data = await retry_response.json()
-                            logger.info(f"Успешный запрос после сброса токена")
-                            return data.get("rows", [])
-
-            error_text = await response.text()
-            logger.debug(f"Ошибка: {response.status} - {error_text}")
-
-    logger.error(f"Все варианты не сработали для table_id: {table_id}")
-    return []
+    logger.debug(f"Ошибка: {response.status} - {response.text}")
+    raise SeaTableError(f"Ошибка {response.status} при чтении таблицы {table_id} (start={start})", response.status)
+
+
+async def iter_table_pages(table_id: str, app: str = "HR", page_size: Optional[int] = None,
+                           prefetch: int = 1) -> AsyncIterator[List[Dict]]:
+    """
+    Постранично читает таблицу (параметры start/limit) и отдает страницы по мере получения.
+    prefetch — сколько страниц запрашивать одновременно: следующие страницы грузятся,
+    пока вызывающий код обрабатывает текущую.
+    Если какая-то страница не загрузилась, бросает SeaTableError — молча обрезанная таблица опаснее явной ошибки.
+    """
+    app = _normalize_app(app)
+    page_size = page_size or Config.SEATABLE_PAGE_SIZE
+    prefetch = max(1, prefetch)
+
+    pending: Deque[asyncio.Task] = deque()
+    next_start = 0
+    try:
+        while True:
+            # Держим в работе до prefetch страниц
+            while len(pending) < prefetch:
+                pending.append(asyncio.create_task(_load_page(table_id, app, next_start, page_size)))
+                next_start += page_size
+
+            page = await pending.popleft()
+            if page:
+                yield page
+
+            # Неполная страница — последняя
+            if len(page) < page_size:
+                return
+    finally:
+        # Страницы за концом таблицы или после ошибки больше не нужны
+        for task in pending:
+            task.cancel()
+            if task.done() and not task.cancelled():
+                task.exception()
+
+
+async def iter_table_rows(table_id: str, app: str = "HR", page_size: Optional[int] = None,
+                          prefetch: int = 1) -> AsyncIterator[Dict]:
+    """
+    Отдает строки таблицы по одной, не держа всю таблицу в памяти.
+    Чтобы прервать чтение досрочно, оборачивайте в contextlib.aclosing — так отменятся уже запрошенные страницы.
+    """
+    async with aclosing(iter_table_pages(table_id, app, page_size, prefetch)) as pages:
+        async for page in pages:
+            for row in page:
+                yield row
+
+
+async def read_table(table_id: str, app: str = "HR") -> Optional[List[Dict]]:
+    """Как fetch_table, но при ошибке возвращает None, а не пустой список"""
+    app = _normalize_app(app)
+    ttl = table_cache.ttl_for(app, table_id)
+
+    if ttl <= 0:
+        rows = await _fetch_rows(table_id, app, table_cache.generation(table_id))
+    else:
+        rows = await table_cache.get(app, table_id, ttl)
+    return list(rows) if rows is not None else None
+
+
+async def fetch_table(table_id: str = '0000', app: str = "HR") -> List[Dict]:
+    """
+    Получает строки таблицы.
+    Аргументом принимает '_id'. В http таблицы указан как tid.
+    Если _id при вызове не указан, то выставляет _id главного меню — 0000.
+    Таблицы с ненулевым TTL (меню, справочник, админы, контент опросов, пользователи, задачи пульс-опросов)
+    отдаются из кеша.
+    """
+    rows = await read_table(table_id, app)
+    return rows if rows is not None else []
+
+
+class _TableEntry:
+    """Строки одной таблицы в кеше"""
+
+    __slots__ = ("rows", "timestamp", "refresh_task", "refresh_generation", "refresh_priority", "by_id",
+                 "high_water", "full_sync_at", "dirty")
+
+    def __init__(self, rows: List[Dict]):
+        self.refresh_task: Optional[asyncio.Task] = None
+        # Поколение таблицы и класс приоритета, в которых запущено refresh_task
+        self.refresh_generation: Optional[Tuple[int, int]] = None
+        self.refresh_priority = INTERACTIVE
+        self.dirty = False
+        self.set_rows(rows)
+
+    def set_rows(self, rows: List[Dict]) -> None:
+        """Заменяет копию таблицы целиком (полная загрузка)"""
+        self.by_id: Dict[str, Dict] = {row['_id']: row for row in rows if row.get('_id')}
+        self.rows = rows
+        self.high_water = max((row.get('_mtime') or '' for row in rows), default='')
+        self.timestamp = time.monotonic()
+        self.full_sync_at = self.timestamp
+
+    def apply_delta(self, changed: List[Dict]) -> None:
+        """Накладывает на копию строки, измененные с последней синхронизации"""
+        for row in changed:
+            row_id = row.get('_id')
+            if not row_id:
+                continue
+            self.by_id[row_id] = row
+            if (row.get('_mtime') or '') > self.high_water:
+                self.high_water = row['_mtime']
+        self.rows = list(self.by_id.values())
+        self.timestamp = time.monotonic()
+
+
+class TableCache:
+    """
+    Кеш строк таблиц по ключу (app, table_id).
+    Свежая запись отдается сразу. Просроченная тоже отдается сразу, а в фоне запускается ее обновление
+    (stale-while-revalidate), так что пользователь не ждет SeaTable, пока в кеше есть хоть какая-то копия.
+    Таблицы из SEATABLE_DELTA_SYNC_TABLES обновляются инкрементально: запрашиваются только строки
+    с _mtime не раньше последнего увиденного, а удаленные строки подчищает периодическая полная загрузка.
+    Каждый сброс увеличивает поколение таблицы. Загрузка, начатая в старом поколении, могла прочитать таблицу
+    до записи: к ней не присоединяются, и ее результат не попадает в кеш.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], _TableEntry] = {}
+        # Поколения: общее (растет при сбросе всего кеша или базы) и по table_id
+        self._epoch = 0
+        self._generations: Dict[str, int] = {}
+        self._ttl_overrides = _parse_table_ttls(Config.SEATABLE_TABLE_CACHE_TTLS)
+        self._delta_tables = _parse_delta_tables(Config.SEATABLE_DELTA_SYNC_TABLES)
+
+        # Базы, изменения которых сейчас приходят по сокету SeaTable: их таблицы живут дольше
+        self.push_apps: set = set()
+
+        # Счетчики для оценки эффективности кеша
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+        self.delta_refreshes = 0
+        self.full_refreshes = 0
+        self.snapshot_fallbacks = 0
+
+    def is_delta(self, table_id: str) -> bool:
+        return table_id in self._delta_tables
+
+    def generation(self, table_id: str) -> Tuple[int, int]:
+        """Поколение таблицы: меняется при каждом сбросе ее кеша"""
+        return self._epoch, self._generations.get(table_id, 0)
+
+    def ttl_for(self, app: str, table_id: str) -> int:
+        """
+        TTL таблицы в секундах. 0 — таблица не кешируется.
+        Явные значения из SEATABLE_TABLE_CACHE_TTLS важнее значений по умолчанию.
+        Пока по сокету приходят изменения базы, кешируемые таблицы живут не меньше SEATABLE_PUSH_CACHE_TTL:
+        устаревшие записи сбрасывает слушатель изменений.
+        """
+        ttl = self._base_ttl(app, table_id)
+        if ttl > 0 and app in self.push_apps:
+            return max(ttl, Config.SEATABLE_PUSH_CACHE_TTL)
+        return ttl
+
+    def _base_ttl(self, app: str, table_id: str) -> int:
+        if table_id in self._ttl_overrides:
+            return self._ttl_overrides[table_id]
+
+        # Инкрементальное обновление дешевое — такие таблицы обновляем часто
+        if table_id in self._delta_tables:
+            return Config.SEATABLE_DELTA_SYNC_TTL
+
+        if table_id == Config.SEATABLE_EMPLOYEE_BOOK_ID:
+            return Config.SEATABLE_DIRECTORY_CACHE_TTL
+        if table_id == Config.SEATABLE_PULSE_CONTENT_ID:
+            return Config.SEATABLE_DIRECTORY_CACHE_TTL
+        if table_id == Config.SEATABLE_ADMIN_TABLE_ID:
+            return Config.SEATABLE_ADMIN_CACHE_TTL
+
+        # Уведомления меняются админами в течение дня — их читаем всегда напрямую
+        if table_id == Config.BROADCAST_TABLE_ID:
+            return 0
+
+        # Все остальные таблицы приложения HR — меню и формы
+        if app == 'HR':
+            return Config.SEATABLE_MENU_CACHE_TTL
+
+        return 0
+
+    async def get(self, app: str, table_id: str, ttl: int) -> Optional[List[Dict]]:
+        """Возвращает строки таблицы из кеша, при промахе загружает их"""
+        key = (app, table_id)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            logger.debug(f"Кеш таблиц: промах {key}")
+            generation = self.generation(table_id)
+            rows = await _fetch_rows(table_id, app, generation)
+            if rows is not None:
+                # Пока шла загрузка, таблицу изменили — результат отдаем, но не кешируем
+                if self.generation(table_id) == generation:
+                    self._entries[key] = _TableEntry(rows)
+                    snapshot_store.save_table(app, table_id, rows)
+                return rows
+
+            # SeaTable недоступен — отдаем последнюю сохраненную копию, обновится она при следующем чтении
+            snapshot = await snapshot_store.load_table(app, table_id)
+            if snapshot is None:
+                return None
+            self.snapshot_fallbacks += 1
+            logger.warning(f"Таблица {app}:{table_id} отдана из сохраненной копии возрастом {snapshot.age:.0f} сек")
+            self._entries[key] = _entry_from_snapshot(snapshot)
+            return snapshot.rows
+
+        # После записи в таблицу копия устарела — дожидаемся дельты, она небольшая
+        if entry.dirty:
+            await asyncio.shield(self._start_refresh(app, table_id, entry))
+            return entry.rows
+
+        if time.monotonic() - entry.timestamp < ttl:
+            self.hits += 1
+            return entry.rows
+
+        # Запись просрочена — отдаем ее и обновляем в фоне
+        self.stale_hits += 1
+        self._start_refresh(app, table_id, entry)
+        return entry.rows
+
+    def _start_refresh(self, app: str, table_id: str, entry: _TableEntry) -> asyncio.Task:
+        """
+        Запускает обновление записи или возвращает уже запущенное.
+        Обновление, запущенное до последнего сброса, могло не увидеть запись, а фоновое пропускает вперед
+        запросы пользователей — в этих случаях запускается новое
+        """
+        generation = self.generation(table_id)
+        priority = current_priority()
+        if (entry.refresh_task is None or entry.refresh_task.done()
+                or entry.refresh_generation != generation or entry.refresh_priority > priority):
+            entry.refresh_task = asyncio.create_task(self._refresh(app, table_id, generation))
+            entry.refresh_generation = generation
+            entry.refresh_priority = priority
+        return entry.refresh_task
+
+    async def _refresh(self, app: str, table_id: str, generation: Tuple[int, int]) -> None:
+        """Фоновое обновление таблицы. При ошибке в кеше остается прежняя копия"""
+        entry = self._entries.get((app, table_id))
+        if entry is None:
+            return
+
+        try:
+            if await self._refresh_delta(app, table_id, entry, generation):
+                return
+            rows = await _fetch_rows(table_id, app, generation)
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления таблицы {table_id}: {e}")
+            rows = None
+
+        if rows is None:
+            self.refresh_errors += 1
+            if not self._outdated(app, table_id, entry, generation):
+                # SeaTable не ответил — дальше отдаем прежнюю копию сразу, а не ждем новой попытки на каждом чтении:
+                # копия считается просроченной, и следующее чтение обновит ее в фоне
+                entry.dirty = False
+                entry.timestamp = float('-inf')
+            return
+
+        if self._outdated(app, table_id, entry, generation):
+            return
+
+        entry.set_rows(rows)
+        entry.dirty = False
+        self.full_refreshes += 1
+        snapshot_store.save_table(app, table_id, entry.rows, entry.high_water)
+        logger.debug(f"Кеш таблиц: таблица {app}:{table_id} обновлена")
+
+    def _outdated(self, app: str, table_id: str, entry: _TableEntry, generation: Tuple[int, int]) -> bool:
+        """
+        Обновление начато до сброса таблицы или запись уже заменена в кеше — результат отбрасываем,
+        а dirty остается: его снимет обновление, запущенное после записи
+        """
+        if self.generation(table_id) == generation and self._entries.get((app, table_id)) is entry:
+            return False
+        logger.debug(f"Кеш таблиц: обновление {app}:{table_id} устарело до завершения, результат отброшен")
+        return True
+
+    async def _refresh_delta(self, app: str, table_id: str, entry: _TableEntry,
+                             generation: Tuple[int, int]) -> bool:
+        """
+        Инкрементальное обновление. Возвращает False, если нужна полная загрузка:
+        таблица не инкрементальная, пора сверить удаления или SQL-запрос не удался.
+        """
+        if table_id not in self._delta_tables or not entry.high_water:
+            return False
+        if time.monotonic() - entry.full_sync_at >= Config.SEATABLE_DELTA_FULL_SYNC_INTERVAL:
+            return False
+
+        # SQL-слой сам зависит от api_base
+        from app.seatable_api.api_query import select_changed_rows
+
+        changed = await select_changed_rows(table_id, entry.high_water, app)
+        if changed is None:
+            return False
+
+        if self._outdated(app, table_id, entry, generation):
+            return True
+
+        entry.apply_delta(changed)
+        entry.dirty = False
+        self.delta_refreshes += 1
+        if changed:
+            snapshot_store.save_table(app, table_id, entry.rows, entry.high_water)
+        logger.debug(f"Кеш таблиц: таблица {app}:{table_id}, изменено строк {len(changed)}")
+        return True
+
+    def warm_start(self, snapshots: Dict[Tuple[str, str], TableSnapshot]) -> int:
+        """
+        Заполняет пустой кеш сохраненными копиями. Возраст копии учитывается:
+        просроченные отдаются сразу и обновляются в фоне при первом чтении. Возвращает число таблиц
+        """
+        loaded = 0
+        for (app, table_id), snapshot in snapshots.items():
+            if (app, table_id) in self._entries or self.ttl_for(app, table_id) <= 0:
+                continue
+            self._entries[(app, table_id)] = _entry_from_snapshot(snapshot)
+            loaded += 1
+        return loaded
+
+    def remove_rows(self, app: str, table_id: str, row_ids: List[str]) -> None:
+        """Убирает удаленные строки из копии таблицы — дельта по _mtime удалений не видит"""
+        entry = self._entries.get((app, table_id))
+        if entry is None:
+            return
+        removed = [row_id for row_id in row_ids if entry.by_id.pop(row_id, None) is not None]
+        if removed:
+            entry.rows = list(entry.by_id.values())
+            logger.debug(f"Кеш таблицы {app}:{table_id}: удалено строк {len(removed)}")
+
+    def expire(self, app: str) -> None:
+        """
+        Помечает все таблицы базы просроченными: они по-прежнему отдаются, но следующее чтение обновит их в фоне.
+        Нужно после разрыва сокета — изменения за это время могли не дойти
+        """
+        for (key_app, _), entry in self._entries.items():
+            if key_app == app:
+                entry.timestamp = float('-inf')
+
+    def invalidate(self, table_id: Optional[str] = None, app: Optional[str] = None) -> None:
+        """
+        Удаляет записи из кеша.
+        Без аргументов очищает весь кеш, с table_id — только эту таблицу (во всех приложениях или в app).
+        Инкрементальные таблицы не удаляются, а помечаются устаревшими: следующее чтение дождется дельты.
+        """
+        if table_id is None:
+            self._epoch += 1
+        else:
+            self._generations[table_id] = self._generations.get(table_id, 0) + 1
+
+        if table_id is None and app is None:
+            self._entries.clear()
+            logger.info("Кеш таблиц очищен")
+            return
+
+        for key in list(self._entries):
+            key_app, key_table_id = key
+            if table_id is not None and key_table_id != table_id:
+                continue
+            if app is not None and key_app != _normalize_app(app):
+                continue
+            if key_table_id in self._delta_tables:
+                self._entries[key].dirty = True
+                logger.debug(f"Кеш таблицы {key_app}:{key_table_id} помечен устаревшим")
+                continue
+            del self._entries[key]
+            logger.info(f"Кеш таблицы {key_app}:{key_table_id} сброшен")
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов"""
+        return {
+            "tables": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "delta_refreshes": self.delta_refreshes,
+            "full_refreshes": self.full_refreshes,
+            "snapshot_fallbacks": self.snapshot_fallbacks
+        }
+
+
+def _entry_from_snapshot(snapshot: TableSnapshot) -> _TableEntry:
+    """Запись кеша из сохраненной копии: время загрузки сдвинуто на возраст копии"""
+    entry = _TableEntry(snapshot.rows)
+    entry.timestamp -= snapshot.age
+    entry.full_sync_at -= snapshot.age
+    if snapshot.high_water:
+        entry.high_water = snapshot.high_water
+    return entry
+
+
+def _parse_table_ttls(raw: Optional[str]) -> Dict[str, int]:
+    """Разбирает строку вида 'tid1=60,tid2=0' в словарь {table_id: ttl}"""
+    result = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        table_id, ttl = item.split('=', 1)
+        try:
+            result[table_id.strip()] = int(ttl)
+        except ValueError:
+            logger.warning(f"Некорректный TTL таблицы в SEATABLE_TABLE_CACHE_TTLS: {item}")
+    return result
+
+
+def _parse_delta_tables(raw: Optional[str]) -> set:
+    """
+    Список table_id через запятую. Пустое значение — пользователи, справочник сотрудников и задачи пульс-опросов,
+    "-" — инкрементальное обновление выключено.
+    """
+    raw = (raw or '').strip()
+    if raw == '-':
+        return set()
+    if not raw:
+        return {
+            Config.SEATABLE_USERS_TABLE_ID,
+            Config.SEATABLE_EMPLOYEE_BOOK_ID,
+            Config.SEATABLE_PULSE_TASKS_ID
+        } - {None, ''}
+    return {item.strip() for item in raw.split(',') if item.strip()}
+
+
+# Глобальный экземпляр
+table_cache = TableCache()
+
+
+def invalidate_table_cache(table_id: Optional[str] = None, app: Optional[str] = None) -> None:
+    """Сбрасывает кеш таблицы (или всех таблиц), чтобы следующее чтение пошло в SeaTable"""
+    table_cache.invalidate(table_id, app)
+
+
+def get_table_cache_stats() -> Dict[str, int]:
+    """Возвращает счетчики кеша таблиц"""
+    return table_cache.stats()
+
+
+class _SchemaEntry:
+    """Метаданные одной базы и индексы таблиц и колонок по ним"""
+
+    __slots__ = ("metadata", "version", "tables", "columns", "timestamp")
+
+    def __init__(self, metadata: Dict):
+        self.metadata = metadata
+        body = metadata.get('metadata', {})
+        self.version = body.get('version')
+        self.tables: Dict[str, Dict] = {table.get('_id'): table for table in body.get('tables', [])}
+        self.columns: Dict[str, Dict[str, Dict]] = {
+            table_id: {column.get('name'): column for column in table.get('columns', [])}
+            for table_id, table in self.tables.items()
+        }
+        self.timestamp = time.monotonic()
+
+
+class MetadataCache:
+    """
+    Кеш метаданных (схемы) баз: таблицы, колонки и варианты выбора.
+    Обновляется по таймеру SEATABLE_METADATA_CACHE_TTL или сразу после сброса — когда запись
+    отклонена из-за схемы или колонки изменены ботом. Индексы перестраиваются только при смене версии схемы.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _SchemaEntry] = {}
+        self.loads = 0
+        self.version_changes = 0
+
+    async def get(self, app: str) -> Optional[_SchemaEntry]:
+        """Возвращает метаданные базы, при необходимости загружая их"""
+        app = _normalize_app(app)
+        entry = self._entries.get(app)
+        if entry is not None and time.monotonic() - entry.timestamp < Config.SEATABLE_METADATA_CACHE_TTL:
+            return entry
+
+        metadata = await coalesce(('metadata', app), lambda: _load_metadata(app))
+        if metadata is None:
+            # SeaTable недоступен — лучше старая схема, чем никакой
+            return entry
+
+        self.loads += 1
+        snapshot_store.save_metadata(app, metadata)
+        if entry is not None and entry.version is not None and entry.version == metadata.get('metadata', {}).get('version'):
+            entry.metadata = metadata
+            entry.timestamp = time.monotonic()
+            return entry
+
+        if entry is not None:
+            self.version_changes += 1
+            logger.info(f"Схема базы {app} изменилась, индексы колонок перестроены")
+
+        entry = _SchemaEntry(metadata)
+        self._entries[app] = entry
+        return entry
+
+    def warm_start(self, snapshots: Dict[str, Tuple[Dict, float]]) -> int:
+        """Заполняет кеш сохраненными метаданными с учетом их возраста. Возвращает число баз"""
+        loaded = 0
+        for app, (metadata, saved_at) in snapshots.items():
+            if app in self._entries:
+                continue
+            entry = _SchemaEntry(metadata)
+            entry.timestamp -= max(0.0, time.time() - saved_at)
+            self._entries[app] = entry
+            loaded += 1
+        return loaded
+
+    def invalidate(self, app: Optional[str] = None) -> None:
+        """Сбрасывает метаданные базы (или всех баз) — следующее обращение загрузит их заново"""
+        if app is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(_normalize_app(app), None)
+        logger.info(f"Кеш метаданных {'всех баз' if app is None else app} сброшен")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bases": len(self._entries),
+            "loads": self.loads,
+            "version_changes": self.version_changes
+        }
+
+
+# Глобальный экземпляр
+metadata_cache = MetadataCache()
 
 
 async def get_metadata(app: str = "HR") -> Optional[Dict[str, str]]:
     """Функция возвращает метаданные любой таблицы."""
-    # Запрашиваем токен для нужного приложения — Мавис-HR или телефонный справочник
-    if app == 'USER':
-        token_data = await get_base_token('USER')
-    elif app == 'PULSE':
-        token_data = await get_base_token('PULSE')
-    else:
-        token_data = await get_base_token()
+    entry = await metadata_cache.get(app)
+    return entry.metadata if entry else None
+
+
+async def _load_metadata(app: str) -> Optional[Dict[str, str]]:
+    """Выполняет запрос метаданных базы"""
+    # Запрашиваем токен для нужного приложения — Мавис-HR, телефонный справочник или пульс-опросы
+    token_data = await get_base_token(app)
 
     if not token_data:
         logger.error("Не удалось получить токен SeaTable")
@@ -201,16 +1100,65 @@ async def get_metadata(app: str = "HR") -> Optional[Dict[str, str]]:
         "Authorization": f"Bearer {token_data['access_token']}",
         "Accept": "application/json"
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status == 200:
-                metadata = await response.json()
-                return metadata
+    response = await seatable_client.get(url, headers=headers)
+    if response.status == 200:
+        return response.json()
 
     logger.error("Все варианты endpoints вернули ошибку")
     return None
 
 
+async def get_table_name(table_id: str, app: str = "HR") -> Optional[str]:
+    """Возвращает имя таблицы по ее table_id из метаданных базы"""
+    entry = await metadata_cache.get(app)
+    if not entry or table_id not in entry.tables:
+        return None
+    return entry.tables[table_id].get('name')
+
+
+async def get_table_columns(table_id: str, app: str = "HR") -> Optional[Dict[str, Dict]]:
+    """Колонки таблицы: имя -> описание колонки. None, если метаданные недоступны или таблицы нет"""
+    entry = await metadata_cache.get(app)
+    if not entry:
+        return None
+    return entry.columns.get(table_id)
+
+
+async def get_column_options(table_id: str, column_name: str, app: str = "HR") -> List[str]:
+    """Названия вариантов колонки с выбором (single/multiple select)"""
+    columns = await get_table_columns(table_id, app) or {}
+    options = (columns.get(column_name) or {}).get('data') or {}
+    return [opt.get('name') for opt in options.get('options', []) if isinstance(opt, dict)]
+
+
+def invalidate_metadata(app: Optional[str] = None) -> None:
+    """Сбрасывает кеш метаданных — после изменения колонок или ошибки схемы при записи"""
+    metadata_cache.invalidate(app)
+
+
+async def warm_start_caches() -> None:
+    """
+    Заполняет кеши таблиц и метаданных из сохраненных копий — вызывается при старте бота,
+    чтобы первые запросы пользователей не шли в SeaTable все разом
+    """
+    if not snapshot_store.enabled:
+        return
+    started = time.monotonic()
+    tables, metadata = await asyncio.to_thread(snapshot_store.load_all)
+    loaded_tables = table_cache.warm_start(tables)
+    loaded_bases = metadata_cache.warm_start(metadata)
+    logger.info(f"Кеши SeaTable заполнены из копий: таблиц {loaded_tables}, баз {loaded_bases} "
+                f"за {(time.monotonic() - started) * 1000:.0f} мс")
+
+
+def is_schema_error(status: int, text: str) -> bool:
+    """Похоже ли отклонение записи на расхождение со схемой (нет колонки или таблицы)"""
+    if status not in (400, 404):
+        return False
+    text = (text or '').lower()
+    return 'column' in text or 'table' in text
+
+
 # Отладочный скрипт для вывода ответов json по API SeaTable
 if __name__ == "__main__":
     async def main():
@@ -230,4 +1178,12 @@ if __name__ == "__main__":
         metadata = await get_metadata('PULSE')
         pprint.pprint(metadata)
 
+        print("СТАТИСТИКА КЕША ТАБЛИЦ")
+        pprint.pprint(get_table_cache_stats())
+
+        print("СТАТИСТИКА КЕША МЕТАДАННЫХ")
+        pprint.pprint(metadata_cache.stats())
+
+        await seatable_client.close()
+
     asyncio.run(main())
\ No newline at end of file
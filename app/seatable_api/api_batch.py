@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.seatable_api.api_base import (
+    get_base_token, get_table_name, invalidate_table_cache, invalidate_metadata, is_schema_error
+)
+from app.seatable_api.api_client import seatable_client
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# SeaTable принимает не больше 1000 строк в одном пакетном запросе
+_MAX_BATCH_SIZE = 1000
+
+
+class BatchResult:
+    """
+    Итог пакетной операции.
+    errors — номер строки во входном списке -> текст ошибки. Строки, которых нет в errors, записаны.
+    """
+
+    __slots__ = ("total", "errors")
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.errors: Dict[int, str] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def success_count(self) -> int:
+        return self.total - len(self.errors)
+
+    def succeeded(self, index: int) -> bool:
+        return index not in self.errors
+
+
+async def _rows_context(app: str, table_id: str) -> Optional[Tuple[str, Dict, Dict]]:
+    """Возвращает (базовый URL dtable, заголовки, идентификация таблицы для тела запроса)"""
+    token_data = await get_base_token(app)
+    if not token_data:
+        logger.error("Не удалось получить токен SeaTable")
+        return None
+
+    base_url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}"
+    headers = {
+        "Authorization": f"Bearer {token_data['access_token']}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+    # Пакетные эндпоинты ищут таблицу по имени, одиночные — по table_id; передаем оба
+    table = {"table_id": table_id}
+    table_name = await get_table_name(table_id, app)
+    if table_name:
+        table["table_name"] = table_name
+
+    return base_url, headers, table
+
+
+def _chunks(items: List, size: int):
+    size = max(1, min(size, _MAX_BATCH_SIZE))
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+async def _run_batch(op: str, table_id: str, app: str, items: List, chunk_size: Optional[int]) -> BatchResult:
+    """
+    Отправляет items кусками по chunk_size.
+    Если кусок отклонен как некорректный (4xx), повторяет его по одной строке, чтобы выяснить, какие именно строки
+    с ошибкой. При 5xx, таймауте или обрыве соединения кусок мог быть уже записан — повтор добавил бы строки
+    второй раз, поэтому такой кусок целиком считается неудачным.
+    """
+    result = BatchResult(len(items))
+    if not items:
+        return result
+
+    context = await _rows_context(app, table_id)
+    if not context:
+        for index in range(len(items)):
+            result.errors[index] = "нет токена SeaTable"
+        return result
+
+    base_url, headers, table = context
+    chunk_size = chunk_size or Config.SEATABLE_BATCH_SIZE
+
+    for offset, chunk in _chunks(items, chunk_size):
+        error = await _send_chunk(op, base_url, headers, table, chunk)
+        if error is None:
+            continue
+
+        # Пакет отклонен из-за схемы (переименована колонка или таблица) — метаданные в кеше устарели
+        status, text = _split_error(error)
+        if is_schema_error(status, text):
+            invalidate_metadata(app)
+
+        if len(chunk) == 1 or not _is_rejected(status):
+            for index in range(len(chunk)):
+                result.errors[offset + index] = error
+            continue
+
+        logger.warning(f"Пакет {op} ({len(chunk)} строк) в таблицу {table_id} отклонен: {error}. "
+                       f"Повторяем по одной строке")
+        for index, item in enumerate(chunk):
+            row_error = await _send_chunk(op, base_url, headers, table, [item])
+            if row_error is not None:
+                result.errors[offset + index] = row_error
+
+    # Записанное больше не совпадает с кешем таблицы
+    invalidate_table_cache(table_id, app)
+
+    if result.errors:
+        logger.error(f"Пакет {op} в таблицу {table_id}: записано {result.success_count}/{result.total}")
+    else:
+        logger.info(f"Пакет {op} в таблицу {table_id}: записано {result.total}")
+    return result
+
+
+def _is_rejected(status: int) -> bool:
+    """SeaTable разобрал пакет и отказал (ошибка в данных) — значит, ничего из него не записано"""
+    return 400 <= status < 500 and status != 429
+
+
+def _split_error(error: str) -> Tuple[int, str]:
+    """Разбирает текст ошибки вида '400 - ...' на статус и тело"""
+    status, _, text = error.partition(" - ")
+    return (int(status), text) if status.isdigit() else (0, error)
+
+
+async def _send_chunk(op: str, base_url: str, headers: Dict, table: Dict, chunk: List) -> Optional[str]:
+    """Отправляет один пакетный запрос. Возвращает текст ошибки или None"""
+    try:
+        if op == "append":
+            response = await seatable_client.post(
+                f"{base_url}/batch-append-rows/", headers=headers, json={**table, "rows": chunk}
+            )
+        elif op == "update":
+            updates = [{"row_id": row_id, "row": row} for row_id, row in chunk]
+            response = await seatable_client.put(
+                f"{base_url}/batch-update-rows/", headers=headers, json={**table, "updates": updates}
+            )
+        else:
+            response = await seatable_client.delete(
+                f"{base_url}/batch-delete-rows/", headers=headers, json={**table, "row_ids": chunk}
+            )
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+    if response.status in (200, 201):
+        return None
+    return f"{response.status} - {response.text}"
+
+
+async def batch_append_rows(table_id: str, rows: List[Dict], app: str = "HR",
+                            chunk_size: Optional[int] = None) -> BatchResult:
+    """Добавляет строки в таблицу пакетами"""
+    return await _run_batch("append", table_id, app, rows, chunk_size)
+
+
+async def batch_update_rows(table_id: str, updates: List[Tuple[str, Dict]], app: str = "HR",
+                            chunk_size: Optional[int] = None) -> BatchResult:
+    """Обновляет строки пакетами. updates — список пар (row_id, {колонка: значение})"""
+    return await _run_batch("update", table_id, app, updates, chunk_size)
+
+
+async def batch_delete_rows(table_id: str, row_ids: List[str], app: str = "HR",
+                            chunk_size: Optional[int] = None) -> BatchResult:
+    """Удаляет строки пакетами"""
+    return await _run_batch("delete", table_id, app, row_ids, chunk_size)
+
+
+class BatchWriter:
+    """
+    Очередь записей в одну таблицу.
+    Операции накапливаются и уходят пакетами при flush() или когда очередь одной операции дорастает до chunk_size.
+    Каждая постановка в очередь возвращает Future, который после отправки получает True или False.
+    """
+
+    def __init__(self, table_id: str, app: str = "HR", chunk_size: Optional[int] = None):
+        self.table_id = table_id
+        self.app = app
+        self.chunk_size = chunk_size or Config.SEATABLE_BATCH_SIZE
+        self._pending: Dict[str, List[Tuple[object, asyncio.Future]]] = {"append": [], "update": [], "delete": []}
+
+    async def append(self, row: Dict) -> asyncio.Future:
+        return await self._queue("append", row)
+
+    async def update(self, row_id: str, row: Dict) -> asyncio.Future:
+        return await self._queue("update", (row_id, row))
+
+    async def delete(self, row_id: str) -> asyncio.Future:
+        return await self._queue("delete", row_id)
+
+    async def _queue(self, op: str, item) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[op].append((item, future))
+        if len(self._pending[op]) >= self.chunk_size:
+            await self._flush_op(op)
+        return future
+
+    async def flush(self) -> None:
+        """Отправляет все накопленные операции: сначала добавления, затем обновления и удаления"""
+        for op in ("append", "update", "delete"):
+            await self._flush_op(op)
+
+    async def _flush_op(self, op: str) -> None:
+        queued = self._pending[op]
+        if not queued:
+            return
+        self._pending[op] = []
+
+        items = [item for item, _ in queued]
+        try:
+            result = await _run_batch(op, self.table_id, self.app, items, self.chunk_size)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной записи {op} в таблицу {self.table_id}: {e}")
+            result = BatchResult(len(items))
+            result.errors = {index: str(e) for index in range(len(items))}
+
+        for index, (_, future) in enumerate(queued):
+            if not future.done():
+                future.set_result(result.succeeded(index))
@@ -0,0 +1,323 @@
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+from config import Config
+from app.seatable_api.scheduler import request_scheduler, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+
+class SeaTableError(Exception):
+    """Запрос к SeaTable не удался. status — HTTP-статус ответа, если ответ был"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class SeaTableUnavailable(SeaTableError):
+    """SeaTable не отвечает: сетевые ошибки после всех повторов или разомкнут предохранитель"""
+
+
+# Статусы, при которых запрос имеет смысл повторить
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Методы, которые можно безопасно повторять
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Квота SeaTable считается на базу — ключ берем из uuid базы в URL
+_BASE_UUID_RE = re.compile(r"/(?:dtables|query)/([0-9a-fA-F-]{32,36})")
+
+
+class TokenBucket:
+    """
+    Клиентский ограничитель частоты запросов к одной базе.
+    Если токены кончились, запрос ждет — всплеск нагрузки замедляется, а не получает 429.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self, reserve: float = 0) -> None:
+        """
+        Забирает один токен, при необходимости дожидаясь его.
+        reserve — сколько токенов оставить нетронутыми: фоновые запросы не выбирают запас, нужный пользователям
+        """
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 + reserve - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """SeaTable ответил 429 — обнуляем запас, чтобы следующие запросы подождали"""
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class CircuitBreaker:
+    """
+    Предохранитель на хост SeaTable.
+    После threshold сбоев подряд размыкается на reset_timeout секунд: запросы сразу получают SeaTableUnavailable,
+    а кеши продолжают отдавать последние сохраненные данные. Потом один пробный запрос решает, замкнуться ли снова.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.reset_timeout or self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Пробный запрос прерван без ответа (отмена, неожиданная ошибка) — следующий запрос станет новой пробой"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("SeaTable снова отвечает, предохранитель замкнут")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.error(f"SeaTable не отвечает ({self.failures} сбоев подряд), "
+                             f"предохранитель разомкнут на {self.reset_timeout} сек")
+            self.opened_at = time.monotonic()
+
+
+def _retry_after(headers: CIMultiDict) -> Optional[float]:
+    """Разбирает Retry-After: число секунд или HTTP-дата"""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class SeaTableResponse:
+    """
+    Ответ SeaTable, прочитанный целиком.
+    К моменту, когда ответ попадает к вызывающему коду, соединение уже возвращено в пул.
+    """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: CIMultiDict, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        """Тело ответа строкой — для логов с ошибками"""
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """Тело ответа, разобранное как JSON. Пустое тело — пустой словарь"""
+        if not self.body:
+            return {}
+        return json.loads(self.body)
+
+
+class SeaTableClient:
+    """
+    Долгоживущий HTTP-клиент для всех запросов к SeaTable.
+    Держит один пул keep-alive соединений и кеш DNS, чтобы не платить за TLS-рукопожатие на каждый запрос.
+    Запускается и закрывается вместе с ботом в main.py.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # Слой записи и воспроизведения ответов (ResponseRecorder из api_base), None — обычная работа
+        self.recorder = None
+
+    async def start(self) -> None:
+        """Создает сессию с пулом соединений. Повторный вызов ничего не делает"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=Config.SEATABLE_HTTP_POOL_SIZE,
+            limit_per_host=Config.SEATABLE_HTTP_POOL_PER_HOST,
+            ttl_dns_cache=Config.SEATABLE_DNS_CACHE_TTL,
+            keepalive_timeout=Config.SEATABLE_KEEPALIVE_TIMEOUT
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=Config.SEATABLE_HTTP_TIMEOUT,
+            connect=Config.SEATABLE_HTTP_CONNECT_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(f"HTTP-клиент SeaTable запущен: пул {Config.SEATABLE_HTTP_POOL_SIZE}, "
+                    f"на хост {Config.SEATABLE_HTTP_POOL_PER_HOST}")
+
+    async def close(self) -> None:
+        """Закрывает сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP-клиент SeaTable остановлен")
+        self._session = None
+
+    async def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> SeaTableResponse:
+        """
+        Выполняет запрос и читает ответ целиком.
+        Параметры те же, что у aiohttp: headers, params, json.
+        idempotent — можно ли повторять запрос при сетевой ошибке и 5xx; по умолчанию только для GET.
+        На 429 повторяется любой запрос: SeaTable его не выполнил. Пауза берется из Retry-After.
+        Если SeaTable так и не ответил или разомкнут предохранитель, бросает SeaTableUnavailable.
+        """
+        if self.recorder is not None and self.recorder.replaying:
+            return await self.recorder.replay(method.upper(), url, kwargs)
+
+        if self._session is None or self._session.closed:
+            # Клиент не запущен из main.py (например, в отладочном скрипте) — создаем сессию лениво
+            await self.start()
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in _IDEMPOTENT_METHODS
+
+        bucket = self._bucket_for(url)
+        breaker = self._breaker_for(url)
+        attempts = max(1, Config.SEATABLE_RETRY_ATTEMPTS)
+
+        for attempt in range(1, attempts + 1):
+            probe = breaker.is_open
+            if not breaker.allow():
+                raise SeaTableUnavailable(f"SeaTable недоступен, запрос {method} {urlsplit(url).path} не отправлен")
+
+            try:
+                # Фоновые запросы ждут, пока пройдут запросы пользователей, и не трогают их запас квоты
+                async with request_scheduler.slot() as priority:
+                    reserve = Config.SEATABLE_INTERACTIVE_RESERVE if priority == BACKGROUND else 0
+                    await bucket.acquire(min(reserve, bucket.capacity - 1))
+
+                    started = time.monotonic()
+                    async with self._session.request(method, url, **kwargs) as raw:
+                        body = await raw.read()
+                        response = SeaTableResponse(raw.status, CIMultiDict(raw.headers), body)
+                    elapsed = time.monotonic() - started
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                if not idempotent or attempt == attempts:
+                    raise SeaTableUnavailable(f"Ошибка соединения с SeaTable: {e!r}") from e
+                delay = self._backoff(attempt)
+                logger.warning(f"Ошибка соединения с SeaTable ({e!r}), повтор {attempt}/{attempts - 1} "
+                               f"через {delay:.1f} сек")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Без этого брошенная проба (например, отмененная в очереди планировщика) держала бы
+                # предохранитель разомкнутым навсегда
+                if probe:
+                    breaker.release_probe()
+                raise
+
+            if response.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            retryable = response.status == 429 or (idempotent and response.status in _RETRY_STATUSES)
+            if not retryable or attempt == attempts:
+                if self.recorder is not None:
+                    await self.recorder.record(method, url, kwargs, response, elapsed)
+                return response
+
+            if response.status == 429:
+                delay = _retry_after(response.headers)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                delay = min(delay, Config.SEATABLE_RETRY_AFTER_MAX)
+                bucket.pause(delay)
+            else:
+                delay = self._backoff(attempt)
+
+            logger.warning(f"SeaTable ответил {response.status} на {method} {urlsplit(url).path}, "
+                           f"повтор {attempt}/{attempts - 1} через {delay:.1f} сек")
+            await asyncio.sleep(delay)
+
+        return response
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Экспоненциальная пауза с полным джиттером"""
+        ceiling = min(Config.SEATABLE_RETRY_MAX_DELAY, Config.SEATABLE_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def _bucket_for(self, url: str) -> TokenBucket:
+        match = _BASE_UUID_RE.search(url)
+        key = match.group(1).replace("-", "") if match else urlsplit(url).netloc
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(Config.SEATABLE_RATE_LIMIT_PER_MINUTE, Config.SEATABLE_RATE_LIMIT_BURST)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _breaker_for(self, url: str) -> CircuitBreaker:
+        key = urlsplit(url).netloc
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(Config.SEATABLE_CIRCUIT_THRESHOLD, Config.SEATABLE_CIRCUIT_RESET_TIMEOUT)
+            self._breakers[key] = breaker
+        return breaker
+
+    @property
+    def is_available(self) -> bool:
+        """Нет ни одного разомкнутого предохранителя"""
+        return not any(breaker.is_open for breaker in self._breakers.values())
+
+    async def get(self, url: str, **kwargs) -> SeaTableResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> SeaTableResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> SeaTableResponse:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> SeaTableResponse:
+        return await self.request("DELETE", url, **kwargs)
+
+
+# Глобальный экземпляр
+seatable_client = SeaTableClient()
@@ -1,9 +1,10 @@
 import pprint
 import logging
-import aiohttp
 from typing import Dict
 
-from app.seatable_api.api_base import get_base_token, fetch_table
+from app.seatable_api.api_base import get_base_token, get_table_columns, invalidate_metadata, is_schema_error
+from app.seatable_api.api_client import seatable_client
+from app.seatable_api.api_users import find_user_by_id_messenger
 from app.services.forms import prepare_data_to_post_in_seatable
 from config import Config
 
@@ -14,16 +15,17 @@ async def save_form_answers(form_data: Dict) -> bool:
     """Сохраняет ответы формы в указанную таблицу Seatable"""
     logger.info("Начало сохранения ответов формы")
 
-    # Получаем данные пользователя из таблицы
-    users_data = await fetch_table(table_id=Config.SEATABLE_USERS_TABLE_ID, app='USER')
+    # Получаем ФИО и телефон пользователя
+    try:
+        user = await find_user_by_id_messenger(form_data.get('user_id'), columns=['FIO', 'Phone'])
+    except Exception as e:
+        logger.error(f"Не удалось получить данные пользователя: {e}")
+        user = None
 
     # Добавляем данные пользователя в form_data
-    for user in users_data:
-        current_id = str(user.get('ID_messenger'))
-        if current_id == str(form_data.get('user_id')):
-            form_data['user_fio'] = user.get('FIO')
-            form_data['user_phone'] = user.get('Phone')
-            break
+    if user:
+        form_data['user_fio'] = user.get('FIO')
+        form_data['user_phone'] = user.get('Phone')
 
     # Получаем токен доступа
     token_data = await get_base_token()
@@ -50,35 +52,35 @@ async def save_form_answers(form_data: Dict) -> bool:
         "Content-Type": "application/json"
     }
 
-    # Получаем существующие колонки
+    # Сверяем колонки со схемой из кеша метаданных
     try:
-        async with aiohttp.ClientSession() as session:
-            # Проверяем существующие колонки
-            params = {"table_id": table_id}
-            async with session.get(api_url, headers=headers, params=params) as response:
-                existing_columns = []
-                if response.status == 200:
-                    columns_data = await response.json()
-                    existing_columns = [col['name'] for col in columns_data.get('columns', [])]
-                    logger.info(f"Существующие колонки: {existing_columns}")
+        columns = await get_table_columns(table_id, app='HR')
+        existing_columns = []
+        if columns is not None:
+            existing_columns = list(columns.keys())
+            logger.info(f"Существующие колонки: {existing_columns}")
+        else:
+            logger.warning(f"Не удалось получить колонки таблицы {table_id} из метаданных")
+
+        # Создаем недостающие колонки
+        created = False
+        for col_name in row_data.keys():
+            if col_name not in existing_columns:
+                payload = {
+                    "table_id": table_id,
+                    "column_name": col_name,
+                    "column_type": "text"
+                }
+                resp = await seatable_client.post(api_url, json=payload, headers=headers)
+                if resp.status not in (200, 201):
+                    logger.error(f"Ошибка создания колонки {col_name}: {resp.text}")
                 else:
-                    error = await response.text()
-                    logger.warning(f"Не удалось получить колонки: {error}")
-
-            # Создаем недостающие колонки
-            for col_name in row_data.keys():
-                if col_name not in existing_columns:
-                    payload = {
-                        "table_id": table_id,
-                        "column_name": col_name,
-                        "column_type": "text"
-                    }
-                    async with session.post(api_url, json=payload, headers=headers) as resp:
-                        if resp.status not in (200, 201):
-                            error = await resp.text()
-                            logger.error(f"Ошибка создания колонки {col_name}: {error}")
-                        else:
-                            logger.info(f"Колонка «{col_name}» создана")
+                    created = True
+                    logger.info(f"Колонка «{col_name}» создана")
+
+        # Схема изменилась — кеш метаданных больше не актуален
+        if created:
+            invalidate_metadata('HR')
     except Exception as e:
         logger.error(f"Ошибка при работе с колонками: {e}")
 
@@ -93,29 +95,30 @@ async def save_form_answers(form_data: Dict) -> bool:
 
     try:
         logger.info(f"Отправка данных в таблицу {table_id}")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(rows_url, json=payload, headers=headers) as response:
-                if response.status in (200, 201):
-                    result = await response.json()
-                    logger.info(f"Данные успешно сохранены. Ответ API: {result}")
-
-                    # Дополнительная проверка - получаем добавленную строку
-                    check_params = {"table_id": table_id}
-                    async with session.get(rows_url, headers=headers, params=check_params) as check_resp:
-                        if check_resp.status == 200:
-                            check_data = await check_resp.json()
-                            logger.info(f"Проверка: в таблице {len(check_data.get('rows', []))} строк")
-                            logger.debug(
-                                f"Последняя строка: {check_data.get('rows', [])[-1] if check_data.get('rows') else 'нет данных'}")
-                        else:
-                            error = await check_resp.text()
-                            logger.warning(f"Ошибка проверки: {error}")
-
-                    return True
-
-                error = await response.text()
-                logger.error(f"Ошибка API: {response.status} - {error}")
-                return False
+        response = await seatable_client.post(rows_url, json=payload, headers=headers)
+        if response.status in (200, 201):
+            result = response.json()
+            logger.info(f"Данные успешно сохранены. Ответ API: {result}")
+
+            # Дополнительная проверка - получаем добавленную строку
+            check_params = {"table_id": table_id}
+            check_resp = await seatable_client.get(rows_url, headers=headers, params=check_params)
+            if check_resp.status == 200:
+                check_data = check_resp.json()
+                logger.info(f"Проверка: в таблице {len(check_data.get('rows', []))} строк")
+                logger.debug(
+                    f"Последняя строка: {check_data.get('rows', [])[-1] if check_data.get('rows') else 'нет данных'}")
+            else:
+                logger.warning(f"Ошибка проверки: {check_resp.text}")
+
+            return True
+
+        # Запись отклонена из-за схемы — метаданные в кеше устарели
+        if is_schema_error(response.status, response.text):
+            invalidate_metadata('HR')
+
+        logger.error(f"Ошибка API: {response.status} - {response.text}")
+        return False
     except Exception as e:
         logger.error(f"Ошибка при сохранении: {e}")
         return False
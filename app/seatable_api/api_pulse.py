@@ -1,8 +1,8 @@
 import logging
-import aiohttp
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
 
-from app.seatable_api.api_base import get_base_token
+from app.seatable_api.api_base import get_base_token, read_table, invalidate_table_cache
+from app.seatable_api.api_client import seatable_client
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -34,15 +34,14 @@ async def create_pulse_task(task_data: Dict) -> bool:
         }
 
         # Отправляем запрос
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status in (200, 201):
-                    logger.info(f"Задача на пульс-опрос создана: {task_data.get('FIO')} - {task_data.get('Type')}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка создания задачи: {response.status} - {error_text}")
-                    return False
+        response = await seatable_client.post(url, json=payload, headers=headers)
+        if response.status in (200, 201):
+            invalidate_table_cache(Config.SEATABLE_PULSE_TASKS_ID, app='PULSE')
+            logger.info(f"Задача на пульс-опрос создана: {task_data.get('FIO')} - {task_data.get('Type')}")
+            return True
+        else:
+            logger.error(f"Ошибка создания задачи: {response.status} - {response.text}")
+            return False
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении задачи: {e}")
@@ -51,37 +50,28 @@ async def create_pulse_task(task_data: Dict) -> bool:
 
 async def get_pulse_tasks() -> Optional[list]:
     """
-    Получает список задач пульс-опросов
+    Получает список задач пульс-опросов (из кеша с инкрементальным обновлением)
     """
     try:
-        token_data = await get_base_token(app='PULSE')
-        if not token_data:
-            return None
-
-        url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}/rows/"
-
-        headers = {
-            "Authorization": f"Bearer {token_data['access_token']}",
-            "Accept": "application/json"
-        }
-
-        params = {"table_id": Config.SEATABLE_PULSE_TASKS_ID}
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("rows", [])
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка получения задач: {response.status} - {error_text}")
-                    return None
+        return await read_table(Config.SEATABLE_PULSE_TASKS_ID, app='PULSE')
 
     except Exception as e:
         logger.error(f"Ошибка при получении задач: {e}")
         return None
 
 
+async def get_pulse_task_keys() -> Optional[Set[Tuple[str, str]]]:
+    """
+    Возвращает множество пар (СНИЛС, тип опроса) для уже созданных задач.
+    Нужно, чтобы при пакетном создании задач не читать таблицу задач на каждую задачу
+    """
+    tasks = await get_pulse_tasks()
+    if tasks is None:
+        return None
+
+    return {(task.get('Name'), task.get('Type')) for task in tasks}
+
+
 async def task_exists(snils: str, poll_type: str) -> bool:
     """
     Проверяет, существует ли уже задача для данного пользователя и типа опроса
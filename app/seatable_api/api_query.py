@@ -0,0 +1,131 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.seatable_api.api_base import get_base_token, get_table_name, _normalize_app
+from app.seatable_api.api_client import seatable_client
+
+logger = logging.getLogger(__name__)
+
+
+def _sql_identifier(name: str) -> str:
+    """Имя таблицы или колонки в обратных кавычках"""
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _sql_literal(value: Any) -> str:
+    """Значение для WHERE. Строки экранируются, чтобы ID из Telegram не попадал в SQL как есть"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+async def query_rows(sql: str, app: str = "HR") -> Optional[List[Dict]]:
+    """
+    Выполняет SQL-запрос к базе через dtable-db и возвращает строки с названиями колонок.
+    При ошибке возвращает None — вызывающий код решает, читать ли таблицу целиком.
+    """
+    token_data = await get_base_token(_normalize_app(app))
+    if not token_data:
+        logger.error("Не удалось получить токен SeaTable")
+        return None
+
+    dtable_db = token_data.get('dtable_db')
+    if not dtable_db:
+        logger.warning("В токене нет адреса dtable_db, SQL-запросы недоступны")
+        return None
+
+    url = f"{dtable_db.rstrip('/')}/api/v1/query/{token_data['dtable_uuid']}/"
+    headers = {
+        "Authorization": f"Bearer {token_data['access_token']}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+    payload = {"sql": sql, "convert_keys": True}
+
+    try:
+        # SELECT ничего не меняет — его можно повторять как GET
+        response = await seatable_client.post(url, headers=headers, json=payload, idempotent=True)
+    except Exception as e:
+        logger.error(f"Ошибка SQL-запроса к SeaTable: {e}")
+        return None
+
+    if response.status != 200:
+        logger.error(f"Ошибка SQL-запроса: {response.status} - {response.text}")
+        return None
+
+    data = response.json()
+    if not data.get('success', True):
+        logger.error(f"SQL-запрос отклонен: {data.get('error_message')}")
+        return None
+
+    return data.get('results', [])
+
+
+async def select_rows(table_id: str, where: Dict[str, Any], columns: Optional[List[str]] = None,
+                      app: str = "HR", limit: Optional[int] = None) -> Optional[List[Dict]]:
+    """
+    Выбирает строки таблицы по условиям "колонка = значение" (через AND).
+    columns — какие колонки вернуть; без них вернутся все.
+    """
+    table_name = await get_table_name(table_id, app)
+    if not table_name:
+        logger.error(f"Не удалось определить имя таблицы {table_id}")
+        return None
+
+    projection = ", ".join(_sql_identifier(column) for column in columns) if columns else "*"
+    conditions = " AND ".join(
+        f"{_sql_identifier(column)} = {_sql_literal(value)}" for column, value in where.items()
+    )
+
+    sql = f"SELECT {projection} FROM {_sql_identifier(table_name)}"
+    if conditions:
+        sql += f" WHERE {conditions}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    return await query_rows(sql, app)
+
+
+# Больше строк SeaTable не отдает на один SQL-запрос
+_SQL_MAX_LIMIT = 10000
+
+
+def _normalize_sql_row(row: Dict) -> Dict:
+    """
+    Приводит строку из SQL к виду строк из /rows/: ссылки на другие таблицы SQL отдает
+    списком {'row_id', 'display_value'}, а /rows/ — списком row_id.
+    """
+    for column, value in row.items():
+        if isinstance(value, list) and value and isinstance(value[0], dict) and 'row_id' in value[0]:
+            row[column] = [item.get('row_id') for item in value]
+    return row
+
+
+async def select_changed_rows(table_id: str, since: str, app: str = "HR") -> Optional[List[Dict]]:
+    """
+    Строки таблицы, измененные начиная с since (значение _mtime).
+    Граница включается: строки с тем же _mtime придут повторно, но при наложении по _id это безопасно.
+    """
+    table_name = await get_table_name(table_id, app)
+    if not table_name:
+        logger.error(f"Не удалось определить имя таблицы {table_id}")
+        return None
+
+    changed = []
+    offset = 0
+    while True:
+        sql = (f"SELECT * FROM {_sql_identifier(table_name)} "
+               f"WHERE _mtime >= {_sql_literal(since)} ORDER BY _mtime "
+               f"LIMIT {_SQL_MAX_LIMIT} OFFSET {offset}")
+        rows = await query_rows(sql, app)
+        if rows is None:
+            return None
+
+        changed.extend(_normalize_sql_row(row) for row in rows)
+        if len(rows) < _SQL_MAX_LIMIT:
+            return changed
+        offset += _SQL_MAX_LIMIT
@@ -1,8 +1,8 @@
 import logging
-import aiohttp
 from typing import Dict, Optional
 
-from app.seatable_api.api_base import get_base_token
+from app.seatable_api.api_base import get_base_token, invalidate_table_cache
+from app.seatable_api.api_client import seatable_client
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -34,15 +34,14 @@ async def create_user_in_table(user_data: Dict) -> bool:
         }
 
         # Создаем запись
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status in (200, 201):
-                    logger.info(f"Пользователь создан: {user_data.get('FIO')}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка создания пользователя: {response.status} - {error_text}")
-                    return False
+        response = await seatable_client.post(url, json=payload, headers=headers)
+        if response.status in (200, 201):
+            invalidate_table_cache(Config.SEATABLE_USERS_TABLE_ID, app='USER')
+            logger.info(f"Пользователь создан: {user_data.get('FIO')}")
+            return True
+        else:
+            logger.error(f"Ошибка создания пользователя: {response.status} - {response.text}")
+            return False
 
     except Exception as e:
         logger.error(f"Ошибка при создании пользователя: {str(e)}")
@@ -76,15 +75,14 @@ async def update_user_in_table(row_id: str, user_data: Dict) -> bool:
         }
 
         # Обновляем запись
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    logger.info(f"Пользователь обновлен: {user_data.get('FIO')}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка обновления пользователя: {response.status} - {error_text}")
-                    return False
+        response = await seatable_client.put(url, json=payload, headers=headers)
+        if response.status == 200:
+            invalidate_table_cache(Config.SEATABLE_USERS_TABLE_ID, app='USER')
+            logger.info(f"Пользователь обновлен: {user_data.get('FIO')}")
+            return True
+        else:
+            logger.error(f"Ошибка обновления пользователя: {response.status} - {response.text}")
+            return False
 
     except Exception as e:
         logger.error(f"Ошибка при обновлении пользователя: {str(e)}")
@@ -124,15 +122,14 @@ async def mark_1c_user_as_processed(row_id: str) -> bool:
         }
 
         # Обновляем запись
-        async with aiohttp.ClientSession() as session:
-            async with session.put(url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    logger.info(f"Пользователь помечен как обработанный: {row_id}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка отметки пользователя: {response.status} - {error_text}")
-                    return False
+        response = await seatable_client.put(url, json=payload, headers=headers)
+        if response.status == 200:
+            invalidate_table_cache(Config.SEATABLE_1C_TABLE_ID, app='USER')
+            logger.info(f"Пользователь помечен как обработанный: {row_id}")
+            return True
+        else:
+            logger.error(f"Ошибка отметки пользователя: {response.status} - {response.text}")
+            return False
 
     except Exception as e:
         logger.error(f"Ошибка при отметке пользователя: {str(e)}")
@@ -1,29 +1,51 @@
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 
-from aiogram.client.session import aiohttp
-
-from app.seatable_api.api_base import fetch_table, get_base_token
+from app.seatable_api.api_base import get_base_token, invalidate_table_cache
+from app.seatable_api.api_client import seatable_client
+from app.seatable_api.api_query import select_rows
+from app.services.users_replica import users_replica
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+
+async def find_user_by_id_messenger(user_id, columns: Optional[List[str]] = None) -> Optional[Dict]:
+    """
+    Находит строку пользователя по ID_messenger.
+    Когда копия таблицы пользователей загружена, ищет по ее индексу без запросов к SeaTable.
+    До первой загрузки копии ищет SQL-запросом: SeaTable сам фильтрует таблицу и возвращает только колонки columns.
+    Возвращает None, если пользователь не найден; если таблица недоступна, бросает SeaTableError.
+    """
+    if users_replica.ready:
+        return await users_replica.get_by_messenger_id(user_id)
+
+    rows = await select_rows(
+        Config.SEATABLE_USERS_TABLE_ID,
+        where={'ID_messenger': str(user_id)},
+        columns=columns,
+        app='USER',
+        limit=1
+    )
+    if rows is not None:
+        return rows[0] if rows else None
+
+    logger.warning("SQL-запрос не выполнен, загружаем копию таблицы пользователей")
+    return await users_replica.get_by_messenger_id(user_id)
+
+
 async def get_role_from_st(user_id: str) -> Optional[str]:
     """Получает роль пользователя из Seatable"""
     try:
-        # Получаем данные пользователя из таблицы
-        users_data = await fetch_table(table_id=Config.SEATABLE_USERS_TABLE_ID, app='USER')
-
         logger.info(f"Ищем пользователя с ID_messenger: {user_id} в таблице доступов и ролей, чтобы определить роль")
 
-        for i, user in enumerate(users_data):
-            current_id = str(user.get('ID_messenger'))
-            search_id = str(user_id)
+        # Запрашиваем только строку пользователя
+        user = await find_user_by_id_messenger(user_id, columns=['FIO', 'Role'])
 
-            if current_id == search_id:
-                role = user.get('Role')
-                logger.info(f"Найдены пользователь {i}: {user.get('FIO')}, и его роль {role}")
-                return role
+        if user:
+            role = user.get('Role')
+            logger.info(f"Найден пользователь: {user.get('FIO')}, и его роль {role}")
+            return role
 
         logger.warning(f"Пользователь {user_id} не найден в таблице")
         return None
@@ -50,8 +72,7 @@ async def change_user_role(user_id: int, new_role: str) -> bool:
         }
 
         # Получаем пользователя
-        users = await fetch_table(table_id=Config.SEATABLE_USERS_TABLE_ID, app='USER')
-        user_row = next((u for u in users if str(u.get('ID_messenger')) == str(user_id)), None)
+        user_row = await find_user_by_id_messenger(user_id, columns=['_id'])
 
         if not user_row:
             logger.error(f"User {user_id} not found")
@@ -71,15 +92,14 @@ async def change_user_role(user_id: int, new_role: str) -> bool:
             }
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.put(base_url, headers=headers, json=update_data) as resp:
-                if resp.status == 200:
-                    logger.info(f"Role changed to {new_role} for user {user_id}")
-                    return True
-                else:
-                    error = await resp.text()
-                    logger.error(f"Error updating role: {error}")
-                    return False
+        resp = await seatable_client.put(base_url, headers=headers, json=update_data)
+        if resp.status == 200:
+            invalidate_table_cache(Config.SEATABLE_USERS_TABLE_ID, app='USER')
+            logger.info(f"Role changed to {new_role} for user {user_id}")
+            return True
+        else:
+            logger.error(f"Error updating role: {resp.text}")
+            return False
 
     except Exception as e:
         logger.error(f"Error changing role for {user_id}: {str(e)}", exc_info=True)
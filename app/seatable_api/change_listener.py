@@ -0,0 +1,175 @@
+import json
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit, urlencode
+
+import aiohttp
+
+from config import Config
+from app.seatable_api.api_base import (
+    get_base_token, table_cache, invalidate_metadata, _APPS
+)
+
+logger = logging.getLogger(__name__)
+
+# Операции SeaTable, после которых меняется схема базы
+_SCHEMA_OPS = {
+    'insert_column', 'delete_column', 'rename_column', 'modify_column_type', 'update_column_data',
+    'insert_table', 'delete_table', 'rename_table'
+}
+
+# Операции удаления строк — их можно наложить на кеш точно, не перечитывая таблицу
+_DELETE_OPS = {'delete_row', 'delete_rows'}
+
+
+def _socket_url(dtable_socket: str, dtable_uuid: str) -> str:
+    """Адрес websocket Socket.IO: ws(s)://host/socket.io/?EIO=...&transport=websocket&dtable_uuid=..."""
+    parts = urlsplit(dtable_socket)
+    scheme = 'wss' if parts.scheme == 'https' else 'ws'
+    path = parts.path.rstrip('/') + '/' + Config.SEATABLE_SOCKET_PATH.strip('/') + '/'
+    query = urlencode({'EIO': Config.SEATABLE_SOCKET_EIO, 'transport': 'websocket', 'dtable_uuid': dtable_uuid})
+    return urlunsplit((scheme, parts.netloc, path, query, ''))
+
+
+def _parse_operation(data: Any) -> Optional[Dict]:
+    """Операция из события update-dtable: SeaTable присылает ее словарем или JSON-строкой"""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
+class ChangeListener:
+    """
+    Слушает изменения баз SeaTable по сокету (dtable_socket из токена) и сбрасывает ровно те записи кешей,
+    которых они касаются: строки — кеш таблицы (инкрементальные таблицы дочитают дельту), удаления строк —
+    накладываются на копию сразу, изменения колонок и таблиц — еще и кеш метаданных.
+    Пока сокет базы подключен, ее таблицы кешируются на SEATABLE_PUSH_CACHE_TTL.
+
+    Socket.IO поверх websocket разобран вручную (Engine.IO 3 и 4), отдельная библиотека не нужна.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.events = 0
+        self.reconnects = 0
+
+    async def run(self) -> None:
+        """Слушает все базы до отмены задачи"""
+        self._session = aiohttp.ClientSession()
+        try:
+            await asyncio.gather(*(self._run_app(app) for app in _APPS))
+        finally:
+            await self._session.close()
+            self._session = None
+
+    async def _run_app(self, app: str) -> None:
+        """Держит подключение одной базы, переподключаясь с нарастающей паузой"""
+        delay = 1.0
+        while True:
+            try:
+                await self._listen(app)
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Сокет изменений SeaTable ({app}) разорван: {e!r}")
+            finally:
+                if app in table_cache.push_apps:
+                    table_cache.push_apps.discard(app)
+                    # Изменения, пришедшие за время разрыва, потеряны — таблицы базы перечитаются в фоне
+                    table_cache.expire(app)
+
+            self.reconnects += 1
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, Config.SEATABLE_SOCKET_RECONNECT_MAX)
+
+    async def _listen(self, app: str) -> None:
+        token_data = await get_base_token(app)
+        if not token_data or not token_data.get('dtable_socket'):
+            raise ConnectionError("нет токена или адреса dtable_socket")
+
+        dtable_uuid = token_data['dtable_uuid']
+        url = _socket_url(token_data['dtable_socket'], dtable_uuid)
+        async with self._session.ws_connect(url, heartbeat=None) as ws:
+            ping_task: Optional[asyncio.Task] = None
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        if message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                        continue
+
+                    packet = message.data
+                    if packet.startswith('0'):
+                        # Открытие Engine.IO: в версии 3 пинг шлет клиент, в версии 4 — сервер
+                        handshake = json.loads(packet[1:] or '{}')
+                        if str(Config.SEATABLE_SOCKET_EIO) == '3':
+                            interval = handshake.get('pingInterval', 25000) / 1000
+                            ping_task = asyncio.create_task(self._ping(ws, interval))
+                        else:
+                            await ws.send_str('40')
+                    elif packet == '2':
+                        await ws.send_str('3')
+                    elif packet.startswith('40'):
+                        await ws.send_str('42' + json.dumps(['join-room', dtable_uuid, token_data['access_token']]))
+                        table_cache.push_apps.add(app)
+                        # Пока сокет не был подключен, изменения не отслеживались
+                        table_cache.expire(app)
+                        logger.info(f"Сокет изменений SeaTable ({app}) подключен")
+                    elif packet.startswith('42'):
+                        self._on_event(app, json.loads(packet[2:]))
+                    elif packet.startswith('44') or packet.startswith('41') or packet == '1':
+                        raise ConnectionError(f"сервер закрыл подключение: {packet}")
+            finally:
+                if ping_task is not None:
+                    ping_task.cancel()
+
+    @staticmethod
+    async def _ping(ws: aiohttp.ClientWebSocketResponse, interval: float) -> None:
+        while not ws.closed:
+            await asyncio.sleep(interval)
+            await ws.send_str('2')
+
+    def _on_event(self, app: str, event: List) -> None:
+        if not event or event[0] != 'update-dtable':
+            return
+        for data in event[1:]:
+            operation = _parse_operation(data)
+            if operation is not None:
+                self.apply_operation(app, operation)
+
+    def apply_operation(self, app: str, operation: Dict) -> None:
+        """Сбрасывает или правит записи кешей, затронутые одной операцией SeaTable"""
+        self.events += 1
+        op_type = operation.get('op_type')
+        table_id = operation.get('table_id')
+
+        if op_type in _SCHEMA_OPS:
+            invalidate_metadata(app)
+
+        if not table_id:
+            return
+
+        if op_type in _DELETE_OPS:
+            row_ids = operation.get('row_ids') or [operation.get('row_id')]
+            table_cache.remove_rows(app, table_id, [row_id for row_id in row_ids if row_id])
+            return
+
+        table_cache.invalidate(table_id, app)
+        logger.debug(f"Изменение {op_type} в таблице {app}:{table_id}, кеш сброшен")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": sorted(table_cache.push_apps),
+            "events": self.events,
+            "reconnects": self.reconnects
+        }
+
+
+# Глобальный экземпляр
+change_listener = ChangeListener()
@@ -0,0 +1,652 @@
+"""
+Локальная замена SeaTable для нагрузочных тестов и работы без доступа к боевому серверу.
+
+Поднимает aiohttp-сервер с эндпоинтами, которыми пользуется бот: app-access-token, rows (GET/POST/PUT/DELETE),
+пакетные операции со строками, metadata, columns и SQL (dtable-db). Таблицы заполняются синтетическими данными
+по seed, поэтому прогоны повторяемы. Задержка, доля ошибок и ограничение частоты запросов настраиваются.
+Изменения строк и колонок рассылаются по сокету (/socket.io/, Engine.IO 3 и 4) событием update-dtable,
+как это делает SeaTable, — на нем проверяется слушатель изменений.
+
+Запуск:
+    python -m app.seatable_api.fake_server --port 8090 --users 3000 --latency 0.05 --error-rate 0.01
+
+Сервер печатает переменные окружения, которые нужно выставить боту (SEATABLE_SERVER, ключи API и table_id).
+"""
+import re
+import json
+import time
+import uuid
+import random
+import string
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ключи API баз по умолчанию, если в окружении их нет
+_DEFAULT_API_TOKENS = {
+    'HR': 'fake-hr-api-token',
+    'USER': 'fake-user-api-token',
+    'PULSE': 'fake-pulse-api-token'
+}
+
+_FIRST_NAMES = ['Иван', 'Петр', 'Анна', 'Мария', 'Олег', 'Елена', 'Сергей', 'Ольга', 'Дмитрий', 'Наталья']
+_LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов',
+               'Новиков']
+_DEPARTMENTS = ['IT', 'HR', 'Бухгалтерия', 'Продажи', 'Логистика', 'Склад', 'Маркетинг']
+_POSITIONS = ['Специалист', 'Старший специалист', 'Руководитель', 'Менеджер', 'Аналитик']
+_COMPANIES = ['ООО «Мавис»', 'ООО «Вотоня»']
+_POLL_TYPES = ['1_week', '1_month', '3_months', '6_months', '1_year']
+
+
+def _iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def _row_id(rng: random.Random) -> str:
+    alphabet = string.ascii_letters + string.digits + '-_'
+    return ''.join(rng.choice(alphabet) for _ in range(22))
+
+
+class FakeTable:
+    """Таблица: колонки и строки в порядке добавления"""
+
+    def __init__(self, table_id: str, name: str, link_columns: Tuple[str, ...] = ()):
+        self.id = table_id
+        self.name = name
+        self.link_columns = set(link_columns)
+        self.columns: Dict[str, Dict] = {}
+        self.rows: Dict[str, Dict] = {}
+
+    def add_column(self, name: str, column_type: str = 'text', options: Optional[List[str]] = None) -> None:
+        if name in self.columns or name.startswith('_'):
+            return
+        column = {'key': f"{len(self.columns):04d}", 'name': name, 'type': column_type, 'data': None}
+        if options is not None:
+            column['data'] = {'options': [{'id': str(i), 'name': option} for i, option in enumerate(options)]}
+        self.columns[name] = column
+
+    def put(self, row: Dict, row_id: Optional[str] = None, rng: Optional[random.Random] = None) -> Dict:
+        """Добавляет строку или обновляет существующую, проставляя системные колонки"""
+        now = _iso(datetime.now(timezone.utc))
+        row_id = row_id or row.get('_id') or _row_id(rng or random.Random())
+        current = self.rows.get(row_id)
+        if current is None:
+            current = {'_id': row_id, '_ctime': row.get('_ctime', now)}
+            self.rows[row_id] = current
+
+        for name in row:
+            if name not in self.columns and not name.startswith('_'):
+                self.add_column(name, 'link' if name in self.link_columns else 'text')
+        current.update({k: v for k, v in row.items() if not k.startswith('_')})
+        current['_mtime'] = row.get('_mtime', now)
+        return current
+
+    def metadata(self) -> Dict:
+        return {'_id': self.id, 'name': self.name, 'columns': list(self.columns.values())}
+
+
+class FakeBase:
+    """База SeaTable: uuid и набор таблиц"""
+
+    def __init__(self, app: str, name: str):
+        self.app = app
+        self.name = name
+        self.uuid = uuid.uuid4().hex
+        self.tables: Dict[str, FakeTable] = {}
+        self.version = 1
+
+        # Окно ограничения частоты запросов
+        self.window_started = time.monotonic()
+        self.window_requests = 0
+
+    def add_table(self, table: FakeTable) -> FakeTable:
+        self.tables[table.id] = table
+        return table
+
+    def find_table(self, table_id: Optional[str] = None, table_name: Optional[str] = None) -> Optional[FakeTable]:
+        if table_id and table_id in self.tables:
+            return self.tables[table_id]
+        if table_name:
+            return next((t for t in self.tables.values() if t.name == table_name), None)
+        return None
+
+
+def _table_ids() -> Dict[str, str]:
+    """table_id из окружения, а если их нет — короткие идентификаторы по умолчанию"""
+    return {
+        'main_employee': Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID or '0000',
+        'main_newcomer': Config.SEATABLE_MAIN_MENU_NEWCOMER_ID or '0001',
+        'broadcast': Config.BROADCAST_TABLE_ID or 'bc01',
+        'users': Config.SEATABLE_USERS_TABLE_ID or 'usr1',
+        '1c': Config.SEATABLE_1C_TABLE_ID or '1c01',
+        'employee_book': Config.SEATABLE_EMPLOYEE_BOOK_ID or 'emp1',
+        'admin': Config.SEATABLE_ADMIN_TABLE_ID or 'adm1',
+        'pulse_tasks': Config.SEATABLE_PULSE_TASKS_ID or 'ptk1',
+        'pulse_content': Config.SEATABLE_PULSE_CONTENT_ID or 'pct1',
+    }
+
+
+def seed_bases(seed: int = 1, users: int = 1000, unprocessed_1c: int = 50, employees: int = 500,
+               menu_buttons: int = 8) -> Dict[str, FakeBase]:
+    """Создает три базы (HR, USER, PULSE) с синтетическими данными. Одинаковый seed — одинаковые данные"""
+    rng = random.Random(seed)
+    ids = _table_ids()
+    today = datetime.now(timezone.utc)
+
+    def fio() -> str:
+        return f"{rng.choice(_LAST_NAMES)} {rng.choice(_FIRST_NAMES)}"
+
+    def snils(i: int) -> str:
+        return f"{100000000 + i:09d}{rng.randint(10, 99)}"
+
+    def phone(i: int) -> str:
+        return f"+79{i:09d}"[-12:]
+
+    # HR: меню, подменю и уведомления
+    hr = FakeBase('HR', 'Мавис-HR')
+    for key, title in (('main_employee', 'Главное меню'), ('main_newcomer', 'Меню новичка')):
+        menu = hr.add_table(FakeTable(ids[key], title))
+        menu.put({'Name': 'Info', 'Content': f"**{title}**\nВыберите раздел"}, rng=rng)
+        for i in range(menu_buttons):
+            submenu_id = f"s{key[5]}{i:02d}"
+            submenu = hr.add_table(FakeTable(submenu_id, f"{title} / раздел {i + 1}"))
+            submenu.put({'Name': 'Info', 'Content': f"Раздел {i + 1}"}, rng=rng)
+            for j in range(3):
+                submenu.put({'Name': f"Вопрос {j + 1}", 'Button_content': f"Ответ на вопрос {j + 1} раздела {i + 1}"},
+                            rng=rng)
+            menu.put({'Name': f"Раздел {i + 1}",
+                      'Submenu_link': f"https://seatable.local/dtable/links/x?tid={submenu_id}&vid=0000"}, rng=rng)
+    broadcast = hr.add_table(FakeTable(ids['broadcast'], 'Уведомления'))
+    broadcast.put({'Name': 'Тестовое уведомление', 'Content': 'Текст уведомления'}, rng=rng)
+
+    # USER: пользователи, выгрузка 1С, справочник, админы
+    user = FakeBase('USER', 'Пользователи')
+    users_table = user.add_table(FakeTable(ids['users'], 'Users'))
+    one_c = user.add_table(FakeTable(ids['1c'], '1C'))
+    book = user.add_table(FakeTable(ids['employee_book'], 'Справочник'))
+    book.add_column('Department', 'single-select', _DEPARTMENTS)
+    admins = user.add_table(FakeTable(ids['admin'], 'Админы', link_columns=('ID_messenger',)))
+
+    user_rows = []
+    for i in range(users):
+        employed = today - timedelta(days=rng.randint(10, 2000))
+        row = users_table.put({
+            'FIO': fio(),
+            'Name': snils(i),
+            'Phone': phone(i),
+            'Email': f"user{i}@example.com",
+            'Department': rng.choice(_DEPARTMENTS),
+            'Position': rng.choice(_POSITIONS),
+            'Main_company': rng.choice(_COMPANIES),
+            'Role': 'newcomer' if (today - employed).days < 91 else 'employee',
+            # Примерно 70% сотрудников уже зарегистрированы в боте
+            'ID_messenger': str(100000000 + i) if rng.random() < 0.7 else '',
+            'Data_employment': employed.date().isoformat()
+        }, rng=rng)
+        user_rows.append(row)
+
+        one_c.put({
+            'Name': row['Name'], 'FIO': row['FIO'], 'Phone_private': row['Phone'], 'Email': row['Email'],
+            'Department': row['Department'], 'Position': row['Position'], 'Main_company': row['Main_company'],
+            'Companies': [row['Main_company']], 'Data_employment': row['Data_employment'], 'Processed': True
+        }, rng=rng)
+
+    # Новые сотрудники в выгрузке 1С, которых еще нет в таблице пользователей
+    for i in range(users, users + unprocessed_1c):
+        employed = today - timedelta(days=rng.randint(0, 60))
+        one_c.put({
+            'Name': snils(i), 'FIO': fio(), 'Phone_private': phone(i), 'Email': f"user{i}@example.com",
+            'Department': rng.choice(_DEPARTMENTS), 'Position': rng.choice(_POSITIONS),
+            'Main_company': rng.choice(_COMPANIES), 'Companies': [rng.choice(_COMPANIES)],
+            'Data_employment': employed.date().isoformat(), 'Processed': False
+        }, rng=rng)
+
+    for i in range(employees):
+        book.put({
+            'Name/Department': fio(), 'Department': rng.choice(_DEPARTMENTS), 'Position': rng.choice(_POSITIONS),
+            'Number': 100 + i, 'Email': f"staff{i}@example.com", 'Location': f"офис №{rng.randint(1, 5)}",
+            'Company': [rng.choice(_COMPANIES)], 'Photo': []
+        }, rng=rng)
+
+    registered = [row for row in user_rows if row.get('ID_messenger')]
+    for row in registered[:3]:
+        admins.put({'FIO': row['FIO'], 'ID_messenger': [row['_id']],
+                    'Content+broadcast_admin': True, 'Pulse_admin': True}, rng=rng)
+
+    # PULSE: контент опросов и задачи
+    pulse = FakeBase('PULSE', 'Пульс-опросы')
+    content = pulse.add_table(FakeTable(ids['pulse_content'], 'Контент'))
+    for poll_type in _POLL_TYPES + ['exit']:
+        content.put({'Type': poll_type, 'Content': f"Опрос {poll_type}: как у вас дела?"}, rng=rng)
+    tasks = pulse.add_table(FakeTable(ids['pulse_tasks'], 'Задачи'))
+    for row in user_rows:
+        if row['Role'] != 'newcomer':
+            continue
+        for poll_type in _POLL_TYPES:
+            tasks.put({
+                'FIO': row['FIO'], 'Name': row['Name'], 'Type': poll_type, 'Status': 'waiting',
+                'Data_poll': (today + timedelta(days=rng.randint(0, 30))).date().isoformat()
+            }, rng=rng)
+
+    return {'HR': hr, 'USER': user, 'PULSE': pulse}
+
+
+# Простейший разбор SQL в том виде, в каком его формирует api_query
+_SQL_RE = re.compile(
+    r"^\s*SELECT\s+(?P<columns>.+?)\s+FROM\s+(?P<table>`(?:[^`]|``)+`|\S+)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>\S+)(?:\s+(?P<direction>ASC|DESC))?)?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+)(?:\s+OFFSET\s+(?P<offset>\d+))?)?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_CONDITION_RE = re.compile(
+    r"(`(?:[^`]|``)+`|\w+)\s*(>=|<=|!=|=|>|<)\s*('(?:[^'\\]|''|\\.)*'|[^\s]+)(?:\s+AND\s+|\s*$)",
+    re.IGNORECASE
+)
+
+
+def _unquote_identifier(value: str) -> str:
+    value = value.strip()
+    if value.startswith('`') and value.endswith('`'):
+        return value[1:-1].replace('``', '`')
+    return value
+
+
+def _parse_literal(value: str) -> Any:
+    if value.startswith("'") and value.endswith("'"):
+        return value[1:-1].replace("''", "'").replace("\\\\", "\\")
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    if value.upper() == 'NULL':
+        return None
+    try:
+        return float(value) if '.' in value else int(value)
+    except ValueError:
+        return value
+
+
+def _compare(left: Any, op: str, right: Any) -> bool:
+    if op == '=':
+        return str(left) == str(right) if left is not None and right is not None else left == right
+    if op == '!=':
+        return str(left) != str(right)
+    if left is None:
+        return False
+    left, right = str(left), str(right)
+    return {'>': left > right, '<': left < right, '>=': left >= right, '<=': left <= right}[op]
+
+
+class FakeSeaTable:
+    """Состояние фейкового сервера и обработчики эндпоинтов"""
+
+    def __init__(self, bases: Dict[str, FakeBase], latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: int = 0, seed: int = 1):
+        self.bases = bases
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._rng = random.Random(seed)
+
+        self.api_tokens = {
+            (Config.SEATABLE_API_APP_TOKEN or _DEFAULT_API_TOKENS['HR']): 'HR',
+            (Config.SEATABLE_API_USER_TOKEN or _DEFAULT_API_TOKENS['USER']): 'USER',
+            (Config.SEATABLE_API_PULSE_TOKEN or _DEFAULT_API_TOKENS['PULSE']): 'PULSE',
+        }
+        self.access_tokens: Dict[str, FakeBase] = {}
+        # Подключенные сокеты по uuid базы
+        self._sockets: Dict[str, set] = {}
+
+        # Счетчики запросов по эндпоинтам и внедренных сбоев
+        self.requests: Dict[str, int] = {}
+        self.injected_errors = 0
+        self.rate_limited = 0
+
+    # --- инфраструктура ---
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._inject_faults])
+        app.router.add_get('/api/v2.1/dtable/app-access-token/', self.app_access_token)
+        prefix = '/dtable-server/api/v1/dtables/{uuid}'
+        app.router.add_route('*', prefix + '/rows/', self.rows)
+        app.router.add_post(prefix + '/batch-append-rows/', self.batch_append)
+        app.router.add_put(prefix + '/batch-update-rows/', self.batch_update)
+        app.router.add_delete(prefix + '/batch-delete-rows/', self.batch_delete)
+        app.router.add_get(prefix + '/metadata/', self.metadata)
+        app.router.add_route('*', prefix + '/columns/', self.columns)
+        app.router.add_post('/dtable-db/api/v1/query/{uuid}/', self.query)
+        app.router.add_get('/socket.io/', self.socket)
+        app.router.add_get('/_fake/stats', self.stats)
+        app.router.add_post('/_fake/emit', self.fake_emit)
+        return app
+
+    @web.middleware
+    async def _inject_faults(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+        if request.path.startswith('/_fake/') or request.path.startswith('/socket.io/'):
+            return await handler(request)
+
+        base = self._base_for_limit(request)
+        if base is not None and self.rate_limit:
+            now = time.monotonic()
+            if now - base.window_started >= 60:
+                base.window_started, base.window_requests = now, 0
+            base.window_requests += 1
+            if base.window_requests > self.rate_limit:
+                self.rate_limited += 1
+                retry_after = max(1, int(60 - (now - base.window_started)) + 1)
+                return web.json_response({'error_msg': 'too many requests'}, status=429,
+                                         headers={'Retry-After': str(retry_after)})
+
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return web.json_response({'error_msg': 'injected failure'}, status=503)
+
+        return await handler(request)
+
+    def _base_for_limit(self, request: web.Request) -> Optional[FakeBase]:
+        dtable_uuid = request.match_info.get('uuid')
+        return next((b for b in self.bases.values() if b.uuid == dtable_uuid), None)
+
+    def _authorize(self, request: web.Request) -> FakeBase:
+        auth = request.headers.get('Authorization', '')
+        token = auth.split(' ', 1)[1] if ' ' in auth else ''
+        base = self.access_tokens.get(token)
+        if base is None or base.uuid != request.match_info.get('uuid'):
+            raise web.HTTPForbidden(text='{"error_msg": "Permission denied."}', content_type='application/json')
+        return base
+
+    @staticmethod
+    def _table(base: FakeBase, table_id: Optional[str], table_name: Optional[str]) -> FakeTable:
+        table = base.find_table(table_id, table_name)
+        if table is None:
+            raise web.HTTPNotFound(text='{"error_msg": "table not found"}', content_type='application/json')
+        return table
+
+    # --- эндпоинты ---
+
+    async def app_access_token(self, request: web.Request) -> web.Response:
+        auth = request.headers.get('Authorization') or request.headers.get('authorization', '')
+        app = self.api_tokens.get(auth.split(' ', 1)[1] if ' ' in auth else '')
+        if app is None:
+            return web.json_response({'error_msg': 'Permission denied.'}, status=403)
+
+        base = self.bases[app]
+        access_token = uuid.uuid4().hex
+        self.access_tokens[access_token] = base
+        root = f"{request.scheme}://{request.host}"
+        return web.json_response({
+            'app_name': f"fake-{app.lower()}",
+            'access_token': access_token,
+            'dtable_uuid': base.uuid,
+            'dtable_server': f"{root}/dtable-server/",
+            'dtable_socket': f"{root}/",
+            'dtable_db': f"{root}/dtable-db/",
+            'workspace_id': 1,
+            'dtable_name': base.name
+        })
+
+    async def rows(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+
+        if request.method == 'GET':
+            table = self._table(base, request.query.get('table_id'), request.query.get('table_name'))
+            start = int(request.query.get('start', 0))
+            limit = min(int(request.query.get('limit', 1000)), 1000)
+            rows = list(table.rows.values())[start:start + limit]
+            return web.json_response({'rows': rows})
+
+        body = await request.json()
+        table = self._table(base, body.get('table_id'), body.get('table_name'))
+
+        if request.method == 'POST':
+            row = table.put(body.get('row', {}), rng=self._rng)
+            await self.emit(base, {'op_type': 'insert_row', 'table_id': table.id, 'row_data': row})
+            return web.json_response(row)
+        if request.method == 'PUT':
+            if body.get('row_id') not in table.rows:
+                return web.json_response({'error_msg': 'row not found'}, status=404)
+            table.put(body.get('row', {}), row_id=body['row_id'])
+            await self.emit(base, {'op_type': 'modify_row', 'table_id': table.id, 'row_id': body['row_id'],
+                                   'updated': body.get('row', {})})
+            return web.json_response({'success': True})
+        if request.method == 'DELETE':
+            table.rows.pop(body.get('row_id'), None)
+            await self.emit(base, {'op_type': 'delete_row', 'table_id': table.id, 'row_id': body.get('row_id')})
+            return web.json_response({'deleted_rows': 1})
+        raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST', 'PUT', 'DELETE'])
+
+    async def batch_append(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        body = await request.json()
+        table = self._table(base, body.get('table_id'), body.get('table_name'))
+        rows = body.get('rows', [])
+        if len(rows) > 1000:
+            return web.json_response({'error_msg': 'too many rows'}, status=400)
+        first_rows = [table.put(row, rng=self._rng) for row in rows]
+        await self.emit(base, {'op_type': 'insert_rows', 'table_id': table.id,
+                               'row_ids': [row['_id'] for row in first_rows]})
+        return web.json_response({'inserted_row_count': len(first_rows),
+                                  'first_row': first_rows[0] if first_rows else None})
+
+    async def batch_update(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        body = await request.json()
+        table = self._table(base, body.get('table_id'), body.get('table_name'))
+        updates = body.get('updates', [])
+        missing = [u.get('row_id') for u in updates if u.get('row_id') not in table.rows]
+        if missing:
+            return web.json_response({'error_msg': f"rows not found: {missing[:5]}"}, status=404)
+        for update in updates:
+            table.put(update.get('row', {}), row_id=update['row_id'])
+        await self.emit(base, {'op_type': 'modify_rows', 'table_id': table.id,
+                               'row_ids': [update['row_id'] for update in updates]})
+        return web.json_response({'success': True})
+
+    async def batch_delete(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        body = await request.json()
+        table = self._table(base, body.get('table_id'), body.get('table_name'))
+        row_ids = body.get('row_ids', [])
+        deleted = sum(1 for row_id in row_ids if table.rows.pop(row_id, None) is not None)
+        await self.emit(base, {'op_type': 'delete_rows', 'table_id': table.id, 'row_ids': row_ids})
+        return web.json_response({'deleted_rows': deleted})
+
+    async def metadata(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        return web.json_response({'metadata': {
+            'version': base.version,
+            'format_version': 1,
+            'tables': [table.metadata() for table in base.tables.values()]
+        }})
+
+    async def columns(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        if request.method == 'GET':
+            table = self._table(base, request.query.get('table_id'), request.query.get('table_name'))
+            return web.json_response({'columns': list(table.columns.values())})
+
+        if request.method == 'POST':
+            body = await request.json()
+            table = self._table(base, body.get('table_id'), body.get('table_name'))
+            name = body.get('column_name')
+            if not name or name in table.columns:
+                return web.json_response({'error_msg': 'column exists'}, status=400)
+            table.add_column(name, body.get('column_type', 'text'))
+            base.version += 1
+            await self.emit(base, {'op_type': 'insert_column', 'table_id': table.id, 'column': table.columns[name]})
+            return web.json_response(table.columns[name])
+        raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+    async def query(self, request: web.Request) -> web.Response:
+        base = self._authorize(request)
+        body = await request.json()
+        match = _SQL_RE.match(body.get('sql', ''))
+        if not match:
+            return web.json_response({'success': False, 'error_message': 'unsupported sql'}, status=400)
+
+        table = base.find_table(table_name=_unquote_identifier(match.group('table')))
+        if table is None:
+            return web.json_response({'success': False, 'error_message': 'table not found'}, status=400)
+
+        conditions = []
+        where = match.group('where')
+        if where:
+            for column, op, literal in _CONDITION_RE.findall(where):
+                conditions.append((_unquote_identifier(column), op, _parse_literal(literal)))
+
+        rows = [row for row in table.rows.values()
+                if all(_compare(row.get(column), op, value) for column, op, value in conditions)]
+
+        order = match.group('order')
+        if order:
+            column = _unquote_identifier(order)
+            rows.sort(key=lambda r: str(r.get(column) or ''),
+                      reverse=(match.group('direction') or '').upper() == 'DESC')
+
+        offset = int(match.group('offset') or 0)
+        limit = min(int(match.group('limit') or 100), 10000)
+        rows = rows[offset:offset + limit]
+
+        projection = match.group('columns').strip()
+        names = None if projection == '*' else [_unquote_identifier(c) for c in projection.split(',')]
+        results = [self._sql_row(table, row, names) for row in rows]
+        return web.json_response({'success': True, 'results': results, 'metadata': list(table.columns.values())})
+
+    @staticmethod
+    def _sql_row(table: FakeTable, row: Dict, names: Optional[List[str]]) -> Dict:
+        """Строка в формате SQL: ссылки отдаются списком {'row_id', 'display_value'}"""
+        selected = {name: row.get(name) for name in names} if names else dict(row)
+        for name in table.link_columns:
+            if isinstance(selected.get(name), list):
+                selected[name] = [{'row_id': value, 'display_value': value} for value in selected[name]]
+        return selected
+
+    async def socket(self, request: web.Request) -> web.WebSocketResponse:
+        """Минимальный сервер Socket.IO: рукопожатие, пинги и комната базы по событию join-room"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        sid = uuid.uuid4().hex
+        await ws.send_str('0' + json.dumps({'sid': sid, 'upgrades': [], 'pingInterval': 25000, 'pingTimeout': 20000}))
+        if request.query.get('EIO') == '3':
+            # В Engine.IO 3 сервер сам подключает пространство имен по умолчанию
+            await ws.send_str('40')
+
+        room = None
+        try:
+            async for message in ws:
+                if message.type != web.WSMsgType.TEXT:
+                    continue
+                packet = message.data
+                if packet == '2':
+                    await ws.send_str('3')
+                elif packet == '40':
+                    await ws.send_str('40' + json.dumps({'sid': sid}))
+                elif packet.startswith('42'):
+                    event = json.loads(packet[2:])
+                    if event[0] == 'join-room' and len(event) >= 3:
+                        base = self.access_tokens.get(event[2])
+                        if base is not None and base.uuid == event[1]:
+                            room = base.uuid
+                            self._sockets.setdefault(room, set()).add(ws)
+        finally:
+            if room is not None:
+                self._sockets.get(room, set()).discard(ws)
+        return ws
+
+    async def emit(self, base: FakeBase, operation: Dict) -> None:
+        """Рассылает операцию подписчикам базы — так же, как SeaTable: событие update-dtable с JSON-строкой"""
+        packet = '42' + json.dumps(['update-dtable', json.dumps(operation, ensure_ascii=False)], ensure_ascii=False)
+        for ws in list(self._sockets.get(base.uuid, ())):
+            if not ws.closed:
+                await ws.send_str(packet)
+
+    async def fake_emit(self, request: web.Request) -> web.Response:
+        """Рассылает произвольную операцию: {"app": "HR", "operation": {...}} — имитация правки в интерфейсе SeaTable"""
+        body = await request.json()
+        base = self.bases.get(body.get('app', 'HR'))
+        if base is None:
+            return web.json_response({'error_msg': 'unknown app'}, status=400)
+        await self.emit(base, body.get('operation', {}))
+        return web.json_response({'success': True, 'subscribers': len(self._sockets.get(base.uuid, ()))})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'requests': self.requests,
+            'injected_errors': self.injected_errors,
+            'rate_limited': self.rate_limited,
+            'tables': {b.app: {t.id: len(t.rows) for t in b.tables.values()} for b in self.bases.values()}
+        })
+
+    def env(self, server_url: str) -> Dict[str, str]:
+        """Переменные окружения, которые направят бота на этот сервер"""
+        ids = _table_ids()
+        tokens = {app: token for token, app in self.api_tokens.items()}
+        return {
+            'SEATABLE_SERVER': server_url,
+            'SEATABLE_API_APP_TOKEN': tokens['HR'],
+            'SEATABLE_API_USER_TOKEN': tokens['USER'],
+            'SEATABLE_API_PULSE_TOKEN': tokens['PULSE'],
+            'SEATABLE_MAIN_MENU_EMPLOYEE_ID': ids['main_employee'],
+            'SEATABLE_MAIN_MENU_NEWCOMER_ID': ids['main_newcomer'],
+            'BROADCAST_TABLE_ID': ids['broadcast'],
+            'SEATABLE_USERS_TABLE_ID': ids['users'],
+            'SEATABLE_1C_TABLE_ID': ids['1c'],
+            'SEATABLE_EMPLOYEE_BOOK_ID': ids['employee_book'],
+            'SEATABLE_ADMIN_TABLE_ID': ids['admin'],
+            'SEATABLE_PULSE_TASKS_ID': ids['pulse_tasks'],
+            'SEATABLE_PULSE_CONTENT_ID': ids['pulse_content'],
+        }
+
+
+async def start_fake_server(host: str = '127.0.0.1', port: int = 8090, seed: int = 1, users: int = 1000,
+                            latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                            rate_limit: int = 0) -> Tuple[web.AppRunner, FakeSeaTable]:
+    """Запускает сервер внутри текущего цикла событий — для нагрузочных скриптов. Остановка: await runner.cleanup()"""
+    fake = FakeSeaTable(seed_bases(seed=seed, users=users), latency=latency, jitter=jitter,
+                        error_rate=error_rate, rate_limit=rate_limit, seed=seed)
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Фейковый SeaTable запущен на http://{host}:{port}")
+    return runner, fake
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальный фейковый SeaTable")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--seed', type=int, default=1, help="seed синтетических данных и внедряемых сбоев")
+    parser.add_argument('--users', type=int, default=1000, help="строк в таблице пользователей")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка каждого ответа, сек")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503, 0..1")
+    parser.add_argument('--rate-limit', type=int, default=0, help="запросов в минуту на базу до 429, 0 — без лимита")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeSeaTable(seed_bases(seed=args.seed, users=args.users), latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed)
+
+    print("Переменные окружения для бота:")
+    for name, value in fake.env(f"http://{args.host}:{args.port}").items():
+        print(f"{name}={value}")
+
+    web.run_app(fake.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета запросов к SeaTable
+INTERACTIVE = 0  # запросы из обработчиков сообщений и кнопок
+BACKGROUND = 1   # синхронизация 1С, проверка ролей, рассылка пульс-опросов
+
+# Приоритет текущей задачи. Задачи, созданные внутри (подгрузка страниц, пакетная запись), наследуют его
+_priority: ContextVar[int] = ContextVar("seatable_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Все запросы к SeaTable внутри блока идут в фоновом классе"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RequestScheduler:
+    """
+    Распределяет запросы к SeaTable по классам приоритета.
+    Интерактивные запросы проходят сразу. Фоновые выполняются не больше чем по SEATABLE_BACKGROUND_CONCURRENCY
+    одновременно и пропускают вперед интерактивные: пока пользователь ждет ответа, фоновый запрос не стартует
+    (но не дольше SEATABLE_BACKGROUND_MAX_WAIT секунд, чтобы фон не голодал).
+    """
+
+    def __init__(self):
+        self._background_slots = asyncio.Semaphore(max(1, Config.SEATABLE_BACKGROUND_CONCURRENCY))
+        self._interactive_active = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+
+        # Счетчики для оценки влияния фона на пользователей
+        self.interactive_requests = 0
+        self.background_requests = 0
+        self.background_yields = 0
+        self.background_wait_time = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[int]:
+        """Занимает место для одного запроса в классе текущей задачи, отдает этот класс"""
+        priority = current_priority()
+
+        if priority == INTERACTIVE:
+            self.interactive_requests += 1
+            self._interactive_active += 1
+            self._interactive_idle.clear()
+            try:
+                yield priority
+            finally:
+                self._interactive_active -= 1
+                if self._interactive_active == 0:
+                    self._interactive_idle.set()
+            return
+
+        self.background_requests += 1
+        started = time.monotonic()
+        async with self._background_slots:
+            if not self._interactive_idle.is_set():
+                self.background_yields += 1
+                try:
+                    await asyncio.wait_for(self._interactive_idle.wait(), Config.SEATABLE_BACKGROUND_MAX_WAIT)
+                except asyncio.TimeoutError:
+                    pass
+            self.background_wait_time += time.monotonic() - started
+            yield priority
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "interactive_requests": self.interactive_requests,
+            "interactive_active": self._interactive_active,
+            "background_requests": self.background_requests,
+            "background_yields": self.background_yields,
+            "background_wait_time": round(self.background_wait_time, 3)
+        }
+
+
+# Глобальный экземпляр
+request_scheduler = RequestScheduler()
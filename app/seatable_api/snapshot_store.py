@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    app TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    high_water TEXT NOT NULL DEFAULT '',
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (app, table_id)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    app TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+class TableSnapshot:
+    """Сохраненная копия таблицы. saved_at — время сохранения по time.time()"""
+
+    __slots__ = ("rows", "high_water", "saved_at")
+
+    def __init__(self, rows: List[Dict], high_water: str, saved_at: float):
+        self.rows = rows
+        self.high_water = high_water
+        self.saved_at = saved_at
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.saved_at)
+
+
+class SnapshotStore:
+    """
+    Последние копии кешированных таблиц и метаданных баз в SQLite.
+    При старте бота кеши заполняются отсюда, и первые запросы пользователей не ждут SeaTable.
+    Если SeaTable недоступен, а таблицы нет в кеше, она берется отсюда.
+    Запись идет в фоне: сохранения копятся, и одна задача пишет их одной транзакцией,
+    так что частые обновления одной таблицы дают одну запись ее последней копии.
+    """
+
+    def __init__(self, path: str, max_age: int):
+        self.path = Path(path) if path else None
+        self.max_age = max_age
+        self._pending_tables: Dict[Tuple[str, str], Tuple[List[Dict], str, float]] = {}
+        self._pending_metadata: Dict[str, Tuple[Dict, float]] = {}
+        self._writer_task: Optional[asyncio.Task] = None
+
+        self.writes = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        new_file = not self.path.exists()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        if new_file:
+            # В копиях есть телефоны и ID сотрудников — файл доступен только владельцу процесса
+            os.chmod(self.path, 0o600)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _is_fresh(self, saved_at: float) -> bool:
+        return not self.max_age or time.time() - saved_at < self.max_age
+
+    # --- чтение ---
+
+    def load_all(self) -> Tuple[Dict[Tuple[str, str], TableSnapshot], Dict[str, Tuple[Dict, float]]]:
+        """Читает все копии не старше max_age: ({(app, table_id): TableSnapshot}, {app: (metadata, saved_at)})"""
+        tables, metadata = {}, {}
+        if not self.enabled or not self.path.exists():
+            return tables, metadata
+
+        try:
+            connection = self._connect()
+            try:
+                for app, table_id, rows, high_water, saved_at in connection.execute(
+                        "SELECT app, table_id, rows, high_water, saved_at FROM tables"):
+                    if self._is_fresh(saved_at):
+                        tables[(app, table_id)] = TableSnapshot(json.loads(rows), high_water, saved_at)
+                for app, body, saved_at in connection.execute("SELECT app, metadata, saved_at FROM metadata"):
+                    if self._is_fresh(saved_at):
+                        metadata[app] = (json.loads(body), saved_at)
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать копии таблиц SeaTable: {e}")
+        return tables, metadata
+
+    def _load_table(self, app: str, table_id: str) -> Optional[TableSnapshot]:
+        if not self.enabled or not self.path.exists():
+            return None
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT rows, high_water, saved_at FROM tables WHERE app = ? AND table_id = ?", (app, table_id)
+                ).fetchone()
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать копию таблицы {app}:{table_id}: {e}")
+            return None
+
+        if row is None or not self._is_fresh(row[2]):
+            return None
+        return TableSnapshot(json.loads(row[0]), row[1], row[2])
+
+    async def load_table(self, app: str, table_id: str) -> Optional[TableSnapshot]:
+        """Копия одной таблицы — запасной вариант, когда SeaTable недоступен"""
+        # Сохранение, которое еще не дошло до диска, новее того, что на диске
+        pending = self._pending_tables.get((app, table_id))
+        if pending is not None:
+            return TableSnapshot(*pending)
+        return await asyncio.to_thread(self._load_table, app, table_id)
+
+    # --- запись ---
+
+    def save_table(self, app: str, table_id: str, rows: List[Dict], high_water: str = '') -> None:
+        """Ставит копию таблицы в очередь на запись. Не блокирует вызывающего"""
+        if not self.enabled:
+            return
+        self._pending_tables[(app, table_id)] = (rows, high_water, time.time())
+        self._start_writer()
+
+    def save_metadata(self, app: str, metadata: Dict) -> None:
+        """Ставит метаданные базы в очередь на запись"""
+        if not self.enabled:
+            return
+        self._pending_metadata[app] = (metadata, time.time())
+        self._start_writer()
+
+    def _start_writer(self) -> None:
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        while self._pending_tables or self._pending_metadata:
+            tables, self._pending_tables = self._pending_tables, {}
+            metadata, self._pending_metadata = self._pending_metadata, {}
+            try:
+                await asyncio.to_thread(self._write, tables, metadata)
+                self.writes += 1
+            except Exception as e:
+                self.write_errors += 1
+                logger.warning(f"Не удалось сохранить копии таблиц SeaTable: {e}")
+
+    def _write(self, tables: Dict, metadata: Dict) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO tables (app, table_id, rows, high_water, saved_at) VALUES (?, ?, ?, ?, ?)",
+                    [(app, table_id, json.dumps(rows, ensure_ascii=False), high_water, saved_at)
+                     for (app, table_id), (rows, high_water, saved_at) in tables.items()]
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO metadata (app, metadata, saved_at) VALUES (?, ?, ?)",
+                    [(app, json.dumps(body, ensure_ascii=False), saved_at)
+                     for app, (body, saved_at) in metadata.items()]
+                )
+        finally:
+            connection.close()
+
+    async def flush(self) -> None:
+        """Дожидается записи всего, что стоит в очереди — при остановке бота"""
+        if self._writer_task is not None:
+            await self._writer_task
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending_tables) + len(self._pending_metadata),
+            "writes": self.writes,
+            "write_errors": self.write_errors
+        }
+
+
+# Глобальный экземпляр
+snapshot_store = SnapshotStore(Config.SEATABLE_SNAPSHOT_FILE, Config.SEATABLE_SNAPSHOT_MAX_AGE)
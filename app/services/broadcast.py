@@ -5,6 +5,8 @@ import aiohttp
 from typing import List, Dict, Tuple
 from config import Config
 from app.seatable_api.api_base import fetch_table
+from app.seatable_api.api_users import find_user_by_id_messenger
+from app.services.users_replica import users_replica
 from telegram.content import prepare_telegram_message
 
 
@@ -17,14 +19,8 @@ async def is_user_admin(user_id: int) -> bool:
         # 1. Получаем таблицу админов
         admins = await fetch_table(table_id=Config.SEATABLE_ADMIN_TABLE_ID, app='USER')
 
-        # 2. Получаем таблицу пользователей
-        users = await fetch_table(table_id=Config.SEATABLE_USERS_TABLE_ID, app='USER')
-
-        # 3. Ищем пользователя по ID мессенджера
-        target_user = next(
-            (u for u in users if str(u.get('ID_messenger')) == str(user_id)),
-            None
-        )
+        # 2. Ищем пользователя по ID мессенджера — нужен только _id его строки
+        target_user = await find_user_by_id_messenger(user_id, columns=['_id'])
 
         if not target_user:
             logger.info(f"User {user_id} not found in users table")
@@ -32,7 +28,7 @@ async def is_user_admin(user_id: int) -> bool:
 
         target_user_id = target_user.get('_id')
 
-        # 4. Проверяем всех админов
+        # 3. Проверяем всех админов
         for admin in admins:
             # Проверяем доступ админа (права на просмотр всего контента и на отправку уведомлений)
             if not admin.get('Content+broadcast_admin'):
@@ -63,8 +59,7 @@ async def get_broadcast_notifications() -> List[Dict]:
 
 async def get_active_users() -> List[Dict]:
     """Получает список активных пользователей"""
-    users = await fetch_table(table_id=Config.SEATABLE_USERS_TABLE_ID, app='USER')
-    return [user for user in users if user.get('ID_messenger')]
+    return await users_replica.active_users()
 
 
 async def prepare_notification_content(notification: Dict) -> Tuple[Dict, bytes, str]:
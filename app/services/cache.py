@@ -1,15 +1,37 @@
+import asyncio
 import logging
-from cachetools import TTLCache
+from typing import Dict, List, Tuple
+from cachetools import TTLCache, TLRUCache
 
+from config import Config
 from app.seatable_api.api_auth import check_id_messenger
+from app.seatable_api.api_client import SeaTableError
+from app.seatable_api.scheduler import background_priority
+from app.services.users_replica import users_replica
+from app.services.events import event_bus, UserChanged
+from app.services.shared_cache import SharedCache
 
 logger = logging.getLogger(__name__)
 
-# Кэш для хранения статуса пользователей (1 час TTL, до 2000 пользователей)
-user_access_cache = TTLCache(maxsize=2000, ttl=3600)
+# Кэш для хранения статуса пользователей (1 час TTL). Заполняется целиком из таблицы пользователей,
+# размер растет вместе с числом пользователей — см. prewarm_user_caches
+user_access_cache = TTLCache(maxsize=Config.USER_CACHE_MIN_SIZE, ttl=3600)
 
 # Кэш для хранения ролей пользователей (1 час TTL)
-user_role_cache = TTLCache(maxsize=2000, ttl=3600)
+user_role_cache = TTLCache(maxsize=Config.USER_CACHE_MIN_SIZE, ttl=3600)
+
+# Последний известный статус доступа (сутки) — отдается, пока SeaTable недоступен
+user_access_fallback = TTLCache(maxsize=Config.USER_CACHE_MIN_SIZE, ttl=86400)
+
+# Незарегистрированные пользователи: значение — TTL записи в секундах. Короткий, чтобы только что
+# добавленного сотрудника не держало без доступа; растет с каждым повторным отказом
+user_denied_cache = TLRUCache(maxsize=Config.USER_NEGATIVE_CACHE_SIZE, ttu=lambda _key, ttl, now: now + ttl)
+
+# Сколько раз подряд пользователю отказали за последний час — по нему растет TTL отказа
+_denied_attempts = TTLCache(maxsize=Config.USER_NEGATIVE_CACHE_SIZE, ttl=3600)
+
+# Доступы и роли, общие для всех процессов бота (Redis). Первый уровень — кеши выше, поэтому свой локальный не нужен
+shared_user_access = SharedCache('user_access', ttl=3600, local_maxsize=0)
 
 # Сообщение для пользователя, который потерял доступ из-за увольнения
 RESTRICTING_MESSAGE = "🚫 Извините, у вас больше нет доступа. Чтобы вернуть доступ, обратитесь, пожалуйста, к администратору."
@@ -21,28 +43,37 @@ async def check_user_cache(user_id: int) -> bool:
     Возвращает True если доступ разрешен, False если запрещен.
     """
     # Проверяем кэш доступа
-    logger.info(f"Кеш доступа: {user_access_cache}")
     if user_id in user_access_cache:
         logger.info(f"Cache hit for user {user_id}, access: {user_access_cache[user_id]}")
         return user_access_cache[user_id]
 
+    # Недавно уже искали и не нашли — не ищем снова, пока не истечет отказ
+    if user_id in user_denied_cache:
+        logger.info(f"Negative cache hit for user {user_id}")
+        return False
+
+    # Пользователя мог уже проверить другой процесс бота
+    shared = await shared_user_access.get(user_id)
+    if shared:
+        logger.info(f"Shared cache hit for user {user_id}, role: {shared['role']}")
+        _remember_locally(user_id, shared['role'])
+        return True
+
     # Если нет в кэше - проверяем через API
     logger.info(f"Cache miss for user {user_id}, checking via API...")
     try:
-        has_access, role = await check_id_messenger(str(user_id))
+        has_access, role = await check_id_messenger(str(user_id), raise_errors=True)
 
         logger.info(f"API check result - has_access: {has_access}, role: {role}")
-
-        # Сохраняем доступ и роль в кешах
-        user_access_cache[user_id] = has_access
-        if has_access:
-            user_role_cache[user_id] = role
-            logger.info(f"Role cached for user {user_id}: {role}")
-        else:
-            logger.info(f"User {user_id} has no access, role not cached")
+        await _store_lookup(user_id, has_access, role)
 
         logger.info(f"Final access result for user {user_id}: {has_access}")
         return has_access
+    except SeaTableError as e:
+        # Сбой SeaTable — не ответ "нет доступа": ничего не кешируем и отвечаем по последнему известному статусу
+        fallback = user_access_fallback.get(user_id, False)
+        logger.warning(f"SeaTable недоступен при проверке {user_id}: {str(e)}. Последний известный доступ: {fallback}")
+        return fallback
     except Exception as e:
         logger.error(f"Error checking user access for {user_id}: {str(e)}")
         return False
@@ -70,15 +101,145 @@ async def get_user_role_from_cache(user_id: int) -> str:
     return "employee"
 
 
+async def lookup_user(user_id: int) -> Tuple[bool, str]:
+    """
+    Проверка доступа и роли для /start. Известный доступ с ролью отдается из кешей (роль в них обновляют
+    события изменения пользователя), недавний отказ — из кеша отказов, остальное проверяется по таблице,
+    и результат записывается в кеши.
+    """
+    # Кеш доступа важнее отказа: отказ мог остаться с тех пор, как пользователь еще не был зарегистрирован
+    if user_access_cache.get(user_id) and user_id in user_role_cache:
+        logger.info(f"Cache hit for user {user_id}, role: {user_role_cache[user_id]}")
+        return True, user_role_cache[user_id]
+
+    if user_id in user_denied_cache:
+        logger.info(f"Negative cache hit for user {user_id}")
+        return False, "employee"
+
+    has_access, role = await check_id_messenger(str(user_id))
+    await _store_lookup(user_id, has_access, role)
+    return has_access, role
+
+
+async def _store_lookup(user_id: int, has_access: bool, role: str) -> None:
+    """Записывает результат проверки: доступ — на час в кеши доступа и ролей, отказ — в кеш отказов"""
+    user_access_fallback[user_id] = has_access
+    if has_access:
+        await remember_user_access(user_id, role)
+        logger.info(f"Role cached for user {user_id}: {role}")
+        return
+
+    # Каждый повторный отказ удваивает TTL — перебор неизвестных ID быстро перестает доходить до таблицы
+    attempts = _denied_attempts.get(user_id, 0) + 1
+    _denied_attempts[user_id] = attempts
+    ttl = min(Config.USER_NEGATIVE_CACHE_TTL * 2 ** (attempts - 1), Config.USER_NEGATIVE_CACHE_MAX_TTL)
+    user_denied_cache[user_id] = ttl
+    logger.info(f"User {user_id} has no access, denied for {ttl} sec (attempt {attempts})")
+
+
+def forget_denied_user(user_id: int) -> None:
+    """Снимает отказ с пользователя — он только что прислал контакт и может быть зарегистрирован"""
+    user_denied_cache.pop(user_id, None)
+    _denied_attempts.pop(user_id, None)
+
+
+async def remember_user_access(user_id: int, role: str) -> None:
+    """Записывает в кеши (и в общий кеш процессов), что у пользователя есть доступ с ролью role"""
+    _remember_locally(user_id, role)
+    await shared_user_access.set(user_id, {'role': role})
+
+
+def _remember_locally(user_id: int, role: str) -> None:
+    forget_denied_user(user_id)
+    user_access_cache[user_id] = True
+    user_access_fallback[user_id] = True
+    user_role_cache[user_id] = role
+
+
+def _cache_size(users_count: int) -> int:
+    """Размер кешей с запасом на новых пользователей до следующего заполнения"""
+    return max(Config.USER_CACHE_MIN_SIZE, int(users_count * 1.25))
+
+
+async def prewarm_user_caches() -> int:
+    """
+    Заполняет кеши доступа и ролей сразу для всех зарегистрированных пользователей из копии таблицы пользователей
+    (одна загрузка таблицы вместо поиска на каждый промах). Кеши пересоздаются: размер подстраивается
+    под число пользователей, а пользователи, потерявшие доступ, из них пропадают — и из общего кеша процессов.
+    Возвращает число пользователей в кеше.
+    """
+    global user_access_cache, user_role_cache, user_access_fallback
+
+    rows: List[Dict] = await users_replica.active_users()
+
+    access: Dict[int, bool] = {}
+    roles: Dict[int, str] = {}
+    for row in rows:
+        try:
+            user_id = int(row['ID_messenger'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        access[user_id] = True
+        roles[user_id] = row.get('Role', 'employee')
+
+    size = _cache_size(len(access))
+    new_access = TTLCache(maxsize=size, ttl=user_access_cache.ttl)
+    new_roles = TTLCache(maxsize=size, ttl=user_role_cache.ttl)
+    new_fallback = TTLCache(maxsize=size, ttl=user_access_fallback.ttl)
+    new_access.update(access)
+    new_roles.update(roles)
+    new_fallback.update(access)
+
+    # Потерявшие доступ: их записи в общем кеше вернули бы доступ при следующем промахе в этом и других процессах
+    revoked = [user_id for user_id in set(user_access_cache) | set(user_access_fallback) if user_id not in access]
+
+    user_access_cache, user_role_cache, user_access_fallback = new_access, new_roles, new_fallback
+    # Зарегистрированные пользователи больше не получают отказ из кеша отказов
+    for user_id in access:
+        forget_denied_user(user_id)
+    await shared_user_access.set_many({user_id: {'role': role} for user_id, role in roles.items()})
+    if revoked:
+        await shared_user_access.delete(*revoked)
+    logger.info(f"Кеши доступа и ролей заполнены: {len(access)} пользователей, размер {size}")
+    return len(access)
+
+
+async def run_user_cache_refresher() -> None:
+    """Заполняет кеши доступа и ролей при старте и затем каждые USER_CACHE_REFRESH_INTERVAL секунд"""
+    while True:
+        try:
+            with background_priority():
+                await prewarm_user_caches()
+        except SeaTableError as e:
+            # Таблица недоступна — остаются прежние кеши, промахи проверяются по одному
+            logger.warning(f"Не удалось заполнить кеши доступа: {str(e)}")
+        except Exception as e:
+            logger.error(f"Ошибка заполнения кешей доступа: {str(e)}")
+        await asyncio.sleep(Config.USER_CACHE_REFRESH_INTERVAL)
+
+
 async def clear_user_role_cache(user_id: int):
     """Очищает кеш роли для пользователя"""
     if user_id in user_role_cache:
         del user_role_cache[user_id]
         logger.info(f"Role cache cleared for user {user_id}")
+    await shared_user_access.delete(user_id)
 
 
 async def clear_user_access_cache(user_id: int):
     """Очищает кеш доступа для пользователя"""
     if user_id in user_access_cache:
         del user_access_cache[user_id]
-        logger.info(f"Access cache cleared for user {user_id}")
\ No newline at end of file
+        logger.info(f"Access cache cleared for user {user_id}")
+    await shared_user_access.delete(user_id)
+
+
+async def _on_user_changed(event: UserChanged) -> None:
+    """Роль пользователя изменена синхронизацией или проверкой ролей — обновляем кеш без запроса к SeaTable"""
+    if event.messenger_id is None or not event.role:
+        return
+    await remember_user_access(event.messenger_id, event.role)
+    logger.info(f"Role cache updated by event for user {event.messenger_id}: {event.role}")
+
+
+event_bus.subscribe(UserChanged, _on_user_changed)
@@ -0,0 +1,58 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+
+class UserChanged:
+    """
+    Строка пользователя изменена ботом (синхронизация 1С, проверка ролей).
+    messenger_id — ID в Telegram, если пользователь зарегистрирован; changes — записанные колонки
+    """
+
+    __slots__ = ("messenger_id", "row_id", "changes")
+
+    def __init__(self, messenger_id: Optional[int], row_id: Optional[str], changes: Dict[str, Any]):
+        self.messenger_id = messenger_id
+        self.row_id = row_id
+        self.changes = changes
+
+    @classmethod
+    def from_row(cls, row: Dict, changes: Dict[str, Any]) -> "UserChanged":
+        """Событие по строке таблицы пользователей: ID_messenger там строкой, а кеши ведутся по int"""
+        try:
+            messenger_id = int(row.get('ID_messenger'))
+        except (TypeError, ValueError):
+            messenger_id = None
+        return cls(messenger_id, row.get('_id'), changes)
+
+    @property
+    def role(self) -> Optional[str]:
+        return self.changes.get('Role')
+
+
+class EventBus:
+    """
+    Шина событий внутри процесса. Код, меняющий данные в SeaTable, публикует событие,
+    а кеши и FSM, которые держат копии этих данных, подписываются и обновляются сразу.
+    Ошибка одного подписчика не мешает остальным.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[Type, List[Callable[[Any], Awaitable[None]]]] = {}
+        self.published = 0
+
+    def subscribe(self, event_type: Type, handler: Callable[[Any], Awaitable[None]]) -> None:
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    async def publish(self, event: Any) -> None:
+        self.published += 1
+        for handler in self._handlers.get(type(event), ()):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {type(event).__name__}: {e}")
+
+
+# Глобальный экземпляр
+event_bus = EventBus()
@@ -1,11 +1,115 @@
+import sys
+import json
+import hashlib
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Any
 from datetime import datetime
 
+from cachetools import LRUCache
+
+from app.seatable_api.api_base import fetch_table
+
 
 logger = logging.getLogger(__name__)
 
 
+class FormQuestion:
+    """Вопрос формы: текст, признак свободного ответа (как в таблице) и варианты ответа"""
+
+    __slots__ = ("name", "free_input", "options")
+
+    def __init__(self, name: str, free_input: Any, options: Tuple[str, ...]):
+        self.name = name
+        self.free_input = free_input
+        self.options = options
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "FormQuestion":
+        options = tuple(sys.intern(str(v)) for k, v in row.items() if k.startswith('Answer_option_') and v is not None)
+        return cls(row.get('Name'), row.get('Free_input', False), options)
+
+
+class FormDefinition:
+    """
+    Форма из таблицы SeaTable: вопросы, таблица ответов и финальное сообщение.
+    Одна на форму для всех пользователей — в состоянии пользователя хранится только FormProgress.
+    version — хеш содержимого: если форму поменяли в SeaTable, у новой копии будет другая версия
+    """
+
+    __slots__ = ("form_id", "questions", "answers_table", "final_message", "version")
+
+    def __init__(self, form_id: str, questions: Tuple[FormQuestion, ...], answers_table: Optional[str],
+                 final_message: Optional[str]):
+        self.form_id = form_id
+        self.questions = questions
+        self.answers_table = answers_table
+        self.final_message = final_message
+        content = [[[q.name, q.free_input, list(q.options)] for q in questions], answers_table, final_message]
+        self.version = hashlib.sha1(json.dumps(content, ensure_ascii=False, default=str).encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_table(cls, form_id: str, table_data: List[Dict]) -> "FormDefinition":
+        questions = tuple(FormQuestion.from_row(row) for row in table_data
+                          if row.get('Name') not in ['Info', 'Final_message'])
+
+        # Безопасное получение answers_table (может быть None)
+        info_row = next((row for row in table_data if row.get('Name') == 'Info'), {})
+        answers_table = info_row.get('Answers_table')
+
+        # Безопасное получение final_message (может быть None)
+        final_row = next((row for row in table_data if row.get('Name') == 'Final_message'), {})
+        final_message = final_row.get('Content')
+
+        return cls(sys.intern(form_id), questions, answers_table, final_message)
+
+
+class FormProgress:
+    """
+    Прохождение формы пользователем: ссылка на форму и ее версию, номер текущего вопроса и ответы.
+    Ответы соответствуют вопросам именно этой версии формы
+    """
+
+    __slots__ = ("form_id", "version", "current_question", "answers", "last_question_message_id")
+
+    def __init__(self, form_id: str, version: Optional[str] = None, current_question: int = 0,
+                 answers: Optional[List[str]] = None, last_question_message_id: Optional[int] = None):
+        self.form_id = form_id
+        self.version = version
+        self.current_question = current_question
+        self.answers = answers if answers is not None else []
+        self.last_question_message_id = last_question_message_id
+
+    def dump(self) -> list:
+        return [self.form_id, self.current_question, self.answers, self.last_question_message_id, self.version]
+
+    @classmethod
+    def restore(cls, data: list) -> "FormProgress":
+        # Записи без версии (сохраненные раньше) не совпадут ни с одной формой — прохождение начнется заново
+        form_id, current_question, answers, last_question_message_id, version = (list(data) + [None])[:5]
+        return cls(sys.intern(form_id), version, current_question, answers, last_question_message_id)
+
+
+# Формы, которые сейчас проходят пользователи: (form_id, version) -> FormDefinition.
+# Старая версия формы остается здесь, пока ее дозаполняют те, кто начал до изменения
+_form_definitions: LRUCache = LRUCache(maxsize=256)
+
+
+async def get_form_definition(form_id: str, version: Optional[str] = None) -> Optional[FormDefinition]:
+    """
+    Форма по ID таблицы: закрепленная версия version, если она еще в памяти, иначе текущая из таблицы.
+    Версия результата может отличаться от запрошенной — значит, форму изменили, а старой копии уже нет
+    (перезапуск бота или вытеснение)
+    """
+    definition = _form_definitions.get((form_id, version))
+    if definition is None:
+        table_data = await fetch_table(form_id)
+        if not table_data:
+            return None
+        definition = FormDefinition.from_table(form_id, table_data)
+        _form_definitions[(form_id, definition.version)] = definition
+    return definition
+
+
 def is_form(table_data: List[Dict]) -> bool:
     """Проверяет, является ли таблица формой"""
     has_form_fields = False
@@ -26,26 +130,11 @@ def is_form(table_data: List[Dict]) -> bool:
     return has_form_fields
 
 
-async def start_form_questions(table_data: List[Dict]) -> Dict:
-    """Получает вопросы из формы"""
-    questions = [row for row in table_data
-                if row.get('Name') not in ['Info', 'Final_message']]
-
-    # Безопасное получение answers_table (может быть None)
-    info_row = next((row for row in table_data if row.get('Name') == 'Info'), {})
-    answers_table = info_row.get('Answers_table')
-
-    # Безопасное получение final_message (может быть None)
-    final_row = next((row for row in table_data if row.get('Name') == 'Final_message'), {})
-    final_message = final_row.get('Content')
-
-    return {
-        "questions": questions,
-        "current_question": 0,
-        "answers": [],
-        "answers_table": answers_table,  # Может быть None
-        "final_message": final_message  # Может быть None
-    }
+async def start_form_questions(form_id: str, table_data: List[Dict]) -> FormProgress:
+    """Разбирает вопросы формы и начинает ее прохождение на текущей версии формы"""
+    definition = FormDefinition.from_table(form_id, table_data)
+    _form_definitions[(form_id, definition.version)] = definition
+    return FormProgress(form_id, definition.version)
 
 
 async def prepare_data_to_post_in_seatable(form_data: Dict) -> Optional[Dict]:
@@ -107,13 +196,13 @@ async def prepare_data_to_post_in_seatable(form_data: Dict) -> Optional[Dict]:
     }
 
 
-async def complete_form(form_state: Dict, user_id: int) -> Dict:
+async def complete_form(definition: FormDefinition, progress: FormProgress, user_id: int) -> Dict:
     """Формирует финальные данные формы с корректным user_id"""
     return {
         "user_id": user_id,  # Используем переданный user_id (из message.chat.id)
-        "questions": form_state["questions"],  # Добавляем вопросы в результат
-        "answers": form_state["answers"],
-        "answers_table": form_state["answers_table"],
-        "final_message": form_state.get("final_message"),
+        "questions": [{"Name": question.name} for question in definition.questions],
+        "answers": progress.answers,
+        "answers_table": definition.answers_table,
+        "final_message": definition.final_message,
         "timestamp": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
@@ -1,8 +1,15 @@
+import sys
 import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from cachetools import TTLCache
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 
 from config import Config
+from app.services.events import event_bus, UserChanged
+from app.services.forms import FormProgress
+from app.services.state_storage import StateStorage, StateWriter, create_state_storage
 
 
 logger = logging.getLogger(__name__)
@@ -17,44 +24,208 @@ class AppStates:
     USER_ROLE = "user_role"
 
 
+class UserState:
+    """
+    Состояние одного пользователя. Частые поля лежат в слотах, история навигации — deque ограниченной длины
+    из интернированных ID меню, прохождение формы — FormProgress со ссылкой на общую для всех форму.
+    Редкие поля (выбор в рассылке, данные поиска) — в extra. Для кода, который работает со словарем, есть get и to_dict.
+    aiogram_state и aiogram_data — состояние и данные FSMContext aiogram (StateManagerStorage), отдельно от полей бота
+    """
+
+    __slots__ = ("user_role", "current_menu", "current_state", "navigation_history", "form_data", "extra",
+                 "aiogram_state", "aiogram_data")
+
+    _FIELDS = ("user_role", "current_menu", "current_state", "navigation_history", "form_data")
+
+    def __init__(self):
+        self.user_role: Optional[str] = None
+        self.current_menu: Optional[str] = None
+        self.current_state: Optional[str] = None
+        self.navigation_history: deque = deque(maxlen=Config.FSM_HISTORY_LIMIT)
+        self.form_data: Optional[FormProgress] = None
+        self.extra: Dict[str, Any] = {}
+        self.aiogram_state: Optional[str] = None
+        self.aiogram_data: Dict[str, Any] = {}
+
+    def __bool__(self) -> bool:
+        return (any(self.get(field) for field in self._FIELDS) or bool(self.extra)
+                or self.aiogram_state is not None or bool(self.aiogram_data))
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            if key == 'navigation_history':
+                self.navigation_history = deque((sys.intern(menu_id) for menu_id in value or ()),
+                                                maxlen=Config.FSM_HISTORY_LIMIT)
+            elif key == 'form_data':
+                # Формы в старом формате (словарь с копиями вопросов) после обновления бота не продолжить
+                self.form_data = value if isinstance(value, FormProgress) else None
+            elif key in self._FIELDS:
+                setattr(self, key, sys.intern(value) if isinstance(value, str) else value)
+            elif value is None:
+                self.extra.pop(key, None)
+            else:
+                self.extra[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self._FIELDS if getattr(self, field) is not None}
+        if self.navigation_history:
+            data['navigation_history'] = list(self.navigation_history)
+        else:
+            data.pop('navigation_history')
+        data.update(self.extra)
+        return data
+
+    def dump(self) -> list:
+        """Компактная запись для хранилища: список полей по порядку вместо словаря с ключами"""
+        return [self.user_role, self.current_menu, self.current_state, list(self.navigation_history),
+                self.form_data.dump() if self.form_data else None, self.extra, self.aiogram_state, self.aiogram_data]
+
+    @classmethod
+    def restore(cls, data: Any) -> "UserState":
+        state = cls()
+        if isinstance(data, dict):
+            # Состояние, сохраненное до перехода на компактную запись
+            state.update(data)
+            if state.current_state == AppStates.FORM_DATA and state.form_data is None:
+                state.current_state = None
+            return state
+
+        # Записи без полей aiogram (до StateManagerStorage) дополняем пустыми
+        user_role, current_menu, current_state, history, form_data, extra, aiogram_state, aiogram_data = \
+            list(data) + [None, {}][len(data) - 6:]
+        state.update({'user_role': user_role, 'current_menu': current_menu, 'current_state': current_state,
+                      'navigation_history': history})
+        state.form_data = FormProgress.restore(form_data) if form_data else None
+        state.extra = extra
+        state.aiogram_state = aiogram_state
+        state.aiogram_data = aiogram_data
+        return state
+
+
+class _UpdateScope:
+    """Изменения состояний за время обработки одного обновления Telegram"""
+
+    __slots__ = ("pending", "closed")
+
+    def __init__(self):
+        self.pending: Dict[int, Optional[UserState]] = {}
+        self.closed = False
+
+
+_update_scope: ContextVar[Optional[_UpdateScope]] = ContextVar("fsm_update_scope", default=None)
+
+
 class StateManager:
-    def __init__(self, maxsize=1000, ttl=3600):
+    """
+    Состояния пользователей: активные — в памяти, все — в storage (SQLite или Redis), куда изменения
+    пишутся отложенно пачками. Вытесненное из памяти или потерянное при перезапуске состояние читается из storage.
+    """
+
+    def __init__(self, maxsize=1000, ttl=3600, storage: Optional[StateStorage] = None, flush_delay: float = 1.0):
         self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._storage = storage or StateStorage(ttl)
+        self._writer = StateWriter(self._storage, flush_delay)
 
         # ID главных меню для разных ролей
         self.SEATABLE_MAIN_MENU_EMPLOYEE_ID = Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID
         self.SEATABLE_MAIN_MENU_NEWCOMER_ID = Config.SEATABLE_MAIN_MENU_NEWCOMER_ID
 
 
+    async def _load(self, user_id: int) -> UserState:
+        """Состояние пользователя: из памяти, из изменений текущего обновления, из очереди записи или из storage"""
+        user_data = self._cache.get(user_id)
+        if user_data is not None:
+            return user_data
+
+        # Очищенное в этом обновлении (None) не должно подниматься из storage, пока очистка не записана
+        scope = _update_scope.get()
+        if scope is not None and not scope.closed and user_id in scope.pending:
+            user_data = scope.pending[user_id]
+        elif user_id in self._writer:
+            user_data = self._writer.pending(user_id)
+        else:
+            stored = await self._storage.load(user_id)
+            user_data = UserState.restore(stored) if stored is not None else None
+        if user_data is None:
+            return UserState()
+
+        self._cache[user_id] = user_data
+        return user_data
+
+
+    def _save(self, user_id: int, user_data: UserState):
+        self._cache[user_id] = user_data
+        self._mark(user_id, user_data)
+
+
+    def _mark(self, user_id: int, user_data: Optional[UserState]):
+        """Внутри update_scope изменения отдаются на запись один раз в конце обновления"""
+        scope = _update_scope.get()
+        # Задачи, запущенные из обработчика, наследуют контекст и переживают обновление — им пишем сразу
+        if scope is None or scope.closed:
+            self._writer.mark(user_id, user_data)
+        else:
+            scope.pending[user_id] = user_data
+
+
+    @asynccontextmanager
+    async def update_scope(self, user_id: int) -> AsyncIterator[UserState]:
+        """
+        Обработка одного обновления Telegram: состояние пользователя читается один раз и отдается
+        фильтрам как есть (без копии, только для чтения), а изменения уходят на запись в конце обновления
+        """
+        scope = _UpdateScope()
+        token = _update_scope.set(scope)
+        try:
+            yield await self._load(user_id)
+        finally:
+            scope.closed = True
+            _update_scope.reset(token)
+            for changed_user_id, user_data in scope.pending.items():
+                self._writer.mark(changed_user_id, user_data)
+
+
     async def update_data(self, user_id: int, **kwargs):
         """Основной метод для обновления любых данных пользователя"""
-        user_data = self._cache.get(user_id, {})
+        user_data = await self._load(user_id)
         user_data.update(kwargs)
-        self._cache[user_id] = user_data
+        self._save(user_id, user_data)
         logger.info(f"User {user_id} data updated: {list(kwargs.keys())}")
 
 
     async def get_data(self, user_id: int) -> Dict[str, Any]:
         """Получить все данные пользователя"""
-        return self._cache.get(user_id, {}).copy()
+        return (await self._load(user_id)).to_dict()
 
 
     async def get_user_role(self, user_id: int) -> Optional[str]:
         """Получить роль пользователя"""
-        user_data = self._cache.get(user_id, {})
-        return user_data.get(AppStates.USER_ROLE)
+        user_data = await self._load(user_id)
+        return user_data.user_role
 
 
     async def set_user_role(self, user_id: int, role: str):
         """Установить роль пользователя"""
+        # check_access подтверждает роль на каждом обновлении — без изменений не пишем
+        if await self.get_user_role(user_id) == role:
+            return
         await self.update_data(user_id, **{AppStates.USER_ROLE: role})
         logger.info(f"User {user_id} role set to: {role}")
 
 
     async def get_current_menu(self, user_id: int) -> Optional[str]:
         """Получить текущее меню пользователя"""
-        user_data = self._cache.get(user_id, {})
-        return user_data.get(AppStates.CURRENT_MENU)
+        user_data = await self._load(user_id)
+        return user_data.current_menu
 
 
     async def set_current_menu(self, user_id: int, menu_id: str):
@@ -64,8 +235,8 @@ class StateManager:
 
     async def get_main_menu_id(self, user_id: int) -> str:
         """Получить ID главного меню в зависимости от роли пользователя"""
-        user_data = self._cache.get(user_id, {})
-        role = user_data.get(AppStates.USER_ROLE)
+        user_data = await self._load(user_id)
+        role = user_data.user_role
 
         if role == "newcomer" and self.SEATABLE_MAIN_MENU_NEWCOMER_ID:
             return self.SEATABLE_MAIN_MENU_NEWCOMER_ID
@@ -76,6 +247,7 @@ class StateManager:
 
     async def clear(self, user_id: int):
         """Очистить данные пользователя"""
+        self._mark(user_id, None)
         if user_id in self._cache:
             del self._cache[user_id]
             logger.info(f"User {user_id} data cleared")
@@ -96,19 +268,15 @@ class StateManager:
     # Методы для навигации (специализированные методы)
     async def navigate_to_menu(self, user_id: int, menu_id: str):
         """Переход в новое меню - добавляем в историю"""
-        user_data = self._cache.get(user_id, {})
+        user_data = await self._load(user_id)
 
-        # Инициализируем историю если её нет
-        if 'navigation_history' not in user_data:
-            user_data['navigation_history'] = []
-
-        # Добавляем текущее меню в историю
-        if 'current_menu' in user_data:
-            user_data['navigation_history'].append(user_data['current_menu'])
+        # Добавляем текущее меню в историю — самые старые переходы вытесняются (FSM_HISTORY_LIMIT)
+        if user_data.current_menu is not None:
+            user_data.navigation_history.append(user_data.current_menu)
 
         # Устанавливаем новое меню
-        user_data['current_menu'] = menu_id
-        self._cache[user_id] = user_data
+        user_data.current_menu = sys.intern(menu_id)
+        self._save(user_id, user_data)
 
         logger.info(f"User {user_id} navigated to menu: {menu_id}")
 
@@ -122,20 +290,20 @@ class StateManager:
 
     async def navigate_back(self, user_id: int) -> Optional[str]:
         """Возврат к предыдущему меню"""
-        user_data = self._cache.get(user_id, {})
+        user_data = await self._load(user_id)
 
-        if not user_data.get('navigation_history'):
+        if not user_data.navigation_history:
             logger.debug(f"No navigation history for user {user_id}, returning to main menu")
             # Если истории нет - возвращаем главное меню по роли
             main_menu_id = await self.get_main_menu_id(user_id)
-            user_data['current_menu'] = main_menu_id
-            self._cache[user_id] = user_data
+            user_data.current_menu = main_menu_id
+            self._save(user_id, user_data)
             return main_menu_id
 
         # Получаем предыдущее меню из истории
-        previous_menu = user_data['navigation_history'].pop()
-        user_data['current_menu'] = previous_menu
-        self._cache[user_id] = user_data
+        previous_menu = user_data.navigation_history.pop()
+        user_data.current_menu = previous_menu
+        self._save(user_id, user_data)
 
         logger.debug(f"User {user_id} navigated back to: {previous_menu}")
         return previous_menu
@@ -143,9 +311,69 @@ class StateManager:
 
     async def get_navigation_history(self, user_id: int) -> List[str]:
         """Получить историю навигации пользователя"""
-        user_data = self._cache.get(user_id, {})
-        return user_data.get('navigation_history', []).copy()
+        user_data = await self._load(user_id)
+        return list(user_data.navigation_history)
+
+
+    async def on_user_changed(self, event: UserChanged):
+        """
+        Роль пользователя изменена в SeaTable ботом. Если пользователь сейчас в боте, сразу переводим его
+        на главное меню новой роли — иначе check_access заметит расхождение позже и сбросит навигацию целиком
+        """
+        if event.messenger_id is None or not event.role:
+            return
+
+        user_data = await self._load(event.messenger_id)
+        if user_data.user_role in (None, event.role):
+            return
+
+        user_data.user_role = event.role
+        if user_data.current_menu is not None:
+            user_data.current_menu = await self.get_main_menu_id(event.messenger_id)
+            user_data.navigation_history.clear()
+        self._save(event.messenger_id, user_data)
+        logger.info(f"User {event.messenger_id} role changed to {event.role} by event")
+
+
+    # Состояние и данные FSMContext aiogram (см. telegram/fsm_storage.py)
+    async def get_aiogram_state(self, user_id: int) -> Optional[str]:
+        return (await self._load(user_id)).aiogram_state
+
+
+    async def set_aiogram_state(self, user_id: int, state: Optional[str]):
+        user_data = await self._load(user_id)
+        if user_data.aiogram_state == state:
+            return
+        user_data.aiogram_state = state
+        self._save(user_id, user_data)
+
+
+    async def get_aiogram_data(self, user_id: int) -> Dict[str, Any]:
+        return (await self._load(user_id)).aiogram_data.copy()
+
+
+    async def set_aiogram_data(self, user_id: int, data: Dict[str, Any]):
+        user_data = await self._load(user_id)
+        if not data and not user_data.aiogram_data:
+            return
+        user_data.aiogram_data = dict(data)
+        self._save(user_id, user_data)
+
+
+    async def flush(self):
+        """Записывает отложенные изменения состояний сразу — при остановке бота"""
+        await self._writer.flush()
+
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_memory": len(self._cache), **self._writer.stats()}
 
 
 # Глобальный экземпляр
-state_manager = StateManager()
\ No newline at end of file
+state_manager = StateManager(
+    maxsize=Config.FSM_CACHE_SIZE,
+    ttl=Config.FSM_STATE_TTL,
+    storage=create_state_storage(),
+    flush_delay=Config.FSM_FLUSH_DELAY
+)
+event_bus.subscribe(UserChanged, state_manager.on_user_changed)
\ No newline at end of file
@@ -1,16 +1,16 @@
 import logging
+from contextlib import aclosing
 from datetime import datetime, date
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Set, AsyncIterator
 from dateutil.relativedelta import relativedelta
 
 from config import Config
-from app.seatable_api.api_base import fetch_table
-from app.seatable_api.api_sync_1c import (
-    create_user_in_table,
-    update_user_in_table,
-    mark_1c_user_as_processed
-)
+from app.seatable_api.api_base import iter_table_rows
+from app.seatable_api.api_batch import BatchWriter
+from app.seatable_api.api_pulse import get_pulse_task_keys
 from app.services.pulse_tasks import create_pulse_all_tasks
+from app.services.users_replica import users_replica
+from app.services.events import event_bus, UserChanged
 
 logger = logging.getLogger(__name__)
 
@@ -77,23 +77,19 @@ class User1C:
         }
 
 
-async def get_unprocessed_1c_users() -> List[User1C]:
+async def iter_unprocessed_1c_users() -> AsyncIterator[User1C]:
     """
-    Получает список необработанных пользователей из 1С
+    Отдает необработанных пользователей из 1С по мере чтения таблицы постранично,
+    не дожидаясь загрузки всей выгрузки.
+    Ошибка чтения страницы (SeaTableError) пробрасывается — уже отданные пользователи остаются обработанными.
     """
-    try:
-        # Получаем данные из таблицы 1С
-        rows = await fetch_table(
-            table_id=Config.SEATABLE_1C_TABLE_ID,
-            app='USER'
-        )
-
-        if not rows:
-            return []
-
-        # Фильтруем необработанных пользователей
-        unprocessed_users = []
-        for row in rows:
+    # Читаем таблицу 1С постранично
+    async with aclosing(iter_table_rows(
+        table_id=Config.SEATABLE_1C_TABLE_ID,
+        app='USER',
+        prefetch=Config.SEATABLE_PAGE_PREFETCH
+    )) as rows:
+        async for row in rows:
             user = User1C(row)
 
             # Пропускаем пользователей без СНИЛС или ФИО
@@ -102,13 +98,7 @@ async def get_unprocessed_1c_users() -> List[User1C]:
 
             # Проверяем, обработан ли пользователь
             if not user.processed:
-                unprocessed_users.append(user)
-
-        return unprocessed_users
-
-    except Exception as e:
-        logger.error(f"Ошибка при получении пользователей из 1С: {str(e)}")
-        return []
+                yield user
 
 
 async def user_exists_in_users_table(snils: str) -> Tuple[bool, Optional[str]]:
@@ -116,14 +106,9 @@ async def user_exists_in_users_table(snils: str) -> Tuple[bool, Optional[str]]:
     Проверяет, существует ли пользователь в таблице пользователей по СНИЛС
     """
     try:
-        users = await fetch_table(
-            table_id=Config.SEATABLE_USERS_TABLE_ID,
-            app='USER'
-        )
-
-        for user in users:
-            if user.get('Name') == snils:
-                return True, user.get('_id')
+        user = await users_replica.get_by_snils(snils)
+        if user:
+            return True, user.get('_id')
 
         return False, None
 
@@ -136,49 +121,96 @@ async def process_1c_user(user: User1C) -> bool:
     """
     Обрабатывает одного пользователя из 1С
     """
+    return await process_1c_users([user]) == 1
+
+
+async def process_1c_users(users: List[User1C]) -> int:
+    """
+    Обрабатывает пачку пользователей из 1С и возвращает число успешно обработанных.
+    Записи копятся в очередях и уходят в SeaTable пакетами:
+    сначала создание и обновление пользователей, затем пульс-опросы и отметки "обработан" для успешных.
+    """
+    if not users:
+        return 0
+
     try:
-        # Проверяем, существует ли пользователь уже в таблице пользователей
-        exists, row_id = await user_exists_in_users_table(user.snils)
-
-        if exists:
-            # Подготавливаем данные для обновления
-            update_data = {}
-            if user.fio:          # ФИО - обновляем из 1С
-                update_data['FIO'] = user.fio
-
-            if user.employment_date:  # Роль - проверяем и обновляем на основе даты устройства
-                should_be_role = "newcomer" if user.is_newcomer else "employee"
-                update_data['Role'] = should_be_role
-
-            # Обновляем запись
-            success = await update_user_in_table(row_id, update_data)
-        else:
-            # Создаем нового пользователя
-            user_data = user.to_users_table_format()
-            success = await create_user_in_table(user_data)
-
-        # Если операция успешна - создаем пульс-опросы и помечаем как обработанного
-        if success:
+        # Проверяем, какие пользователи уже есть в таблице пользователей — по индексу СНИЛС
+        await users_replica.refresh()
+
+        users_writer = BatchWriter(Config.SEATABLE_USERS_TABLE_ID, app='USER')
+        queued = []
+        role_changes = []  # (строка пользователя, новая роль, Future записи)
+        new_users = {}  # СНИЛС -> Future, чтобы дубль в выгрузке 1С не создал второго пользователя
+
+        for user in users:
+            existing = users_replica.by_snils.get(user.snils)
+            row_id = existing.get('_id') if existing else None
+
+            if row_id:
+                # Подготавливаем данные для обновления
+                update_data = {}
+                if user.fio:          # ФИО - обновляем из 1С
+                    update_data['FIO'] = user.fio
+
+                if user.employment_date:  # Роль - проверяем и обновляем на основе даты устройства
+                    should_be_role = "newcomer" if user.is_newcomer else "employee"
+                    update_data['Role'] = should_be_role
+
+                future = await users_writer.update(row_id, update_data)
+                if update_data.get('Role') and update_data['Role'] != existing.get('Role'):
+                    role_changes.append((existing, update_data['Role'], future))
+            elif user.snils in new_users:
+                future = new_users[user.snils]
+            else:
+                # Создаем нового пользователя
+                future = await users_writer.append(user.to_users_table_format())
+                new_users[user.snils] = future
+
+            queued.append((user, future))
+
+        await users_writer.flush()
+
+        # Кеш ролей и FSM узнают о смене роли сразу
+        for existing, role, future in role_changes:
+            if future.result():
+                await event_bus.publish(UserChanged.from_row(existing, {'Role': role}))
+
+        # Для успешных — пульс-опросы и отметка об обработке в 1С
+        pulse_writer = BatchWriter(Config.SEATABLE_PULSE_TASKS_ID, app='PULSE')
+        processed_writer = BatchWriter(Config.SEATABLE_1C_TABLE_ID, app='USER')
+        existing_tasks = await get_pulse_task_keys()
+
+        success_count = 0
+        for user, future in queued:
+            if not future.result():
+                logger.error(f"Ошибка записи пользователя {user.fio} в таблицу пользователей")
+                continue
+
             # Создаем пульс-опросы если нужно
             if user.is_less_than_year:
-                await _create_pulse_for_user(user)
+                await _create_pulse_for_user(user, pulse_writer, existing_tasks)
 
             # Помечаем как обработанного в 1С
             if user.row_id:
-                await mark_1c_user_as_processed(user.row_id)
+                await processed_writer.update(user.row_id, {"Processed": True})
 
-            return True
-        else:
-            return False
+            success_count += 1
+
+        await pulse_writer.flush()
+        await processed_writer.flush()
+
+        return success_count
 
     except Exception as e:
-        logger.error(f"Ошибка обработки пользователя {user.fio}: {str(e)}")
-        return False
+        logger.error(f"Ошибка обработки пользователей из 1С: {str(e)}")
+        return 0
 
 
-async def _create_pulse_for_user(user: User1C) -> bool:
+async def _create_pulse_for_user(user: User1C, writer: Optional[BatchWriter] = None,
+                                 existing_tasks: Optional[Set[Tuple[str, str]]] = None) -> bool:
     """
-    Создает пульс-опросы для пользователя
+    Создает пульс-опросы для пользователя.
+    С writer задачи ставятся в очередь пакетной записи, а не пишутся сразу
     """
     # Конвертируем User1C в dict для передачи
     user_dict = {
@@ -194,7 +226,7 @@ async def _create_pulse_for_user(user: User1C) -> bool:
     }
 
     try:
-        return await create_pulse_all_tasks(user_dict)
+        return await create_pulse_all_tasks(user_dict, writer, existing_tasks)
     except Exception as e:
         logger.error(f"Ошибка создания пульс-опросов для {user.fio}: {e}")
         return False
\ No newline at end of file
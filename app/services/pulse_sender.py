@@ -1,12 +1,15 @@
 import logging
+from contextlib import aclosing
 from datetime import datetime, date, time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, AsyncIterator
 import asyncio
 from aiogram import Bot
 
 from config import Config
-from app.seatable_api.api_base import fetch_table
-from app.seatable_api.api_pulse import get_pulse_tasks
+from app.seatable_api.api_base import fetch_table, iter_table_rows
+from app.seatable_api.api_batch import BatchWriter
+from app.seatable_api.scheduler import background_priority
+from app.services.users_replica import users_replica
 from telegram.content import prepare_telegram_message
 
 logger = logging.getLogger(__name__)
@@ -26,15 +29,6 @@ class PulseSender:
         logger.info("Начало отправки пульс-опросов")
 
         try:
-            # Получаем задачи которые нужно отправить сегодня
-            tasks_to_send = await self._get_tasks_for_today()
-
-            if not tasks_to_send:
-                logger.info("Нет пульс-опросов для отправки сегодня")
-                return
-
-            logger.info(f"Найдено {len(tasks_to_send)} задач для отправки")
-
             # Получаем контент опросов
             poll_content = await self._get_poll_content()
 
@@ -45,26 +39,43 @@ class PulseSender:
             # Получаем список админов для уведомлений
             admins = await self._get_pulse_admins()
 
-            # Отправляем каждую задачу
+            # Отправляем каждую задачу, как только прочитана ее страница таблицы.
+            # Статусы записываются небольшими пакетами: при сбое посреди рассылки без статуса остаются
+            # не больше PULSE_STATUS_BATCH_SIZE уже отправленных задач, и повторно уйдут только они
             sent_tasks = []
             failed_tasks = []
+            status_writer = BatchWriter(Config.SEATABLE_PULSE_TASKS_ID, app='PULSE',
+                                        chunk_size=Config.PULSE_STATUS_BATCH_SIZE)
+            status_writes = []  # (ID задачи, статус, Future записи)
 
-            for task in tasks_to_send:
-                try:
-                    success = await self._send_single_pulse(task, poll_content)
-                    if success:
-                        sent_tasks.append(task)
-                        # Обновляем статус задачи на "send"
-                        await self._update_task_status(task.get('_id'), 'sent')
-                    else:
-                        failed_tasks.append(task)
-                        # Обновляем статус задачи на "declined"
-                        await self._update_task_status(task.get('_id'), 'declined')
-
-                except Exception as e:
-                    logger.error(f"Ошибка отправки задачи {task.get('_id')}: {e}")
-                    failed_tasks.append(task)
-                    await self._update_task_status(task.get('_id'), 'declined')
+            try:
+                async with aclosing(self._iter_tasks_for_today()) as tasks_to_send:
+                    async for task in tasks_to_send:
+                        try:
+                            success = await self._send_single_pulse(task, poll_content)
+                            if success:
+                                sent_tasks.append(task)
+                                # Обновляем статус задачи на "send"
+                                await self._update_task_status(status_writer, status_writes, task.get('_id'), 'sent')
+                            else:
+                                failed_tasks.append(task)
+                                # Обновляем статус задачи на "declined"
+                                await self._update_task_status(status_writer, status_writes, task.get('_id'),
+                                                               'declined')
+
+                        except Exception as e:
+                            logger.error(f"Ошибка отправки задачи {task.get('_id')}: {e}")
+                            failed_tasks.append(task)
+                            await self._update_task_status(status_writer, status_writes, task.get('_id'),
+                                                           'declined')
+            finally:
+                # Статусы отправленных задач записываем даже при ошибке чтения таблицы
+                await status_writer.flush()
+                self._report_status_writes(status_writes)
+
+            if not sent_tasks and not failed_tasks:
+                logger.info("Нет пульс-опросов для отправки сегодня")
+                return
 
             # Уведомляем админов о неудачных отправках
             if failed_tasks and admins:
@@ -76,33 +87,25 @@ class PulseSender:
             logger.error(f"Ошибка при отправке пульс-опросов: {e}")
 
 
-    async def _get_tasks_for_today(self) -> List[Dict]:
-        """Получает задачи которые нужно отправить сегодня"""
-        try:
-            tasks = await get_pulse_tasks()
-            if not tasks:
-                logger.info("Нет задач в таблице пульс-опросов")
-                return []
-
-            today = datetime.now().date()
-            today_str = today.isoformat()
-
-            tasks_for_today = []
-            for task in tasks:
+    async def _iter_tasks_for_today(self) -> AsyncIterator[Dict]:
+        """
+        Отдает задачи, которые нужно отправить сегодня, по мере постраничного чтения таблицы задач.
+        Вся таблица задач в памяти не держится.
+        """
+        today_str = datetime.now().date().isoformat()
+
+        async with aclosing(iter_table_rows(
+            Config.SEATABLE_PULSE_TASKS_ID,
+            app='PULSE',
+            prefetch=Config.SEATABLE_PAGE_PREFETCH
+        )) as tasks:
+            async for task in tasks:
                 task_date = task.get('Data_poll')
                 task_status = task.get('Status')
-                task_type = task.get('Type')
 
                 # Проверяем что задача сегодня и статус waiting
-                if (task_date == today_str and task_status == 'waiting'):
-                    tasks_for_today.append(task)
-
-            logger.info(f"Найдено задач для отправки сегодня: {len(tasks_for_today)}")
-            return tasks_for_today
-
-        except Exception as e:
-            logger.error(f"Ошибка получения задач: {e}", exc_info=True)
-            return []
+                if task_date == today_str and task_status == 'waiting':
+                    yield task
 
 
     async def _get_poll_content(self) -> Dict[str, Dict]:
@@ -146,22 +149,8 @@ class PulseSender:
             if not admins:
                 return []
 
-            # Получаем таблицу пользователей чтобы связать ID строк с Telegram ID
-            users = await fetch_table(
-                table_id=Config.SEATABLE_USERS_TABLE_ID,
-                app='USER'
-            )
-
-            if not users:
-                return []
-
-            # Создаем маппинг: user_row_id -> telegram_id
-            user_id_to_telegram = {}
-            for user in users:
-                user_id = user.get('_id')
-                telegram_id = user.get('ID_messenger')
-                if user_id and telegram_id:
-                    user_id_to_telegram[user_id] = telegram_id
+            # ID строк пользователей связываем с Telegram ID через индекс копии таблицы пользователей
+            await users_replica.refresh()
 
             pulse_admins = []
 
@@ -170,7 +159,8 @@ class PulseSender:
                     messenger_ids = admin.get('ID_messenger', [])
                     if isinstance(messenger_ids, list):
                         for user_row_id in messenger_ids:
-                            telegram_id = user_id_to_telegram.get(user_row_id)
+                            user = users_replica.by_row_id.get(user_row_id)
+                            telegram_id = user.get('ID_messenger') if user else None
                             if telegram_id:
                                 pulse_admins.append({
                                     'row_id': user_row_id,
@@ -192,20 +182,12 @@ class PulseSender:
         Получает ID_messenger пользователя по СНИЛС
         """
         try:
-            users = await fetch_table(
-                table_id=Config.SEATABLE_USERS_TABLE_ID,
-                app='USER'
-            )
-
-            if not users:
+            user = await users_replica.get_by_snils(snils)
+            if not user:
                 return None
 
-            for user in users:
-                if user.get('Name') == snils:
-                    messenger_id = user.get('ID_messenger')
-                    return str(messenger_id) if messenger_id else None
-
-            return None
+            messenger_id = user.get('ID_messenger')
+            return str(messenger_id) if messenger_id else None
 
         except Exception as e:
             logger.error(f"Ошибка получения ID_messenger для {snils}: {e}")
@@ -304,52 +286,33 @@ class PulseSender:
             return False
 
 
-    async def _update_task_status(self, task_id: str, status: str) -> bool:
+    async def _update_task_status(self, writer: BatchWriter, status_writes: List[Tuple[str, str, asyncio.Future]],
+                                  task_id: str, status: str) -> bool:
         """
-        Обновляет статус задачи
+        Ставит обновление статуса задачи в очередь пакетной записи и сообщает о неудачных записях уже отправленных пакетов
         """
-        try:
-            if not task_id:
-                return False
-
-            # Получаем токен для базы пульс-опросов
-            from app.seatable_api.api_base import get_base_token
-            import aiohttp
+        if not task_id:
+            return False
 
-            token_data = await get_base_token(app='PULSE')
-            if not token_data:
-                return False
+        future = await writer.update(task_id, {
+            "Status": status,
+            "Sent_date": datetime.now().isoformat() if status == 'send' else None
+        })
+        status_writes.append((task_id, status, future))
+        self._report_status_writes(status_writes)
+        return True
 
-            url = f"{token_data['dtable_server'].rstrip('/')}/api/v1/dtables/{token_data['dtable_uuid']}/rows/"
-
-            headers = {
-                "Authorization": f"Bearer {token_data['access_token']}",
-                "Accept": "application/json",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "table_id": Config.SEATABLE_PULSE_TASKS_ID,
-                "row_id": task_id,
-                "row": {
-                    "Status": status,
-                    "Sent_date": datetime.now().isoformat() if status == 'send' else None
-                }
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.put(url, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        logger.info(f"Статус задачи {task_id} обновлен на {status}")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка обновления статуса: {response.status} - {error_text}")
-                        return False
 
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении статуса задачи: {e}")
-            return False
+    @staticmethod
+    def _report_status_writes(status_writes: List[Tuple[str, str, asyncio.Future]]) -> None:
+        """Логирует задачи, статус которых не записался, и убирает из списка все записанные пакеты"""
+        done = [item for item in status_writes if item[2].done()]
+        status_writes[:] = [item for item in status_writes if not item[2].done()]
+        for task_id, status, future in done:
+            if future.result():
+                logger.info(f"Статус задачи {task_id} обновлен на {status}")
+            else:
+                logger.error(f"Не удалось обновить статус задачи {task_id} на {status} — задача может уйти повторно")
 
 
     async def _notify_admins_about_failed_tasks(self, admins: List[Dict], failed_tasks: List[Dict]) -> None:
@@ -410,7 +373,9 @@ async def start_pulse_sender_scheduler(bot: Bot):
 
         # Запускаем отправку
         try:
-            await sender.send_daily_pulses()
+            # Рассылка уступает SeaTable запросам пользователей
+            with background_priority():
+                await sender.send_daily_pulses()
         except Exception as e:
             logger.error(f"Ошибка отправки пульс-опросов: {e}")
 
@@ -1,7 +1,8 @@
 import logging
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Set
 
+from app.seatable_api.api_batch import BatchWriter
 from app.seatable_api.api_pulse import create_pulse_task
 
 logger = logging.getLogger(__name__)
@@ -96,9 +97,12 @@ class PulseTaskCreator:
         self.holiday_checker = HolidayChecker()
 
 
-    async def create_tasks(self, user_data: Dict) -> bool:
+    async def create_tasks(self, user_data: Dict, writer: Optional[BatchWriter] = None,
+                           existing_tasks: Optional[Set[Tuple[str, str]]] = None) -> bool:
         """
-        Создает задачи пульс-опросов для пользователя
+        Создает задачи пульс-опросов для пользователя.
+        writer — очередь пакетной записи: задачи ставятся в нее и уходят в SeaTable при flush().
+        existing_tasks — уже созданные задачи (СНИЛС, тип), чтобы не проверять каждую запросом к таблице
         """
         try:
             # Парсим дату устройства
@@ -118,7 +122,8 @@ class PulseTaskCreator:
             success_count = 0
             for poll_type in needed_polls:
                 try:
-                    success = await self._create_single_task(user_data, employment_date, poll_type)
+                    success = await self._create_single_task(user_data, employment_date, poll_type,
+                                                             writer, existing_tasks)
                     if success:
                         success_count += 1
                 except Exception as e:
@@ -184,7 +189,9 @@ class PulseTaskCreator:
         return adjusted_date, was_adjusted
 
 
-    async def _create_single_task(self, user_data: Dict, employment_date: date, poll_type: str) -> bool:
+    async def _create_single_task(self, user_data: Dict, employment_date: date, poll_type: str,
+                                  writer: Optional[BatchWriter] = None,
+                                  existing_tasks: Optional[Set[Tuple[str, str]]] = None) -> bool:
         """
         Создает одну задачу пульс-опроса
         """
@@ -192,7 +199,12 @@ class PulseTaskCreator:
         from app.seatable_api.api_pulse import task_exists
 
         snils = user_data.get('Name')
-        if await task_exists(snils, poll_type):
+        if existing_tasks is not None:
+            exists = (snils, poll_type) in existing_tasks
+        else:
+            exists = await task_exists(snils, poll_type)
+
+        if exists:
             logger.info(f"Задача уже существует, пропускаем: {snils} - {poll_type}")
             return True  # Считаем успехом, т.к. задача уже есть
 
@@ -218,6 +230,13 @@ class PulseTaskCreator:
             'Date_adjusted': was_adjusted  # Флаг корректировки даты
         }
 
+        # Ставим в очередь пакетной записи
+        if writer is not None:
+            await writer.append(task_data)
+            if existing_tasks is not None:
+                existing_tasks.add((snils, poll_type))
+            return True
+
         # Записываем в таблицу через API
         return await create_pulse_task(task_data)
 
@@ -226,9 +245,10 @@ class PulseTaskCreator:
 pulse_task_creator = PulseTaskCreator()
 
 
-async def create_pulse_all_tasks(user_data: Dict) -> bool:
+async def create_pulse_all_tasks(user_data: Dict, writer: Optional[BatchWriter] = None,
+                                 existing_tasks: Optional[Set[Tuple[str, str]]] = None) -> bool:
     """
     Основная функция для создания пульс-опросов
     """
     logger.info(f"Создание пульс-опросов для {user_data.get('FIO')}")
-    return await pulse_task_creator.create_tasks(user_data)
\ No newline at end of file
+    return await pulse_task_creator.create_tasks(user_data, writer, existing_tasks)
\ No newline at end of file
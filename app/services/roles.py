@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime, date
 from typing import List, Optional, Dict
@@ -5,7 +6,8 @@ from dateutil.relativedelta import relativedelta
 
 from config import Config
 from app.seatable_api.api_base import fetch_table
-from app.seatable_api.api_sync_1c import update_user_in_table
+from app.seatable_api.api_batch import BatchWriter
+from app.services.events import event_bus, UserChanged
 
 logger = logging.getLogger(__name__)
 
@@ -36,16 +38,29 @@ class RoleChecker:
                 logger.warning("Нет данных из 1С для проверки ролей")
                 return
 
-            # Проверяем каждого новичка
-            updated_count = 0
+            # Проверяем каждого новичка, обновления ролей копим и отправляем пакетами
+            writer = BatchWriter(Config.SEATABLE_USERS_TABLE_ID, app='USER')
+            updates = []
             for user in newcomer_users:
                 try:
-                    updated = await self._check_user_role(user, users_1c)
-                    if updated:
-                        updated_count += 1
+                    future = await self._check_user_role(user, users_1c, writer)
+                    if future is not None:
+                        updates.append((user, future))
                 except Exception as e:
                     logger.error(f"Ошибка проверки пользователя {user.get('FIO')}: {e}")
 
+            await writer.flush()
+
+            updated_count = 0
+            for user, future in updates:
+                if future.result():
+                    logger.info(f"Роль обновлена: {user.get('FIO')} -> employee")
+                    updated_count += 1
+                    # Кеш ролей и FSM узнают о новой роли сразу, а не через час
+                    await event_bus.publish(UserChanged.from_row(user, {'Role': 'employee'}))
+                else:
+                    logger.error(f"Ошибка обновления роли: {user.get('FIO')}")
+
             logger.info(f"Проверка ролей завершена. Обновлено: {updated_count}/{len(newcomer_users)}")
 
         except Exception as e:
@@ -116,14 +131,16 @@ class RoleChecker:
         return employment_date > three_months_ago
 
 
-    async def _check_user_role(self, user: Dict, users_1c: List[Dict]) -> bool:
+    async def _check_user_role(self, user: Dict, users_1c: List[Dict],
+                               writer: BatchWriter) -> Optional[asyncio.Future]:
         """
-        Проверяет и обновляет роль одного пользователя
+        Проверяет роль одного пользователя и ставит обновление в очередь writer.
+        Возвращает Future с результатом записи или None, если роль не меняется
         """
         user_snils = user.get('Name')  # СНИЛС
         if not user_snils:
             logger.warning(f"У пользователя нет СНИЛС: {user.get('FIO')}")
-            return False
+            return None
 
         # Ищем пользователя в данных 1С
         user_1c = None
@@ -134,7 +151,7 @@ class RoleChecker:
 
         if not user_1c:
             logger.warning(f"Пользователь не найден в 1С: {user.get('FIO')} ({user_snils})")
-            return False
+            return None
 
         # Получаем дату устройства из 1С
         employment_date_str = user_1c.get('Data_employment')
@@ -148,7 +165,7 @@ class RoleChecker:
             row_id = user.get('_id')
             if not row_id:
                 logger.error(f"Нет row_id для пользователя {user.get('FIO')}")
-                return False
+                return None
 
             update_data = {
                 'Role': 'employee'
@@ -158,16 +175,9 @@ class RoleChecker:
             if employment_date:
                 update_data['Data_employment'] = employment_date.isoformat()
 
-            success = await update_user_in_table(row_id, update_data)
-
-            if success:
-                logger.info(f"Роль обновлена: {user.get('FIO')} -> employee")
-                return True
-            else:
-                logger.error(f"Ошибка обновления роли: {user.get('FIO')}")
-                return False
+            return await writer.update(row_id, update_data)
 
-        return False  # Роль не менялась
+        return None  # Роль не менялась
 
 
 # Глобальный экземпляр
@@ -0,0 +1,265 @@
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from cachetools import TTLCache
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Пауза, на которую Redis исключается после ошибки — чтобы сбой Redis не замедлял каждый запрос
+_REMOTE_RETRY_INTERVAL = 30
+
+# Как часто процесс, не получивший блокировку, проверяет, не появилось ли значение
+_LOCK_POLL_INTERVAL = 0.05
+
+# Значение, которого нет в кеше (None — допустимое значение)
+_MISSING = object()
+
+
+def _dumps(value: Any) -> str:
+    """Компактный JSON: без пробелов и без экранирования кириллицы"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class _RedisConnection:
+    """
+    Общее подключение к Redis для всех кешей процесса.
+    REDIS_URL пустой — Redis не используется, кеши работают только в памяти процесса.
+    fakeredis:// — Redis в памяти из пакета fakeredis, для тестов и локальных прогонов.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._down_until = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url)
+
+    def client(self):
+        """Клиент Redis или None, если Redis не настроен или недавно падал"""
+        if not self.configured or time.monotonic() < self._down_until:
+            return None
+        if self._client is None:
+            try:
+                if self.url.startswith('fakeredis://'):
+                    import fakeredis
+                    self._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+                else:
+                    import redis.asyncio as redis
+                    self._client = redis.from_url(self.url, decode_responses=True)
+            except Exception as e:
+                self.mark_down(e)
+                return None
+        return self._client
+
+    def mark_down(self, error: Exception) -> None:
+        if time.monotonic() >= self._down_until:
+            logger.warning(f"Redis недоступен ({error!r}), кеши работают локально {_REMOTE_RETRY_INTERVAL} сек")
+        self._down_until = time.monotonic() + _REMOTE_RETRY_INTERVAL
+
+    async def close(self) -> None:
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                logger.debug(f"Ошибка закрытия подключения к Redis: {e}")
+            self._client = None
+
+
+# Глобальный экземпляр
+redis_connection = _RedisConnection(Config.REDIS_URL)
+
+
+class SharedCache:
+    """
+    Двухуровневый кеш: LRU с TTL в памяти процесса перед общим Redis.
+    Ключи в Redis — "{REDIS_KEY_PREFIX}:{namespace}:{key}", значения — компактный JSON.
+    get_or_load загружает значение одним вызовом на ключ: внутри процесса одновременные вызовы ждут общий,
+    между процессами — блокировка в Redis, остальные ждут, пока значение появится.
+    Без Redis (или при его сбое) работает как обычный локальный кеш.
+    """
+
+    def __init__(self, namespace: str, ttl: float, local_maxsize: int = 1000, local_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        # Локальная копия живет не дольше общей — иначе процессы разойдутся после обновления
+        self._local = TTLCache(maxsize=local_maxsize, ttl=local_ttl or ttl) if local_maxsize > 0 else None
+        self._loading: Dict[str, asyncio.Task] = {}
+
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.loads = 0
+
+    def _key(self, key: Any) -> str:
+        return f"{Config.REDIS_KEY_PREFIX}:{self.namespace}:{key}"
+
+    # --- чтение и запись ---
+
+    async def get(self, key: Any, default: Any = None) -> Any:
+        value = await self._get(str(key))
+        return default if value is _MISSING else value
+
+    async def _get(self, key: str) -> Any:
+        if self._local is not None and key in self._local:
+            self.local_hits += 1
+            return self._local[key]
+
+        client = redis_connection.client()
+        if client is None:
+            return _MISSING
+        try:
+            raw = await client.get(self._key(key))
+        except Exception as e:
+            redis_connection.mark_down(e)
+            return _MISSING
+        if raw is None:
+            return _MISSING
+
+        value = json.loads(raw)
+        self.remote_hits += 1
+        if self._local is not None:
+            self._local[key] = value
+        return value
+
+    async def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        key = str(key)
+        if self._local is not None:
+            self._local[key] = value
+
+        client = redis_connection.client()
+        if client is None:
+            return
+        try:
+            await client.set(self._key(key), _dumps(value), px=int((ttl or self.ttl) * 1000))
+        except Exception as e:
+            redis_connection.mark_down(e)
+
+    async def set_many(self, items: Dict[Any, Any], ttl: Optional[float] = None) -> None:
+        """Записывает много ключей одним обращением к Redis"""
+        if self._local is not None:
+            for key, value in items.items():
+                self._local[str(key)] = value
+
+        client = redis_connection.client()
+        if client is None or not items:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self._key(key), _dumps(value), px=int((ttl or self.ttl) * 1000))
+                await pipe.execute()
+        except Exception as e:
+            redis_connection.mark_down(e)
+
+    async def delete(self, *keys: Any) -> None:
+        keys = [str(key) for key in keys]
+        if self._local is not None:
+            for key in keys:
+                self._local.pop(key, None)
+
+        client = redis_connection.client()
+        if client is None or not keys:
+            return
+        try:
+            await client.delete(*(self._key(key) for key in keys))
+        except Exception as e:
+            redis_connection.mark_down(e)
+
+    def forget_local(self, keys: Optional[Iterable[Any]] = None) -> None:
+        """Сбрасывает только локальную копию (всю или ключи keys) — общая в Redis остается"""
+        if self._local is None:
+            return
+        if keys is None:
+            self._local.clear()
+            return
+        for key in keys:
+            self._local.pop(str(key), None)
+
+    # --- загрузка одним процессом ---
+
+    async def get_or_load(self, key: Any, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None,
+                          accept: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Значение из кеша или результат loader(). accept — проверка, годится ли найденное значение
+        (например, токен не слишком близок к истечению); негодное загружается заново.
+        loader вернул None — значение не сохраняется.
+        """
+        key = str(key)
+        value = await self._get(key)
+        if value is not _MISSING and (accept is None or accept(value)):
+            return value
+
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, ttl, accept))
+            self._loading[key] = task
+            task.add_done_callback(lambda finished: self._loading.pop(key, None)
+                                   if self._loading.get(key) is finished else None)
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float],
+                    accept: Optional[Callable[[Any], bool]]) -> Any:
+        client = redis_connection.client()
+        lock_key = self._key(key) + ':lock'
+        token = uuid.uuid4().hex
+
+        if client is not None:
+            deadline = time.monotonic() + Config.REDIS_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                try:
+                    if await client.set(lock_key, token, nx=True, px=int(Config.REDIS_LOCK_TIMEOUT * 1000)):
+                        break
+                except Exception as e:
+                    redis_connection.mark_down(e)
+                    client = None
+                    break
+
+                # Значение загружает другой процесс — ждем его
+                await asyncio.sleep(_LOCK_POLL_INTERVAL)
+                self.forget_local([key])
+                value = await self._get(key)
+                if value is not _MISSING and (accept is None or accept(value)):
+                    return value
+            else:
+                logger.warning(f"Блокировка {lock_key} не освободилась за {Config.REDIS_LOCK_TIMEOUT} сек, "
+                               f"загружаем сами")
+                client = None
+
+        try:
+            self.loads += 1
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value
+        finally:
+            if client is not None:
+                await self._release(client, lock_key, token)
+
+    @staticmethod
+    async def _release(client, lock_key: str, token: str) -> None:
+        """Снимает блокировку, только если она все еще наша (могла истечь и достаться другому)"""
+        try:
+            if await client.get(lock_key) == token:
+                await client.delete(lock_key)
+        except Exception as e:
+            redis_connection.mark_down(e)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "local": len(self._local) if self._local is not None else 0,
+            "local_hits": self.local_hits,
+            "remote_hits": self.remote_hits,
+            "loads": self.loads
+        }
+
+
+async def close_shared_cache() -> None:
+    """Закрывает подключение к Redis при остановке бота"""
+    await redis_connection.close()
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import Config
+from app.services.shared_cache import redis_connection
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_state (
+    user_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+def dump_state(state: Any) -> str:
+    """Компактный JSON состояния: без пробелов и без экранирования кириллицы"""
+    return json.dumps(state, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def load_state(raw: str) -> Any:
+    return json.loads(raw)
+
+
+class StateStorage:
+    """
+    Хранилище состояний FSM. StateManager держит активных пользователей в памяти,
+    а сюда пишет изменения пачками и отсюда читает тех, кого в памяти нет (после перезапуска или вытеснения).
+    Состояние, к которому не обращались дольше ttl секунд, считается устаревшим.
+    Хранилище не знает формата состояния: пишет JSON, который дал StateWriter, и возвращает его разобранным.
+    """
+
+    name = "memory"
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @property
+    def persistent(self) -> bool:
+        return False
+
+    async def load(self, user_id: int) -> Any:
+        return None
+
+    async def save_many(self, states: Dict[int, Optional[str]]) -> None:
+        """Записывает пачку уже сериализованных состояний. None вместо состояния — удалить его"""
+
+
+class SQLiteStateStorage(StateStorage):
+    """Состояния в файле SQLite — переживают перезапуск бота. Подходит для одного процесса"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: int):
+        super().__init__(ttl)
+        self.path = Path(path)
+        self._purged = False
+
+    @property
+    def persistent(self) -> bool:
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        new_file = not self.path.exists()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        if new_file:
+            # В состояниях ответы на формы и данные сотрудников — файл доступен только владельцу процесса
+            os.chmod(self.path, 0o600)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _load(self, user_id: int) -> Any:
+        if not self.path.exists():
+            return None
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT state, saved_at FROM user_state WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return load_state(row[0])
+
+    async def load(self, user_id: int) -> Any:
+        try:
+            return await asyncio.to_thread(self._load, user_id)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать состояние пользователя {user_id}: {e}")
+            return None
+
+    def _write(self, states: Dict[int, Optional[str]]) -> None:
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO user_state (user_id, state, saved_at) VALUES (?, ?, ?)",
+                    [(user_id, state, now) for user_id, state in states.items() if state is not None]
+                )
+                connection.executemany(
+                    "DELETE FROM user_state WHERE user_id = ?",
+                    [(user_id,) for user_id, state in states.items() if state is None]
+                )
+                # Устаревшие состояния чистим один раз за запуск — дальше они просто не читаются
+                if not self._purged:
+                    connection.execute("DELETE FROM user_state WHERE saved_at < ?", (now - self.ttl,))
+                    self._purged = True
+        finally:
+            connection.close()
+
+    async def save_many(self, states: Dict[int, Optional[str]]) -> None:
+        await asyncio.to_thread(self._write, states)
+
+
+class RedisStateStorage(StateStorage):
+    """
+    Состояния в Redis (REDIS_URL) — общие для нескольких процессов бота, устаревшие удаляет сам Redis по TTL.
+    Пока Redis недоступен, состояния живут только в памяти процесса
+    """
+
+    name = "redis"
+
+    @property
+    def persistent(self) -> bool:
+        return redis_connection.configured
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"{Config.REDIS_KEY_PREFIX}:fsm:{user_id}"
+
+    async def load(self, user_id: int) -> Any:
+        client = redis_connection.client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self._key(user_id))
+        except Exception as e:
+            redis_connection.mark_down(e)
+            return None
+        return load_state(raw) if raw is not None else None
+
+    async def save_many(self, states: Dict[int, Optional[str]]) -> None:
+        client = redis_connection.client()
+        if client is None:
+            raise ConnectionError("Redis недоступен")
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for user_id, state in states.items():
+                    if state is None:
+                        pipe.delete(self._key(user_id))
+                    else:
+                        pipe.set(self._key(user_id), state, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            redis_connection.mark_down(e)
+            raise
+
+
+class StateWriter:
+    """
+    Отложенная запись состояний: изменения копятся delay секунд, и каждое состояние пишется один раз
+    в последней версии — серия нажатий кнопок дает одну запись. Пока запись не прошла,
+    состояние берется отсюда, даже если StateManager уже вытеснил его из памяти.
+    Состояние — объект с методом dump(), который возвращает его в виде, пригодном для JSON.
+    """
+
+    def __init__(self, storage: StateStorage, delay: float):
+        self.storage = storage
+        self.delay = delay
+        self._pending: Dict[int, Any] = {}
+        self._writer_task: Optional[asyncio.Task] = None
+
+        self.writes = 0
+        self.write_errors = 0
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._pending
+
+    def pending(self, user_id: int) -> Any:
+        return self._pending.get(user_id)
+
+    def mark(self, user_id: int, state: Any) -> None:
+        """Ставит состояние в очередь на запись (None — на удаление). Не блокирует вызывающего"""
+        if not self.storage.persistent:
+            return
+        self._pending[user_id] = state
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.delay)
+            # Сериализуем здесь, а не в потоке записи: состояние могут менять, пока идет запись
+            batch = self._serialize(self._pending)
+            try:
+                await self.storage.save_many(batch)
+                self.writes += 1
+            except Exception as e:
+                self.write_errors += 1
+                logger.warning(f"Не удалось сохранить состояния {len(batch)} пользователей: {e}")
+                continue
+            # Убираем записанное, если за время записи его не поменяли снова
+            for user_id, raw in batch.items():
+                if user_id in self._pending and self._serialize({user_id: self._pending[user_id]})[user_id] == raw:
+                    del self._pending[user_id]
+
+    @staticmethod
+    def _serialize(states: Dict[int, Any]) -> Dict[int, Optional[str]]:
+        return {user_id: dump_state(state.dump()) if state is not None else None
+                for user_id, state in states.items()}
+
+    async def flush(self) -> None:
+        """Записывает очередь сразу, без паузы — при остановке бота"""
+        if self._writer_task is not None and not self._writer_task.done():
+            self._writer_task.cancel()
+        if not self._pending:
+            return
+        batch, self._pending = self._serialize(self._pending), {}
+        try:
+            await self.storage.save_many(batch)
+            self.writes += 1
+        except Exception as e:
+            self.write_errors += 1
+            logger.warning(f"Не удалось сохранить состояния {len(batch)} пользователей: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.storage.name,
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "write_errors": self.write_errors
+        }
+
+
+def create_state_storage() -> StateStorage:
+    """Хранилище по FSM_STORAGE: memory, sqlite или redis"""
+    backend = Config.FSM_STORAGE.lower()
+    if backend == "sqlite" and Config.FSM_STATE_FILE:
+        return SQLiteStateStorage(Config.FSM_STATE_FILE, Config.FSM_STATE_TTL)
+    if backend == "redis":
+        if not redis_connection.configured:
+            logger.warning("FSM_STORAGE=redis, но REDIS_URL не задан — состояния хранятся только в памяти")
+        return RedisStateStorage(Config.FSM_STATE_TTL)
+    if backend not in ("memory", "sqlite"):
+        logger.warning(f"Неизвестное хранилище состояний FSM_STORAGE={backend}, используется memory")
+    return StateStorage(Config.FSM_STATE_TTL)
@@ -1,8 +1,12 @@
 import asyncio
 import logging
+from contextlib import aclosing
 from datetime import datetime, time, timedelta
 
-from app.services.process_1c import get_unprocessed_1c_users, process_1c_user
+from config import Config
+from app.seatable_api.api_client import SeaTableError
+from app.seatable_api.scheduler import background_priority
+from app.services.process_1c import iter_unprocessed_1c_users, process_1c_users
 from app.services.roles import check_user_roles_daily
 
 logger = logging.getLogger(__name__)
@@ -20,26 +24,32 @@ async def sync_1c_to_users():
     """
     logger.info("Синхронизация 1С начата")
 
-    # Получаем необработанных пользователей из 1С
-    unprocessed_users = await get_unprocessed_1c_users()
-
-    if not unprocessed_users:
+    total_count = 0
+    success_count = 0
+    batch = []
+
+    # Читаем необработанных пользователей из 1С и обрабатываем пачками — записи уходят в SeaTable пакетами
+    try:
+        async with aclosing(iter_unprocessed_1c_users()) as unprocessed_users:
+            async for user in unprocessed_users:
+                total_count += 1
+                batch.append(user)
+                if len(batch) >= Config.SEATABLE_BATCH_SIZE:
+                    success_count += await process_1c_users(batch)
+                    batch = []
+
+    except SeaTableError as e:
+        logger.error(f"Ошибка при получении пользователей из 1С: {str(e)}")
+
+    # Дописываем остаток пачки, в том числе прочитанный до ошибки
+    if batch:
+        success_count += await process_1c_users(batch)
+
+    if not total_count:
         logger.info("Нет необработанных пользователей")
         return
 
-    success_count = 0
-
-    # Обрабатываем каждого пользователя
-    for user in unprocessed_users:
-        try:
-            success = await process_1c_user(user)
-            if success:
-                success_count += 1
-
-        except Exception as e:
-            logger.error(f"Ошибка обработки {user.fio}: {str(e)}")
-
-    logger.info(f"Синхронизация завершена. Обработано: {success_count}/{len(unprocessed_users)}")
+    logger.info(f"Синхронизация завершена. Обработано: {success_count}/{total_count}")
 
 
 async def start_sync_scheduler():
@@ -82,7 +92,9 @@ async def _run_sync_scheduler():
             await _wait_until(nearest_time)
 
             try:
-                await sync_1c_to_users()
+                # Синхронизация уступает SeaTable запросам пользователей
+                with background_priority():
+                    await sync_1c_to_users()
             except Exception as e:
                 logger.error(f"Ошибка синхронизации: {e}")
 
@@ -95,7 +107,8 @@ async def _run_roles_checker():
         await _wait_until(roles_check_time)
 
         try:
-            await check_user_roles_daily()
+            with background_priority():
+                await check_user_roles_daily()
         except Exception as e:
             logger.error(f"Ошибка проверки ролей: {e}")
 
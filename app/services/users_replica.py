@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from app.seatable_api.api_base import table_cache
+from app.seatable_api.api_client import SeaTableError
+from app.seatable_api.scheduler import background_priority
+from app.services.utils import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+
+class UsersReplica:
+    """
+    Копия таблицы пользователей в памяти с индексами по ID_messenger, СНИЛС (Name), нормализованному телефону и _id.
+    Строки берутся из кеша таблиц (там они обновляются инкрементально и помечаются устаревшими при записи),
+    индексы перестраиваются только когда кеш отдал новую копию.
+    """
+
+    def __init__(self):
+        self._source: Optional[List[Dict]] = None
+        self._lock = asyncio.Lock()
+
+        self.by_messenger_id: Dict[str, Dict] = {}
+        self.by_snils: Dict[str, Dict] = {}
+        self.by_phone: Dict[str, Dict] = {}
+        self.by_row_id: Dict[str, Dict] = {}
+        self._fio: List[Tuple[str, Dict]] = []
+
+    @property
+    def ready(self) -> bool:
+        """Копия хотя бы раз загружена"""
+        return self._source is not None
+
+    def _ttl(self) -> int:
+        # Даже если кеш таблицы пользователей выключен, копия не должна перечитываться на каждый запрос
+        return table_cache.ttl_for('USER', Config.SEATABLE_USERS_TABLE_ID) or Config.SEATABLE_DELTA_SYNC_TTL
+
+    async def refresh(self) -> None:
+        """
+        Актуализирует копию. Если таблицу не удалось загрузить и копии еще нет, бросает SeaTableError,
+        чтобы недоступность SeaTable не выглядела как "пользователь не найден".
+        """
+        rows = await table_cache.get('USER', Config.SEATABLE_USERS_TABLE_ID, self._ttl())
+        if rows is None:
+            if self._source is None:
+                raise SeaTableError("Не удалось получить таблицу пользователей")
+            return
+
+        # Кеш отдает тот же список, пока таблица не обновилась
+        if rows is self._source:
+            return
+
+        async with self._lock:
+            if rows is not self._source:
+                self._rebuild(rows)
+
+    def _rebuild(self, rows: List[Dict]) -> None:
+        by_messenger_id, by_snils, by_phone, by_row_id, fio = {}, {}, {}, {}, []
+
+        for row in rows:
+            messenger_id = row.get('ID_messenger')
+            if messenger_id:
+                by_messenger_id.setdefault(str(messenger_id), row)
+
+            snils = row.get('Name')
+            if snils:
+                by_snils.setdefault(snils, row)
+
+            phone = normalize_phone(str(row.get('Phone') or ''))
+            if phone:
+                by_phone.setdefault(phone, row)
+
+            if row.get('_id'):
+                by_row_id[row['_id']] = row
+
+            if row.get('FIO'):
+                fio.append((row['FIO'].lower(), row))
+
+        self.by_messenger_id = by_messenger_id
+        self.by_snils = by_snils
+        self.by_phone = by_phone
+        self.by_row_id = by_row_id
+        self._fio = fio
+        self._source = rows
+        logger.debug(f"Индексы таблицы пользователей перестроены: {len(rows)} строк")
+
+    async def get_by_messenger_id(self, id_messenger) -> Optional[Dict]:
+        await self.refresh()
+        return self.by_messenger_id.get(str(id_messenger))
+
+    async def get_by_snils(self, snils: str) -> Optional[Dict]:
+        await self.refresh()
+        return self.by_snils.get(snils)
+
+    async def get_by_phone(self, phone: str) -> Optional[Dict]:
+        """Телефон в любом формате — нормализуется так же, как в индексе"""
+        await self.refresh()
+        return self.by_phone.get(normalize_phone(phone) or phone)
+
+    async def get_by_row_id(self, row_id: str) -> Optional[Dict]:
+        await self.refresh()
+        return self.by_row_id.get(row_id)
+
+    async def active_users(self) -> List[Dict]:
+        """Пользователи, которые зарегистрировались в боте"""
+        await self.refresh()
+        return list(self.by_messenger_id.values())
+
+    async def search_by_fio(self, query_words: List[str]) -> List[Dict]:
+        """
+        Ищет по ФИО. Одно слово — вхождение в ФИО,
+        два слова — имя и фамилия подряд в любом порядке.
+        """
+        await self.refresh()
+        if not query_words:
+            return []
+
+        if len(query_words) == 1:
+            patterns = (query_words[0],)
+        else:
+            w1, w2 = query_words[0], query_words[1]
+            patterns = (f"{w1} {w2}", f"{w2} {w1}")
+
+        return [row for fio, row in self._fio if any(pattern in fio for pattern in patterns)]
+
+
+async def run_users_replica_refresher() -> None:
+    """Фоновое обновление копии таблицы пользователей, чтобы запросы пользователей не ждали SeaTable"""
+    while True:
+        try:
+            with background_priority():
+                await users_replica.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления копии таблицы пользователей: {e}")
+        await asyncio.sleep(Config.USERS_REPLICA_REFRESH_INTERVAL)
+
+
+# Глобальный экземпляр
+users_replica = UsersReplica()
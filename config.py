@@ -22,5 +22,110 @@ class Config:
     SEATABLE_PULSE_TASKS_ID = os.getenv("SEATABLE_PULSE_TASKS_ID")
     SEATABLE_PULSE_CONTENT_ID = os.getenv("SEATABLE_PULSE_CONTENT_ID")
 
+    # Пул HTTP-соединений к SeaTable
+    SEATABLE_HTTP_POOL_SIZE = int(os.getenv("SEATABLE_HTTP_POOL_SIZE", "100"))
+    SEATABLE_HTTP_POOL_PER_HOST = int(os.getenv("SEATABLE_HTTP_POOL_PER_HOST", "20"))
+    SEATABLE_HTTP_TIMEOUT = float(os.getenv("SEATABLE_HTTP_TIMEOUT", "30"))
+    SEATABLE_HTTP_CONNECT_TIMEOUT = float(os.getenv("SEATABLE_HTTP_CONNECT_TIMEOUT", "10"))
+    SEATABLE_DNS_CACHE_TTL = int(os.getenv("SEATABLE_DNS_CACHE_TTL", "300"))
+    SEATABLE_KEEPALIVE_TIMEOUT = float(os.getenv("SEATABLE_KEEPALIVE_TIMEOUT", "60"))
 
+    # Файл с сохраненными токенами баз SeaTable и запас времени (сек) для их фонового обновления
+    SEATABLE_TOKEN_CACHE_FILE = os.getenv("SEATABLE_TOKEN_CACHE_FILE", "../data/seatable_tokens.json")
+    SEATABLE_TOKEN_REFRESH_MARGIN = int(os.getenv("SEATABLE_TOKEN_REFRESH_MARGIN", "7200"))
 
+    # Кеш строк таблиц (сек): меню HR, справочник и контент опросов, таблица админов.
+    # SEATABLE_TABLE_CACHE_TTLS переопределяет TTL отдельных таблиц: "table_id=ttl,table_id=ttl", 0 — не кешировать
+    SEATABLE_MENU_CACHE_TTL = int(os.getenv("SEATABLE_MENU_CACHE_TTL", "300"))
+    SEATABLE_DIRECTORY_CACHE_TTL = int(os.getenv("SEATABLE_DIRECTORY_CACHE_TTL", "3600"))
+    SEATABLE_ADMIN_CACHE_TTL = int(os.getenv("SEATABLE_ADMIN_CACHE_TTL", "600"))
+    SEATABLE_TABLE_CACHE_TTLS = os.getenv("SEATABLE_TABLE_CACHE_TTLS", "")
+
+    # Постраничное чтение таблиц: строк на страницу (SeaTable отдает не больше 1000) и сколько страниц грузить одновременно
+    SEATABLE_PAGE_SIZE = int(os.getenv("SEATABLE_PAGE_SIZE", "1000"))
+    SEATABLE_PAGE_PREFETCH = int(os.getenv("SEATABLE_PAGE_PREFETCH", "2"))
+
+    # Сколько строк отправлять в одном пакетном запросе на запись (не больше 1000)
+    SEATABLE_BATCH_SIZE = int(os.getenv("SEATABLE_BATCH_SIZE", "200"))
+    # Статусы отправленных пульс-опросов пишутся пакетами по столько задач — после сбоя повторно уйдут не больше них
+    PULSE_STATUS_BATCH_SIZE = int(os.getenv("PULSE_STATUS_BATCH_SIZE", "10"))
+
+    # Инкрементальное обновление кеша таблиц по _mtime: список table_id через запятую
+    # (пусто — пользователи, справочник и задачи пульс-опросов, "-" — выключено),
+    # как часто запрашивать изменения (сек) и как часто загружать таблицу целиком, чтобы убрать удаленные строки
+    SEATABLE_DELTA_SYNC_TABLES = os.getenv("SEATABLE_DELTA_SYNC_TABLES", "")
+    SEATABLE_DELTA_SYNC_TTL = int(os.getenv("SEATABLE_DELTA_SYNC_TTL", "30"))
+    SEATABLE_DELTA_FULL_SYNC_INTERVAL = int(os.getenv("SEATABLE_DELTA_FULL_SYNC_INTERVAL", "3600"))
+
+    # Как часто (сек) фоново обновлять копию таблицы пользователей с индексами
+    USERS_REPLICA_REFRESH_INTERVAL = int(os.getenv("USERS_REPLICA_REFRESH_INTERVAL", "30"))
+
+    # Кеши доступа и ролей заполняются целиком из таблицы пользователей: как часто (сек) и минимальный размер
+    USER_CACHE_REFRESH_INTERVAL = int(os.getenv("USER_CACHE_REFRESH_INTERVAL", "600"))
+    USER_CACHE_MIN_SIZE = int(os.getenv("USER_CACHE_MIN_SIZE", "2000"))
+    # Кеш отказов для незарегистрированных: начальный и максимальный TTL (сек, удваивается с каждым отказом), размер
+    USER_NEGATIVE_CACHE_TTL = int(os.getenv("USER_NEGATIVE_CACHE_TTL", "30"))
+    USER_NEGATIVE_CACHE_MAX_TTL = int(os.getenv("USER_NEGATIVE_CACHE_MAX_TTL", "600"))
+    USER_NEGATIVE_CACHE_SIZE = int(os.getenv("USER_NEGATIVE_CACHE_SIZE", "10000"))
+
+    # Сколько секунд хранить метаданные (схему) баз: таблицы, колонки, варианты выбора
+    SEATABLE_METADATA_CACHE_TTL = int(os.getenv("SEATABLE_METADATA_CACHE_TTL", "3600"))
+
+    # Файл с копиями кешированных таблиц и метаданных (пусто — не сохранять) и их максимальный возраст (сек)
+    SEATABLE_SNAPSHOT_FILE = os.getenv("SEATABLE_SNAPSHOT_FILE", "../data/seatable_snapshot.sqlite3")
+    SEATABLE_SNAPSHOT_MAX_AGE = int(os.getenv("SEATABLE_SNAPSHOT_MAX_AGE", "604800"))
+
+    # Слушатель изменений баз по сокету SeaTable: включен ли, TTL кеша таблиц, пока сокет подключен (сек),
+    # путь и версия протокола Socket.IO (Engine.IO 3 или 4), максимальная пауза между переподключениями (сек)
+    SEATABLE_CHANGE_LISTENER = os.getenv("SEATABLE_CHANGE_LISTENER", "false").lower() in ("1", "true", "yes")
+    SEATABLE_PUSH_CACHE_TTL = int(os.getenv("SEATABLE_PUSH_CACHE_TTL", "21600"))
+    SEATABLE_SOCKET_PATH = os.getenv("SEATABLE_SOCKET_PATH", "socket.io")
+    SEATABLE_SOCKET_EIO = os.getenv("SEATABLE_SOCKET_EIO", "4")
+    SEATABLE_SOCKET_RECONNECT_MAX = float(os.getenv("SEATABLE_SOCKET_RECONNECT_MAX", "60"))
+
+    # Устойчивость запросов к SeaTable: число попыток и паузы между ними (сек), предел ожидания по Retry-After
+    SEATABLE_RETRY_ATTEMPTS = int(os.getenv("SEATABLE_RETRY_ATTEMPTS", "4"))
+    SEATABLE_RETRY_BASE_DELAY = float(os.getenv("SEATABLE_RETRY_BASE_DELAY", "0.5"))
+    SEATABLE_RETRY_MAX_DELAY = float(os.getenv("SEATABLE_RETRY_MAX_DELAY", "10"))
+    SEATABLE_RETRY_AFTER_MAX = float(os.getenv("SEATABLE_RETRY_AFTER_MAX", "60"))
+    # Квота запросов на одну базу в минуту и допустимый всплеск
+    SEATABLE_RATE_LIMIT_PER_MINUTE = float(os.getenv("SEATABLE_RATE_LIMIT_PER_MINUTE", "300"))
+    SEATABLE_RATE_LIMIT_BURST = int(os.getenv("SEATABLE_RATE_LIMIT_BURST", "30"))
+    # Предохранитель: сколько сбоев подряд его размыкают и через сколько секунд пробовать снова
+    SEATABLE_CIRCUIT_THRESHOLD = int(os.getenv("SEATABLE_CIRCUIT_THRESHOLD", "5"))
+    SEATABLE_CIRCUIT_RESET_TIMEOUT = float(os.getenv("SEATABLE_CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # Фоновые задачи (1С, роли, пульс-опросы): сколько запросов к SeaTable одновременно, сколько секунд максимум
+    # уступать запросам пользователей и сколько токенов квоты оставлять пользователям
+    SEATABLE_BACKGROUND_CONCURRENCY = int(os.getenv("SEATABLE_BACKGROUND_CONCURRENCY", "2"))
+    SEATABLE_BACKGROUND_MAX_WAIT = float(os.getenv("SEATABLE_BACKGROUND_MAX_WAIT", "2"))
+    SEATABLE_INTERACTIVE_RESERVE = int(os.getenv("SEATABLE_INTERACTIVE_RESERVE", "10"))
+
+    # Запись и воспроизведение ответов SeaTable для замеров: режим (record, replay или пусто), каталог записей,
+    # задержка при воспроизведении (original — как при записи, zero — без задержки), колонки для маскировки
+    SEATABLE_REPLAY_MODE = os.getenv("SEATABLE_REPLAY_MODE", "")
+    SEATABLE_REPLAY_DIR = os.getenv("SEATABLE_REPLAY_DIR", "../data/seatable_replay")
+    SEATABLE_REPLAY_TIMING = os.getenv("SEATABLE_REPLAY_TIMING", "original")
+    SEATABLE_REPLAY_MASK_COLUMNS = os.getenv(
+        "SEATABLE_REPLAY_MASK_COLUMNS", "FIO,Phone,Phone_private,Email,Name/Department"
+    )
+
+    # Общий кеш в Redis для нескольких процессов бота: адрес (пусто — только память процесса,
+    # fakeredis:// — Redis в памяти для тестов), префикс ключей, время ожидания блокировки загрузки (сек)
+    REDIS_URL = os.getenv("REDIS_URL", "")
+    REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "mavis-bot")
+    REDIS_LOCK_TIMEOUT = float(os.getenv("REDIS_LOCK_TIMEOUT", "10"))
+
+    # Хранилище состояний пользователей (меню, формы, поиск): memory, sqlite или redis (нужен REDIS_URL),
+    # файл для sqlite, сколько секунд хранить состояние без обращений, сколько состояний держать в памяти,
+    # через сколько секунд записывать накопленные изменения
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+    FSM_STATE_FILE = os.getenv("FSM_STATE_FILE", "../data/fsm_state.sqlite3")
+    FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
+    FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "5000"))
+    FSM_FLUSH_DELAY = float(os.getenv("FSM_FLUSH_DELAY", "1"))
+    # Сколько последних переходов по меню помнить для кнопки "Назад"
+    FSM_HISTORY_LIMIT = int(os.getenv("FSM_HISTORY_LIMIT", "20"))
+
+    # Повторное нажатие той же inline-кнопки пользователем в течение стольких секунд не обрабатывается
+    UPDATE_DUPLICATE_WINDOW = float(os.getenv("UPDATE_DUPLICATE_WINDOW", "1.5"))
@@ -1,14 +1,25 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import SimpleEventIsolation
 
 from config import Config
+from app.seatable_api.api_client import seatable_client
+from app.seatable_api.api_base import warm_start_caches
+from app.seatable_api.snapshot_store import snapshot_store
+from app.seatable_api.change_listener import change_listener
 from app.services.sync_1c import start_sync_scheduler
 from app.services.pulse_sender import start_pulse_sender_scheduler
+from app.services.users_replica import run_users_replica_refresher
+from app.services.cache import run_user_cache_refresher
+from app.services.shared_cache import close_shared_cache
+from app.services.fsm import state_manager
 
 
 from telegram import custom_logging
 from telegram.bot_menu import set_main_menu
+from telegram.middlewares import StateSnapshotMiddleware, DuplicateTapMiddleware
+from telegram.fsm_storage import StateManagerStorage
 from telegram.handlers import handler_ats, handler_form, handler_table, handler_base, handler_broadcast, \
     handler_checkout_roles, handler_bc_schedule, handler_exit_pulse
 
@@ -19,16 +30,35 @@ async def main():
     logger = logging.getLogger(__name__)
     logger.info("Запуск бота...")
 
-    # Инициализация бота и диспетчера
+    # Инициализация бота и диспетчера. FSMContext aiogram хранит состояния там же, где state_manager.
+    # Обновления одного пользователя обрабатываются по очереди — до чтения состояния FSM, а не после
     bot = Bot(token=Config.BOT_TOKEN)
-    dp = Dispatcher()
+    dp = Dispatcher(storage=StateManagerStorage(), events_isolation=SimpleEventIsolation())
 
-    # Планировщик синхронизации бота с данными пользователей из 1С + рассылки пульс-опросов
+    # Общий пул соединений к SeaTable на все время работы бота
+    await seatable_client.start()
+
+    # Кеши таблиц из сохраненных копий — первые запросы не ждут SeaTable
+    await warm_start_caches()
+
+    # Планировщик синхронизации бота с данными пользователей из 1С + рассылки пульс-опросов + обновление копии таблицы пользователей
+    # + заполнение кешей доступа и ролей
     scheduler_tasks = [
         asyncio.create_task(start_sync_scheduler()),
-        asyncio.create_task(start_pulse_sender_scheduler(bot))
+        asyncio.create_task(start_pulse_sender_scheduler(bot)),
+        asyncio.create_task(run_users_replica_refresher()),
+        asyncio.create_task(run_user_cache_refresher())
     ]
 
+    # Сброс кешей по уведомлениям SeaTable об изменениях
+    if Config.SEATABLE_CHANGE_LISTENER:
+        scheduler_tasks.append(asyncio.create_task(change_listener.run()))
+
+    # Повторные нажатия кнопок пропускаются.
+    # Состояние пользователя читается один раз на обновление и записывается после обработки
+    dp.update.outer_middleware(DuplicateTapMiddleware(Config.UPDATE_DUPLICATE_WINDOW))
+    dp.update.outer_middleware(StateSnapshotMiddleware())
+
     # Регистрация роутеров
     dp.include_router(handler_checkout_roles.router)
     dp.include_router(handler_broadcast.router)
@@ -47,6 +77,12 @@ async def main():
         # Останавливаем планировщики
         for task in scheduler_tasks:
             task.cancel()
+
+        # Дописываем состояния пользователей и копии таблиц на диск и закрываем соединения с SeaTable
+        await state_manager.flush()
+        await snapshot_store.flush()
+        await seatable_client.close()
+        await close_shared_cache()
         logger.info("Бот и планировщики остановлены")
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DEFAULT_DESTINY
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.services.fsm import state_manager
+
+logger = logging.getLogger(__name__)
+
+
+class StateManagerStorage(BaseStorage):
+    """
+    Хранилище FSMContext aiogram поверх state_manager: состояния и данные FSMContext лежат в той же записи
+    пользователя, что и меню с формами, вытесняются и сохраняются (SQLite, Redis) вместе с ними.
+    Ключи личного чата с пользователем идут в state_manager, остальные (группы, темы, бизнес-чаты,
+    другие destiny) — в память процесса, как в MemoryStorage
+    """
+
+    def __init__(self):
+        self._other = MemoryStorage()
+
+    @staticmethod
+    def _user_id(key: StorageKey) -> Optional[int]:
+        if (key.chat_id == key.user_id and key.thread_id is None and key.business_connection_id is None
+                and key.destiny == DEFAULT_DESTINY):
+            return key.user_id
+        return None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        user_id = self._user_id(key)
+        if user_id is None:
+            return await self._other.set_state(key, state)
+        await state_manager.set_aiogram_state(user_id, state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        user_id = self._user_id(key)
+        if user_id is None:
+            return await self._other.get_state(key)
+        return await state_manager.get_aiogram_state(user_id)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        user_id = self._user_id(key)
+        if user_id is None:
+            return await self._other.set_data(key, data)
+        await state_manager.set_aiogram_data(user_id, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        user_id = self._user_id(key)
+        if user_id is None:
+            return await self._other.get_data(key)
+        return await state_manager.get_aiogram_data(user_id)
+
+    async def close(self) -> None:
+        await state_manager.flush()
+        await self._other.close()
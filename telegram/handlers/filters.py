@@ -1,25 +1,31 @@
+from typing import Any, Dict, Optional
+
 from aiogram.filters import Filter
 from aiogram import types
 
 from app.services.fsm import state_manager, AppStates
 
 
+async def _current_state(message: types.Message, user_state: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Состояние из StateSnapshotMiddleware, а без нее — из state_manager"""
+    if user_state is None:
+        user_state = await state_manager.get_data(message.from_user.id)
+    return user_state.get('current_state')
+
+
 class FormFilter(Filter):
     def __init__(self, state: str):
         self.state = state
 
-    async def __call__(self, message: types.Message) -> bool:
-        data = await state_manager.get_data(message.from_user.id)
-        return data.get('current_state') == self.state
+    async def __call__(self, message: types.Message, user_state: Optional[Dict[str, Any]] = None) -> bool:
+        return await _current_state(message, user_state) == self.state
 
 
 class NameSearchFilter(Filter):
-    async def __call__(self, message: types.Message) -> bool:
-        user_data = await state_manager.get_data(message.from_user.id)
-        return user_data.get('current_state') == AppStates.WAITING_FOR_NAME_SEARCH
+    async def __call__(self, message: types.Message, user_state: Optional[Dict[str, Any]] = None) -> bool:
+        return await _current_state(message, user_state) == AppStates.WAITING_FOR_NAME_SEARCH
 
 
 class SearchTypeFilter(Filter):
-    async def __call__(self, message: types.Message) -> bool:
-        user_data = await state_manager.get_data(message.from_user.id)
-        return user_data.get('current_state') == AppStates.WAITING_FOR_SEARCH_TYPE
\ No newline at end of file
+    async def __call__(self, message: types.Message, user_state: Optional[Dict[str, Any]] = None) -> bool:
+        return await _current_state(message, user_state) == AppStates.WAITING_FOR_SEARCH_TYPE
@@ -4,7 +4,7 @@ from aiogram import Router, types, F
 from aiogram.filters import CommandStart
 from aiogram.types import ReplyKeyboardRemove
 
-from app.services.cache import user_access_cache, user_role_cache
+from app.services.cache import remember_user_access, lookup_user, forget_denied_user
 from app.services.utils import normalize_phone
 from app.services.fsm import state_manager, AppStates
 from app.seatable_api.api_auth import register_id_messenger, check_id_messenger
@@ -29,8 +29,8 @@ async def cmd_start(message: types.Message):
     user_id = message.from_user.id
     logger.info(f"Пользователь {user_id} нажал кнопку Старт")
 
-    # Проверяем, есть ли пользователь с таким id_telegram
-    has_access, current_role = await check_id_messenger(user_id)
+    # Проверяем, есть ли пользователь с таким id_telegram (недавний отказ берется из кеша)
+    has_access, current_role = await lookup_user(user_id)
     logger.info(f"Пользователь {user_id} авторизован: {has_access}, роль: {current_role}")
 
     if has_access:
@@ -58,6 +58,9 @@ async def handle_contact(message: types.Message):
     contact = message.contact
     user_id = message.from_user.id
 
+    # Пользователь регистрируется — прежний отказ больше не действует
+    forget_denied_user(user_id)
+
     normalized_phone = normalize_phone(contact.phone_number)
     logger.info(f"Пользователь {user_id} прислал номер: {contact.phone_number} (нормализован: {normalized_phone})")
 
@@ -72,8 +75,7 @@ async def handle_contact(message: types.Message):
         # Получаем актуальную роль после регистрации
         has_access, current_role = await check_id_messenger(user_id)
 
-        user_access_cache[user_id] = True
-        user_role_cache[user_id] = current_role
+        await remember_user_access(user_id, current_role)
 
         # После успешной регистрации запускаем навигацию с актуальной ролью
         await start_navigation(message=message, current_role=current_role)
@@ -10,6 +10,7 @@ from aiogram.fsm.state import State, StatesGroup
 from app.seatable_api.api_base import fetch_table
 from config import Config
 from app.services.broadcast import is_user_admin
+from app.services.users_replica import users_replica
 from telegram.handlers.handler_base import start_navigation
 from telegram.content import prepare_telegram_message
 
@@ -31,37 +32,13 @@ def normalize_search_query(query: str) -> List[str]:
 async def search_users_by_fio(search_query: str) -> List[Dict]:
     """Ищет пользователей по ФИО в таблице пользователей"""
     try:
-        # Получаем данные пользователей
-        users = await fetch_table(
-            table_id=Config.SEATABLE_USERS_TABLE_ID,
-            app='USER'
-        )
-
-        if not users:
-            return []
-
         # Нормализуем запрос
         query_words = normalize_search_query(search_query)
         if not query_words:
             return []
 
-        results = []
-
-        for user in users:
-            fio = user.get('FIO', '').lower()
-            if not fio:
-                continue
-
-            # Для одного слова
-            if len(query_words) == 1:
-                if query_words[0] in fio:
-                    results.append(user)
-
-            # Для двух слов (имя + фамилия в любом порядке)
-            elif len(query_words) >= 2:
-                w1, w2 = query_words[0], query_words[1]
-                if f"{w1} {w2}" in fio or f"{w2} {w1}" in fio:
-                    results.append(user)
+        # Ищем по ФИО в копии таблицы пользователей
+        results = await users_replica.search_by_fio(query_words)
 
         logger.info(f"По запросу '{search_query}' найдено {len(results)} пользователей")
         return results
@@ -5,7 +5,8 @@ from typing import List, Dict, Optional, Tuple
 from aiogram import Router, types, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
-from app.services.forms import start_form_questions, complete_form
+from app.services.forms import start_form_questions, complete_form, get_form_definition, FormDefinition, \
+    FormProgress
 from app.services.fsm import state_manager, AppStates
 from app.seatable_api.api_forms import save_form_answers
 
@@ -18,7 +19,7 @@ router = Router()
 logger = logging.getLogger(__name__)
 
 
-async def process_form(table_data: List[Dict], message: Message) -> Tuple[Dict, None]:
+async def process_form(table_id: str, table_data: List[Dict], message: Message) -> Tuple[Dict, None]:
     """Обрабатывает данные формы"""
     logger.info("Начало обработки формы обратной связи")
 
@@ -34,7 +35,7 @@ async def process_form(table_data: List[Dict], message: Message) -> Tuple[Dict,
         return {"text": "Ошибка: форма не настроена правильно"}, None
 
     # Инициализируем состояние формы через state_manager
-    form_data = await start_form_questions(table_data)
+    form_data = await start_form_questions(table_id, table_data)
     await state_manager.update_data(
         message.chat.id,
         form_data=form_data,
@@ -59,27 +60,25 @@ async def process_form(table_data: List[Dict], message: Message) -> Tuple[Dict,
 
     # Задержка перед первым вопросом, чтобы постился после инфо
     await asyncio.sleep(0.5)
-    await ask_next_question(message, form_data)
+    await ask_next_question(message, await get_form_definition(table_id, form_data.version), form_data)
 
     return {"text": ""}, None  # Возвращаем пустой словарь
 
 
-async def get_form_question(form_state: Dict) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+async def get_form_question(definition: FormDefinition,
+                            form_state: FormProgress) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
     """Возвращает текущий вопрос формы и клавиатуру (если нужно)"""
-    question_data = form_state['questions'][form_state['current_question']]
-    question_text = question_data['Name']
+    question_data = definition.questions[form_state.current_question]
+    question_text = question_data.name
 
-    # Определяем, есть ли варианты ответа (ищем все ключи, начинающиеся на Answer_option_)
-    answer_options = {
-        k: v for k, v in question_data.items()
-        if k.startswith('Answer_option_') and v is not None
-    }
+    # Варианты ответа (колонки Answer_option_*) разобраны в FormDefinition
+    answer_options = question_data.options
 
     keyboard_buttons = []
 
     # Если есть варианты ответа, добавляем их
-    if not question_data.get('Free_input', False) and answer_options:
-        for opt in answer_options.values():
+    if not question_data.free_input and answer_options:
+        for opt in answer_options:
             keyboard_buttons.append([InlineKeyboardButton(text=opt, callback_data=f"form_opt:{opt}")])
 
     keyboard_buttons.append([InlineKeyboardButton(
@@ -90,16 +89,16 @@ async def get_form_question(form_state: Dict) -> Tuple[str, Optional[InlineKeybo
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
     # Если Free_input явно указан как True или есть варианты ответа
-    if question_data.get('Free_input', False) is True or not answer_options:
+    if question_data.free_input is True or not answer_options:
         return question_text, keyboard
 
     return question_text, keyboard
 
 
-async def ask_next_question(message: Message, form_data: Dict):
+async def ask_next_question(message: Message, definition: FormDefinition, form_data: FormProgress):
     """Задает следующий вопрос формы"""
     user_id = message.chat.id
-    question_text, keyboard = await get_form_question(form_data)
+    question_text, keyboard = await get_form_question(definition, form_data)
 
     # Отправляем вопрос в чат
     if keyboard:
@@ -108,12 +107,31 @@ async def ask_next_question(message: Message, form_data: Dict):
         sent_message = await message.answer(question_text)
 
     # Сохраняем ID отправленного вопроса для последующего редактирования
-    form_data['last_question_message_id'] = sent_message.message_id
+    form_data.last_question_message_id = sent_message.message_id
 
     await state_manager.update_data(user_id, form_data=form_data)
     return sent_message
 
 
+async def get_pinned_definition(message: Message, form_data: FormProgress) -> Optional[FormDefinition]:
+    """
+    Форма той версии, на которой пользователь начал прохождение.
+    Если форму изменили, а старой версии уже нет в памяти, ответы не совпадут с вопросами —
+    начинаем прохождение заново по новой версии и возвращаем None
+    """
+    definition = await get_form_definition(form_data.form_id, form_data.version)
+    if definition is None or definition.version == form_data.version:
+        return definition
+
+    logger.info(f"Форма {form_data.form_id} изменилась во время прохождения пользователем {message.chat.id}, "
+                f"начинаем заново")
+    restarted = FormProgress(definition.form_id, definition.version)
+    await state_manager.update_data(message.chat.id, form_data=restarted)
+    await message.answer("Форма изменилась, пока вы ее заполняли. Пожалуйста, ответьте на вопросы заново.")
+    await ask_next_question(message, definition, restarted)
+    return None
+
+
 @router.message(F.text, F.content_type == 'text', FormFilter('form_data'))
 async def handle_text_answer(message: types.Message):
     """Обрабатывает текстовые ответы в форме обратной связи"""
@@ -124,48 +142,46 @@ async def handle_text_answer(message: types.Message):
     user_data = await state_manager.get_data(user_id)
 
     # Дополнительная проверка на наличие form_data
-    if 'form_data' not in user_data:
+    form_data = user_data.get('form_data')
+    if form_data is None:
         return
 
-    form_data = user_data['form_data'].copy()
-    current_question = form_data['current_question']
+    definition = await get_pinned_definition(message, form_data)
+    if definition is None:
+        return
+    current_question = form_data.current_question
 
     # Проверяем, ожидаем ли мы текстовый ответ
-    if current_question >= len(form_data['questions']):
+    if current_question >= len(definition.questions):
         return
 
-    question_data = form_data['questions'][current_question]
-    answer_options = {
-        k: v for k, v in question_data.items()
-        if k.startswith('Answer_option_') and v is not None
-    }
-
-    if question_data.get('Free_input', False) is False and answer_options:
+    question_data = definition.questions[current_question]
+    if question_data.free_input is False and question_data.options:
         return  # Пропускаем, если это вопрос с вариантами
 
     # Сохраняем ответ
-    form_data['answers'].append(message.text)
-    form_data['current_question'] += 1
+    form_data.answers.append(message.text)
+    form_data.current_question += 1
 
     # Обновляем данные через state_manager
     await state_manager.update_data(user_id, form_data=form_data)
 
     # Удаляем предыдущее сообщение с кнопками (если есть)
-    if form_data.get('last_question_message_id'):
+    if form_data.last_question_message_id:
         try:
             await message.bot.edit_message_reply_markup(
                 chat_id=user_id,
-                message_id=form_data['last_question_message_id'],
+                message_id=form_data.last_question_message_id,
                 reply_markup=None
             )
         except:
             pass
 
-    if form_data['current_question'] >= len(form_data['questions']):
-        await finish_form(message, form_data)
+    if form_data.current_question >= len(definition.questions):
+        await finish_form(message, definition, form_data)
         await state_manager.update_data(user_id, form_data=None, current_state=AppStates.CURRENT_MENU)
     else:
-        await ask_next_question(message, form_data)
+        await ask_next_question(message, definition, form_data)
 
 
 @router.callback_query(lambda c: c.data.startswith('form_opt:'))
@@ -176,20 +192,23 @@ async def handle_form_option(callback: types.CallbackQuery):
 
     # Проверяем состояние через state_manager
     user_data = await state_manager.get_data(user_id)
-    if user_data.get('current_state') != AppStates.FORM_DATA or 'form_data' not in user_data:
+    form_data = user_data.get('form_data')
+    if user_data.get('current_state') != AppStates.FORM_DATA or form_data is None:
         await callback.answer()
         return
 
-    form_data = user_data['form_data'].copy()
+    definition = await get_pinned_definition(callback.message, form_data)
+    if definition is None or form_data.current_question >= len(definition.questions):
+        await callback.answer()
+        return
     answer = callback.data.split(':', 1)[1]
 
     # Отправляем выбранный ответ в чат
-    question_text = form_data['questions'][form_data['current_question']]['Name']
     await callback.message.answer(f"Ваш ответ: «{answer}»")
 
     # Сохраняем ответ
-    form_data['answers'].append(answer)
-    form_data['current_question'] += 1
+    form_data.answers.append(answer)
+    form_data.current_question += 1
 
     # Обновляем данные через state_manager
     await state_manager.update_data(user_id, form_data=form_data)
@@ -201,43 +220,25 @@ async def handle_form_option(callback: types.CallbackQuery):
         pass
 
     # Переходим к следующему вопросу или завершаем
-    if form_data['current_question'] >= len(form_data['questions']):
-        await finish_form(callback.message, form_data)
+    if form_data.current_question >= len(definition.questions):
+        await finish_form(callback.message, definition, form_data)
         await state_manager.update_data(user_id, form_data=None, current_state=AppStates.CURRENT_MENU)
     else:
-        await ask_next_question(callback.message, form_data)
+        await ask_next_question(callback.message, definition, form_data)
     await callback.answer()
 
 
-async def finish_form(message: Message, form_data: Dict):
+async def finish_form(message: Message, definition: FormDefinition, form_data: FormProgress):
     """Завершает форму, сохраняет результат и показывает кнопку меню"""
     user_id = message.chat.id
 
-    # Проверяем наличие обязательных полей
-    required_fields = ['answers', 'answers_table']
-    if any(field not in form_data for field in required_fields):
-        logger.error(
-            f"Некорректные данные формы. Отсутствуют поля: {[f for f in required_fields if f not in form_data]}")
-        await message.answer("Произошла ошибка при обработке формы")
-        return
-
-    # Нормализуем answers если нужно
-    if isinstance(form_data['answers'], str):
-        try:
-            import json
-            form_data['answers'] = json.loads(form_data['answers'])
-        except json.JSONDecodeError as e:
-            logger.error(f"Не удалось преобразовать answers: {e}")
-            await message.answer("Ошибка обработки ответов")
-            return
-
     # Завершаем форму и сохраняем результат
-    result = await complete_form(form_data, message.from_user.id)
+    result = await complete_form(definition, form_data, message.from_user.id)
     logger.info(f"Форма завершена: {result}")
 
     # Сохраняем ответы в таблицу
     save_success = await save_form_answers({
-        **form_data,
+        **result,
         "user_id": message.chat.id  # id пользователя в телеграме, не бота
     })
 
@@ -245,8 +246,8 @@ async def finish_form(message: Message, form_data: Dict):
     final_text = "Спасибо за обращение!"
     parse_mode = None
 
-    if form_data.get('final_message'):
-        content = prepare_telegram_message(form_data['final_message'])
+    if definition.final_message:
+        content = prepare_telegram_message(definition.final_message)
         final_text = content.get('text', final_text)
         parse_mode = content.get('parse_mode')
 
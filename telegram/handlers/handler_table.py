@@ -35,7 +35,7 @@ async def handle_table_menu(table_id: str, user_id: str, message: Message = None
 
         logger.info(f"Таблица {table_id} идентифицирована как форма")
         if message:
-            return await process_form(table_data, message)
+            return await process_form(table_id, table_data, message)
         else:
             logger.error(f"Ошибка инициализации формы")
             return {"text": "Ошибка инициализации формы"}, None
@@ -0,0 +1,87 @@
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+from cachetools import TTLCache
+
+from app.services.fsm import state_manager
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateTapMiddleware(BaseMiddleware):
+    """
+    Повторное нажатие той же inline-кнопки в пределах duplicate_window секунд от предыдущего
+    (или от конца его обработки) пропускается — только снимаем "часики" с кнопки.
+    Кнопка — это callback_data вместе с сообщением: "Назад" в новом сообщении — новое нажатие, а не повтор.
+    Обновления одного пользователя и так идут по очереди (SimpleEventIsolation в Dispatcher),
+    поэтому второе нажатие проверяется уже после того, как первое обработано
+    """
+
+    def __init__(self, duplicate_window: float, maxsize: int = 10000):
+        self.duplicate_window = duplicate_window
+        # Пользователь -> (кнопка, когда нажата или обработана)
+        self._last_callback = TTLCache(maxsize=maxsize, ttl=max(duplicate_window, 1))
+        self.duplicates = 0
+
+    @staticmethod
+    def _button(callback_query: CallbackQuery) -> Tuple[Any, str]:
+        """Кнопка: сообщение, к которому она прикреплена, и ее callback_data"""
+        message_id = callback_query.message.message_id if callback_query.message else callback_query.inline_message_id
+        return message_id, callback_query.data
+
+    def _is_duplicate(self, user_id: int, button: Tuple[Any, str]) -> bool:
+        last = self._last_callback.get(user_id)
+        now = time.monotonic()
+        self._last_callback[user_id] = (button, now)
+        return last is not None and last[0] == button and now - last[1] < self.duplicate_window
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        callback_query = event.callback_query if isinstance(event, Update) else None
+        if user is None or callback_query is None or not callback_query.data:
+            return await handler(event, data)
+
+        button = self._button(callback_query)
+        if self._is_duplicate(user.id, button):
+            self.duplicates += 1
+            logger.info(f"Повторное нажатие {callback_query.data} пользователем {user.id} пропущено")
+            try:
+                await callback_query.answer()
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на повторное нажатие: {e}")
+            return None
+
+        try:
+            return await handler(event, data)
+        finally:
+            self._last_callback[user.id] = (button, time.monotonic())
+
+
+class StateSnapshotMiddleware(BaseMiddleware):
+    """
+    Читает состояние пользователя один раз на обновление и кладет его в данные обработчика как user_state.
+    Фильтры сравнивают поля user_state вместо своих вызовов state_manager.get_data,
+    а изменения состояния за обновление уходят на запись один раз, после обработчика
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        async with state_manager.update_scope(user.id) as user_state:
+            data["user_state"] = user_state
+            return await handler(event, data)
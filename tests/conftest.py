@@ -0,0 +1,99 @@
+"""
+Общие фикстуры тестов.
+Настройки бота читаются из окружения при импорте config, поэтому окружение выставляется здесь, до импорта модулей
+бота: файлы токенов и состояний — во временном каталоге, копии таблиц не сохраняются, Redis не используется,
+SeaTable — фейковый сервер (app/seatable_api/fake_server.py) на свободном порту.
+"""
+import os
+import socket
+import tempfile
+
+import pytest
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+_TMP_DIR = tempfile.mkdtemp(prefix='mavis-bot-tests-')
+_PORT = _free_port()
+
+os.environ.update({
+    'SEATABLE_SERVER': f"http://127.0.0.1:{_PORT}",
+    'SEATABLE_TOKEN_CACHE_FILE': os.path.join(_TMP_DIR, 'seatable_tokens.json'),
+    'SEATABLE_SNAPSHOT_FILE': '',
+    'SEATABLE_REPLAY_MODE': '',
+    'SEATABLE_CHANGE_LISTENER': 'false',
+    'SEATABLE_RETRY_BASE_DELAY': '0.01',
+    'SEATABLE_RETRY_MAX_DELAY': '0.05',
+    'FSM_STORAGE': 'memory',
+    'FSM_STATE_FILE': os.path.join(_TMP_DIR, 'fsm_state.sqlite3'),
+    'REDIS_URL': '',
+})
+
+from config import Config  # noqa: E402
+from app.seatable_api import api_base  # noqa: E402
+from app.seatable_api.api_client import seatable_client  # noqa: E402
+from app.seatable_api.fake_server import start_fake_server  # noqa: E402
+from app.seatable_api.scheduler import request_scheduler  # noqa: E402
+from app.services.shared_cache import redis_connection  # noqa: E402
+
+
+def _reset_seatable_state() -> None:
+    """
+    Глобальные экземпляры клиента и кешей создаются при импорте и помнят токены, соединения и строки
+    предыдущего теста (и его цикл событий) — собираем их заново под текущий Config
+    """
+    if os.path.exists(Config.SEATABLE_TOKEN_CACHE_FILE):
+        os.remove(Config.SEATABLE_TOKEN_CACHE_FILE)
+    seatable_client.__init__()
+    request_scheduler.__init__()
+    api_base.token_manager.__init__(Config.SEATABLE_TOKEN_CACHE_FILE)
+    api_base.shared_tokens.forget_local()
+    api_base.table_cache.__init__()
+    api_base.metadata_cache.__init__()
+    api_base._inflight_reads.clear()
+
+
+@pytest.fixture
+async def seatable_state():
+    """Состояние клиента SeaTable с чистого листа"""
+    _reset_seatable_state()
+    yield
+    await seatable_client.close()
+
+
+@pytest.fixture
+async def fake_seatable(monkeypatch):
+    """Фейковый SeaTable с синтетическими базами (200 пользователей); Config бота направлен на него"""
+    runner, fake = await start_fake_server(port=_PORT, users=200)
+    for name, value in fake.env(os.environ['SEATABLE_SERVER']).items():
+        monkeypatch.setattr(Config, name, value)
+    _reset_seatable_state()
+    try:
+        yield fake
+    finally:
+        await seatable_client.close()
+        await runner.cleanup()
+
+
+@pytest.fixture
+def request_count(fake_seatable):
+    """Счетчик запросов к фейковому серверу на эндпоинты, путь которых кончается на path_suffix"""
+    def count(path_suffix: str) -> int:
+        return sum(n for route, n in fake_seatable.requests.items() if route.endswith(path_suffix))
+    return count
+
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    """Общий кеш поверх Redis в памяти (fakeredis://)"""
+    monkeypatch.setattr(redis_connection, 'url', 'fakeredis://')
+    monkeypatch.setattr(redis_connection, '_client', None)
+    monkeypatch.setattr(redis_connection, '_down_until', 0.0)
+    client = redis_connection.client()
+    yield client
+    await client.flushall()
+    await redis_connection.close()
@@ -0,0 +1,36 @@
+from config import Config
+from app.seatable_api.api_base import get_table_name
+from app.seatable_api.api_batch import batch_update_rows
+
+
+async def _users_table(fake_seatable):
+    # Токен и метаданные загружаем заранее, чтобы внедренные сбои касались только пакетной записи
+    await get_table_name(Config.SEATABLE_USERS_TABLE_ID, 'USER')
+    return fake_seatable.bases['USER'].tables[Config.SEATABLE_USERS_TABLE_ID]
+
+
+async def test_rejected_chunk_is_retried_row_by_row(fake_seatable, request_count):
+    table = await _users_table(fake_seatable)
+    row_ids = list(table.rows)[:3]
+    updates = [(row_ids[0], {'Position': 'Аналитик'}), ('missing-row', {'Position': 'Аналитик'}),
+               (row_ids[1], {'Position': 'Аналитик'})]
+
+    result = await batch_update_rows(Config.SEATABLE_USERS_TABLE_ID, updates, app='USER')
+
+    # 404 на пакет — SeaTable ничего не записал: по одной строке записываются все, кроме несуществующей
+    assert list(result.errors) == [1]
+    assert request_count('/batch-update-rows/') == 1 + len(updates)
+    assert table.rows[row_ids[0]]['Position'] == 'Аналитик'
+    assert table.rows[row_ids[1]]['Position'] == 'Аналитик'
+
+
+async def test_failed_chunk_is_not_replayed_after_server_error(fake_seatable, request_count):
+    table = await _users_table(fake_seatable)
+    updates = [(row_id, {'Position': 'Аналитик'}) for row_id in list(table.rows)[:3]]
+    fake_seatable.error_rate = 1.0
+
+    result = await batch_update_rows(Config.SEATABLE_USERS_TABLE_ID, updates, app='USER')
+
+    # После 503 пакет мог быть записан — по одной строке он не повторяется, неудачными считаются все строки
+    assert sorted(result.errors) == [0, 1, 2]
+    assert request_count('/batch-update-rows/') == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from config import Config
+from app.seatable_api.api_client import seatable_client, SeaTableUnavailable
+
+TOKEN_PATH = '/api/v2.1/dtable/app-access-token/'
+
+
+@pytest.fixture
+def urls(fake_seatable):
+    """Адреса фейкового сервера: запрос токена (GET) и строки базы HR (GET/POST)"""
+    server = Config.SEATABLE_SERVER
+    rows = f"{server}/dtable-server/api/v1/dtables/{fake_seatable.bases['HR'].uuid}/rows/"
+    return {'token': server + TOKEN_PATH, 'rows': rows}
+
+
+@pytest.fixture
+def breaker_config(monkeypatch):
+    """Предохранитель, который размыкается после двух сбоев на 0.1 сек"""
+    monkeypatch.setattr(Config, 'SEATABLE_CIRCUIT_THRESHOLD', 2)
+    monkeypatch.setattr(Config, 'SEATABLE_CIRCUIT_RESET_TIMEOUT', 0.1)
+    monkeypatch.setattr(Config, 'SEATABLE_RETRY_ATTEMPTS', 1)
+
+
+async def test_server_errors_are_retried_only_for_idempotent_requests(fake_seatable, urls, request_count):
+    fake_seatable.error_rate = 1.0
+
+    assert (await seatable_client.get(urls['token'])).status == 503
+    assert request_count(TOKEN_PATH) == Config.SEATABLE_RETRY_ATTEMPTS
+
+    assert (await seatable_client.post(urls['rows'], json={})).status == 503
+    assert request_count('/rows/') == 1
+
+
+async def test_rate_limited_post_is_retried_after_retry_after(fake_seatable, urls, request_count, monkeypatch):
+    monkeypatch.setattr(Config, 'SEATABLE_RETRY_AFTER_MAX', 0.01)
+    fake_seatable.rate_limit = 1
+    await seatable_client.get(urls['rows'])
+
+    # 429 значит, что SeaTable запрос не выполнил, — повторяется даже неидемпотентный POST
+    assert (await seatable_client.post(urls['rows'], json={})).status == 429
+    assert request_count('/rows/') == 1 + Config.SEATABLE_RETRY_ATTEMPTS
+    assert fake_seatable.rate_limited == Config.SEATABLE_RETRY_ATTEMPTS
+
+
+async def test_breaker_opens_and_closes_after_a_successful_probe(fake_seatable, urls, breaker_config,
+                                                                  request_count):
+    fake_seatable.error_rate = 1.0
+    for _ in range(2):
+        await seatable_client.get(urls['token'])
+    assert not seatable_client.is_available
+
+    # Разомкнутый предохранитель не пропускает запросы к SeaTable
+    with pytest.raises(SeaTableUnavailable):
+        await seatable_client.get(urls['token'])
+    assert request_count(TOKEN_PATH) == 2
+
+    fake_seatable.error_rate = 0.0
+    fake_seatable.latency = 0.05
+    await asyncio.sleep(0.15)
+
+    # Пока идет пробный запрос, остальные не отправляются
+    probe = asyncio.create_task(seatable_client.get(urls['token']))
+    await asyncio.sleep(0.01)
+    with pytest.raises(SeaTableUnavailable):
+        await seatable_client.get(urls['token'])
+
+    assert (await probe).status == 403
+    assert seatable_client.is_available
+
+
+async def test_cancelled_probe_is_released(fake_seatable, urls, breaker_config):
+    fake_seatable.error_rate = 1.0
+    for _ in range(2):
+        await seatable_client.get(urls['token'])
+    fake_seatable.error_rate = 0.0
+    await asyncio.sleep(0.15)
+
+    fake_seatable.latency = 1.0
+    probe = asyncio.create_task(seatable_client.get(urls['token']))
+    await asyncio.sleep(0.05)
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+
+    # Отмененная проба не держит предохранитель разомкнутым: следующий запрос становится новой пробой
+    fake_seatable.latency = 0.0
+    assert (await seatable_client.get(urls['token'])).status == 403
+    assert seatable_client.is_available
@@ -0,0 +1,96 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from config import Config
+from app.seatable_api.api_base import read_table, table_cache, metadata_cache, get_table_name, _APPS
+from app.seatable_api.change_listener import ChangeListener
+
+
+async def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "условие не выполнилось"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def listener(fake_seatable):
+    """Слушатель изменений, подключенный к сокетам всех баз фейкового сервера"""
+    change_listener = ChangeListener()
+    task = asyncio.create_task(change_listener.run())
+    await _wait_for(lambda: table_cache.push_apps == set(_APPS))
+    yield change_listener
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def _emit(listener: ChangeListener, app: str, operation: dict) -> None:
+    """Операция через /_fake/emit — как правка в интерфейсе SeaTable; ждем, пока слушатель ее применит"""
+    events = listener.events
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{Config.SEATABLE_SERVER}/_fake/emit",
+                                json={'app': app, 'operation': operation}) as response:
+            assert response.status == 200
+    await _wait_for(lambda: listener.events > events)
+
+
+async def test_row_delete_is_applied_to_cached_rows(listener, request_count):
+    menu = Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID
+    rows = await read_table(menu)
+    page_requests = request_count('/rows/')
+    deleted = rows[1]['_id']
+
+    await _emit(listener, 'HR', {'op_type': 'delete_row', 'table_id': menu, 'row_id': deleted})
+
+    rows_after = await read_table(menu)
+    assert [row['_id'] for row in rows_after] == [row['_id'] for row in rows if row['_id'] != deleted]
+    assert request_count('/rows/') == page_requests
+
+
+async def test_row_change_invalidates_cached_table(listener, request_count):
+    menu = Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID
+    users = Config.SEATABLE_USERS_TABLE_ID
+    await read_table(menu)
+    users_rows = await read_table(users, 'USER')
+    page_requests = request_count('/rows/')
+
+    await _emit(listener, 'HR', {'op_type': 'modify_row', 'table_id': menu, 'row_id': 'any', 'updated': {}})
+    await _emit(listener, 'USER', {'op_type': 'insert_row', 'table_id': users, 'row_data': {}})
+
+    # Обычная таблица перечитывается целиком, инкрементальная дочитывает дельту
+    await read_table(menu)
+    assert request_count('/rows/') > page_requests
+    page_requests = request_count('/rows/')
+    assert len(await read_table(users, 'USER')) == len(users_rows)
+    assert table_cache.delta_refreshes == 1
+    assert request_count('/rows/') == page_requests
+
+
+async def test_schema_change_invalidates_metadata(listener):
+    assert await get_table_name(Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID) is not None
+    loads = metadata_cache.loads
+
+    await _emit(listener, 'HR', {'op_type': 'insert_column', 'table_id': Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID,
+                                 'column': {'name': 'New'}})
+
+    assert await get_table_name(Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID) is not None
+    assert metadata_cache.loads == loads + 1
+
+
+async def test_disconnect_falls_back_to_short_ttl(listener, fake_seatable):
+    menu = Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID
+    await read_table(menu)
+    assert table_cache.ttl_for('HR', menu) == Config.SEATABLE_PUSH_CACHE_TTL
+
+    # Сервер рвет сокеты — изменения больше не приходят
+    for sockets in fake_seatable._sockets.values():
+        for ws in list(sockets):
+            await ws.close()
+    await _wait_for(lambda: 'HR' not in table_cache.push_apps)
+
+    assert table_cache.ttl_for('HR', menu) == Config.SEATABLE_MENU_CACHE_TTL
+    stale_hits = table_cache.stale_hits
+    await read_table(menu)
+    assert table_cache.stale_hits == stale_hits + 1
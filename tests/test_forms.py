@@ -0,0 +1,24 @@
+from unittest import mock
+
+from app.services import forms
+from app.services.forms import get_form_definition, start_form_questions
+
+FORM_ID = 'form'
+
+
+def _form(*questions):
+    return [{'Name': 'Info', 'Answers_table': 'answers'}] + [{'Name': question} for question in questions]
+
+
+async def test_started_form_keeps_its_version_after_edit(monkeypatch):
+    progress = await start_form_questions(FORM_ID, _form('Имя', 'Отдел'))
+
+    # HR добавил вопрос: новые прохождения идут по новой версии, начатое дозаполняется по старой
+    monkeypatch.setattr(forms, 'fetch_table', mock.AsyncMock(return_value=_form('Имя', 'Должность', 'Отдел')))
+    new_progress = await start_form_questions(FORM_ID, _form('Имя', 'Должность', 'Отдел'))
+
+    pinned = await get_form_definition(FORM_ID, progress.version)
+    assert [question.name for question in pinned.questions] == ['Имя', 'Отдел']
+    current = await get_form_definition(FORM_ID, new_progress.version)
+    assert [question.name for question in current.questions] == ['Имя', 'Должность', 'Отдел']
+
@@ -0,0 +1,41 @@
+from app.services.fsm import StateManager
+from app.services.state_storage import SQLiteStateStorage
+
+USER_ID = 42
+
+
+def _manager(path) -> StateManager:
+    """Новый StateManager поверх того же файла — как после перезапуска бота"""
+    return StateManager(ttl=3600, storage=SQLiteStateStorage(str(path), ttl=3600), flush_delay=0.01)
+
+
+async def test_clear_then_update_in_scope_does_not_restore_old_state(tmp_path):
+    path = tmp_path / 'fsm_state.sqlite3'
+    before = _manager(path)
+    await before.update_data(USER_ID, user_role='admin', current_menu='old-menu', search_query='Иванов')
+    await before.flush()
+
+    manager = _manager(path)
+    async with manager.update_scope(USER_ID):
+        await manager.clear(USER_ID)
+        # Очистка еще не записана — старое состояние не должно подняться из SQLite
+        await manager.update_data(USER_ID, current_menu='new-menu')
+        assert await manager.get_data(USER_ID) == {'current_menu': 'new-menu'}
+    await manager.flush()
+
+    assert await _manager(path).get_data(USER_ID) == {'current_menu': 'new-menu'}
+
+
+async def test_clear_in_scope_is_persisted(tmp_path):
+    path = tmp_path / 'fsm_state.sqlite3'
+    before = _manager(path)
+    await before.update_data(USER_ID, current_menu='old-menu')
+    await before.flush()
+
+    manager = _manager(path)
+    async with manager.update_scope(USER_ID):
+        await manager.clear(USER_ID)
+        assert await manager.get_data(USER_ID) == {}
+    await manager.flush()
+
+    assert await _manager(path).get_data(USER_ID) == {}
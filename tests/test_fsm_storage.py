@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import time
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from app.services.fsm import StateManager
+from app.services.state_storage import SQLiteStateStorage
+from telegram import fsm_storage
+from telegram.fsm_storage import StateManagerStorage
+
+BOT_ID = 1
+USER_ID = 42
+
+
+def _key(**kwargs) -> StorageKey:
+    return StorageKey(**{'bot_id': BOT_ID, 'chat_id': USER_ID, 'user_id': USER_ID, **kwargs})
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return tmp_path / 'fsm_state.sqlite3'
+
+
+@pytest.fixture
+def restart(state_file, monkeypatch):
+    """Новый state_manager поверх того же файла SQLite — как после перезапуска бота"""
+    def start() -> StateManager:
+        manager = StateManager(ttl=3600, storage=SQLiteStateStorage(str(state_file), ttl=3600), flush_delay=0.01)
+        monkeypatch.setattr(fsm_storage, 'state_manager', manager)
+        return manager
+    return start
+
+
+async def test_private_chat_state_survives_restart(restart):
+    manager = restart()
+    storage = StateManagerStorage()
+    await storage.set_state(_key(), 'Survey:age')
+    await storage.set_data(_key(), {'age': 30})
+    await manager.update_data(USER_ID, current_menu='menu-1')
+    await manager.flush()
+
+    restart()
+    storage = StateManagerStorage()
+    assert await storage.get_state(_key()) == 'Survey:age'
+    assert await storage.get_data(_key()) == {'age': 30}
+    assert (await fsm_storage.state_manager.get_data(USER_ID))['current_menu'] == 'menu-1'
+
+
+async def test_legacy_record_without_aiogram_fields_is_restored(restart, state_file):
+    # Запись из шести полей — сохранена до того, как в состоянии появились поля FSMContext
+    legacy = json.dumps(['employee', 'menu-1', None, ['0000'], None, {}])
+    with sqlite3.connect(state_file) as connection:
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS user_state (user_id INTEGER PRIMARY KEY, state TEXT NOT NULL, "
+            "saved_at REAL NOT NULL);"
+        )
+        connection.execute("INSERT OR REPLACE INTO user_state VALUES (?, ?, ?)", (USER_ID, legacy, time.time()))
+
+    manager = restart()
+    storage = StateManagerStorage()
+    assert await storage.get_state(_key()) is None
+    assert await storage.get_data(_key()) == {}
+    assert (await manager.get_data(USER_ID))['current_menu'] == 'menu-1'
+
+    await storage.set_state(_key(), 'Survey:age')
+    await manager.flush()
+    restart()
+    assert await StateManagerStorage().get_state(_key()) == 'Survey:age'
+
+
+@pytest.mark.parametrize('key', [
+    _key(chat_id=-100500),
+    _key(thread_id=7),
+    _key(destiny='other'),
+])
+async def test_non_private_keys_stay_in_memory(restart, key):
+    manager = restart()
+    storage = StateManagerStorage()
+    await storage.set_state(key, 'Group:step')
+    await storage.set_data(key, {'step': 1})
+
+    assert await storage.get_state(key) == 'Group:step'
+    assert await storage.get_data(key) == {'step': 1}
+    assert await manager.get_aiogram_state(USER_ID) is None
+    assert await manager.get_aiogram_data(USER_ID) == {}
+
+
+async def test_context_clear_in_update_scope_empties_state_and_data(restart):
+    manager = restart()
+    storage = StateManagerStorage()
+    context = FSMContext(storage=storage, key=_key())
+    await context.set_state('Survey:age')
+    await context.set_data({'age': 30})
+    await manager.flush()
+
+    manager = restart()
+    context = FSMContext(storage=StateManagerStorage(), key=_key())
+    async with manager.update_scope(USER_ID):
+        await context.clear()
+        assert await context.get_state() is None
+        assert await context.get_data() == {}
+    await manager.flush()
+
+    restart()
+    context = FSMContext(storage=StateManagerStorage(), key=_key())
+    assert await context.get_state() is None
+    assert await context.get_data() == {}
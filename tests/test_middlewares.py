@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from telegram.middlewares import DuplicateTapMiddleware
+
+USER = User(id=42, is_bot=False, first_name='Иван')
+
+
+def _tap(update_id: int, message_id: int, data: str = 'back') -> Update:
+    message = Message(message_id=message_id, date=datetime.now(), chat=Chat(id=USER.id, type='private'))
+    callback = CallbackQuery(id=str(update_id), from_user=USER, chat_instance='chat', data=data, message=message)
+    return Update(update_id=update_id, callback_query=callback)
+
+
+async def _run_taps(middleware: DuplicateTapMiddleware, *updates: Update) -> list:
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+
+    for update in updates:
+        await middleware(handler, update, {'event_from_user': USER})
+    return handled
+
+
+async def test_repeated_tap_on_the_same_button_is_dropped():
+    middleware = DuplicateTapMiddleware(duplicate_window=10)
+
+    assert await _run_taps(middleware, _tap(1, message_id=100), _tap(2, message_id=100)) == [1]
+    assert middleware.duplicates == 1
+
+
+async def test_same_data_on_a_new_message_is_handled():
+    middleware = DuplicateTapMiddleware(duplicate_window=10)
+
+    # "Назад" дважды подряд — по кнопкам двух разных сообщений, чтобы подняться на два уровня
+    assert await _run_taps(middleware, _tap(1, message_id=100), _tap(2, message_id=101)) == [1, 2]
+    assert middleware.duplicates == 0
+
+
+async def test_tap_after_the_window_is_handled():
+    middleware = DuplicateTapMiddleware(duplicate_window=0)
+
+    assert await _run_taps(middleware, _tap(1, message_id=100), _tap(2, message_id=100)) == [1, 2]
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from config import Config
+from app.services.pulse_sender import PulseSender
+
+
+@pytest.fixture
+def today_tasks(fake_seatable):
+    """Таблица задач, в которой пять опросов ждут отправки сегодня"""
+    table = fake_seatable.bases['PULSE'].tables[Config.SEATABLE_PULSE_TASKS_ID]
+    table.rows.clear()
+    for i in range(5):
+        table.put({'Name': f"snils-{i}", 'Type': '1_week', 'Status': 'waiting', 'Data_poll': date.today().isoformat()})
+    return table
+
+
+async def test_statuses_are_saved_before_the_run_ends(fake_seatable, today_tasks, monkeypatch):
+    monkeypatch.setattr(Config, 'PULSE_STATUS_BATCH_SIZE', 2)
+    sent = []
+    stuck = asyncio.Event()
+
+    async def send_single_pulse(self, task, poll_content):
+        if len(sent) == 4:
+            # Рассылка обрывается на пятой задаче, до финальной записи статусов
+            stuck.set()
+            await asyncio.Event().wait()
+        sent.append(task['_id'])
+        return True
+
+    monkeypatch.setattr(PulseSender, '_send_single_pulse', send_single_pulse)
+    monkeypatch.setattr(PulseSender, '_get_pulse_admins', lambda self: asyncio.sleep(0, []))
+
+    run = asyncio.create_task(PulseSender(bot=None).send_daily_pulses())
+    await asyncio.wait_for(stuck.wait(), 5)
+
+    # Статусы четырех отправленных задач уже записаны двумя пакетами — повторно они не уйдут
+    assert [today_tasks.rows[task_id]['Status'] for task_id in sent] == ['sent'] * 4
+
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
@@ -0,0 +1,40 @@
+import asyncio
+
+from app.seatable_api.api_base import coalesce
+from app.seatable_api.scheduler import background_priority
+
+KEY = ('rows', 'HR', 'menu')
+
+
+async def test_interactive_read_does_not_wait_for_background_load(seatable_state):
+    release = asyncio.Event()
+
+    async def slow_load():
+        await release.wait()
+        return 'фон'
+
+    with background_priority():
+        background = asyncio.create_task(coalesce(KEY, slow_load))
+    await asyncio.sleep(0)
+
+    # Фоновая загрузка пропускает всех вперед — пользователь запускает свою, а не ждет ее
+    assert await asyncio.wait_for(coalesce(KEY, lambda: asyncio.sleep(0, 'пользователь')), 1) == 'пользователь'
+    release.set()
+    assert await background == 'фон'
+
+
+async def test_background_read_joins_interactive_load(seatable_state):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'строки'
+
+    interactive = asyncio.create_task(coalesce(KEY, load))
+    await asyncio.sleep(0)
+    with background_priority():
+        assert await coalesce(KEY, load) == 'строки'
+
+    assert await interactive == 'строки'
+    assert len(calls) == 1
@@ -0,0 +1,53 @@
+import asyncio
+
+from config import Config
+from app.services.shared_cache import SharedCache
+
+
+async def test_value_set_by_one_process_is_read_by_another(fake_redis):
+    writer = SharedCache('test', ttl=60)
+    reader = SharedCache('test', ttl=60)
+    await writer.set(1, {'role': 'admin'})
+
+    assert await reader.get(1) == {'role': 'admin'}
+    assert await reader.get(1) == {'role': 'admin'}
+    assert reader.remote_hits == 1 and reader.local_hits == 1
+
+
+async def test_miss_returns_default_and_loads_once(fake_redis):
+    cache = SharedCache('test', ttl=60)
+    assert await cache.get('absent', 'default') == 'default'
+
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'value': 42}
+
+    results = await asyncio.gather(*(cache.get_or_load('key', loader) for _ in range(5)))
+    assert results == [{'value': 42}] * 5
+    assert len(calls) == 1
+    assert await SharedCache('test', ttl=60).get('key') == {'value': 42}
+
+
+async def test_value_expires_after_ttl(fake_redis):
+    cache = SharedCache('test', ttl=0.1, local_maxsize=0)
+    await cache.set('key', 'value')
+    assert await cache.get('key') == 'value'
+
+    await asyncio.sleep(0.2)
+    assert await cache.get('key') is None
+    assert await fake_redis.get(f"{Config.REDIS_KEY_PREFIX}:test:key") is None
+
+
+async def test_values_are_stored_as_compact_json(fake_redis):
+    cache = SharedCache('test', ttl=60)
+    value = {'fio': 'Иванов Иван', 'roles': ['admin', 'employee'], 'id': 7}
+    await cache.set('user', value)
+
+    raw = await fake_redis.get(f"{Config.REDIS_KEY_PREFIX}:test:user")
+    assert raw == '{"fio":"Иванов Иван","roles":["admin","employee"],"id":7}'
+
+    cache.forget_local()
+    assert await cache.get('user') == value
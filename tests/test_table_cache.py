@@ -0,0 +1,91 @@
+import asyncio
+
+from config import Config
+from app.seatable_api import api_base
+from app.seatable_api.api_base import read_table, table_cache
+from app.seatable_api.api_batch import BatchWriter, batch_update_rows
+
+
+async def test_cached_table_is_loaded_once(fake_seatable, request_count):
+    first = await read_table(Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID)
+    page_requests = request_count('/rows/')
+    second = await read_table(Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID)
+
+    assert first and first == second
+    assert request_count('/rows/') == page_requests
+    assert table_cache.misses == 1 and table_cache.hits == 1
+
+
+async def test_write_is_picked_up_by_delta_sync(fake_seatable, request_count):
+    users = Config.SEATABLE_USERS_TABLE_ID
+    assert table_cache.is_delta(users)
+
+    rows = await read_table(users, 'USER')
+    full_loads = request_count('/rows/')
+    row_id = rows[0]['_id']
+
+    result = await batch_update_rows(users, [(row_id, {'Department': 'Тестовый отдел'})], app='USER')
+    assert result.ok
+
+    # После записи чтение дожидается дельты по _mtime, а не загружает таблицу целиком
+    rows = await read_table(users, 'USER')
+    assert next(row for row in rows if row['_id'] == row_id)['Department'] == 'Тестовый отдел'
+    assert len(rows) == 200
+    assert request_count('/rows/') == full_loads
+    assert table_cache.delta_refreshes == 1
+
+
+async def test_load_started_before_write_is_not_cached(fake_seatable, monkeypatch):
+    menu = Config.SEATABLE_MAIN_MENU_EMPLOYEE_ID
+    row_id = next(iter(fake_seatable.bases['HR'].tables[menu].rows))
+    load_rows = api_base._load_rows
+    loaded, release = asyncio.Event(), asyncio.Event()
+
+    async def held_load_rows(table_id, app):
+        # Первая загрузка прочитала таблицу, но завершается только после записи
+        rows = await load_rows(table_id, app)
+        if not loaded.is_set():
+            loaded.set()
+            await release.wait()
+        return rows
+
+    monkeypatch.setattr(api_base, '_load_rows', held_load_rows)
+    early = asyncio.create_task(read_table(menu))
+    await loaded.wait()
+    await batch_update_rows(menu, [(row_id, {'Content': 'Изменено'})])
+
+    # Чтение после записи не присоединяется к загрузке, начатой до нее, и ее результат не попадает в кеш
+    rows = await asyncio.wait_for(read_table(menu), 5)
+    assert next(row for row in rows if row['_id'] == row_id)['Content'] == 'Изменено'
+    release.set()
+    assert next(row for row in await early if row['_id'] == row_id)['Content'] != 'Изменено'
+    rows = await read_table(menu)
+    assert next(row for row in rows if row['_id'] == row_id)['Content'] == 'Изменено'
+
+
+async def test_batch_writer_sends_chunks(fake_seatable, request_count):
+    table = fake_seatable.bases['HR'].tables[Config.BROADCAST_TABLE_ID]
+    rows_before = len(table.rows)
+
+    writer = BatchWriter(Config.BROADCAST_TABLE_ID, chunk_size=10)
+    futures = [await writer.append({'Name': f"Уведомление {i}"}) for i in range(25)]
+    await writer.flush()
+
+    assert all(future.result() for future in futures)
+    assert request_count('/batch-append-rows/') == 3
+    assert len(table.rows) == rows_before + 25
+
+
+async def test_failed_refresh_after_write_serves_stale_copy(fake_seatable):
+    users = Config.SEATABLE_USERS_TABLE_ID
+    rows = await read_table(users, 'USER')
+    await batch_update_rows(users, [(rows[0]['_id'], {'Department': 'Тестовый отдел'})], app='USER')
+
+    fake_seatable.error_rate = 1.0
+    assert len(await read_table(users, 'USER')) == len(rows)
+    assert table_cache.refresh_errors == 1
+
+    # Следующие чтения не ждут SeaTable: копия отдается сразу и обновляется в фоне
+    stale_hits = table_cache.stale_hits
+    assert len(await read_table(users, 'USER')) == len(rows)
+    assert table_cache.stale_hits == stale_hits + 1
@@ -0,0 +1,64 @@
+import json
+import asyncio
+
+import aiohttp
+
+from config import Config
+from app.seatable_api import api_base
+from app.seatable_api.api_base import get_base_token, token_manager, shared_tokens
+
+TOKEN_PATH = '/api/v2.1/dtable/app-access-token/'
+
+
+def _restart() -> None:
+    """Токены в памяти процесса пропадают, остается только файл"""
+    token_manager.__init__(Config.SEATABLE_TOKEN_CACHE_FILE)
+    shared_tokens.forget_local()
+
+
+async def _token_requests() -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{Config.SEATABLE_SERVER}/_fake/stats") as response:
+            stats = await response.json()
+    return sum(n for route, n in stats['requests'].items() if route.endswith(TOKEN_PATH))
+
+
+async def test_concurrent_callers_share_one_token_request(fake_seatable):
+    tokens = await asyncio.gather(*(get_base_token('USER') for _ in range(20)))
+
+    assert len({token['access_token'] for token in tokens}) == 1
+    assert await _token_requests() == 1
+
+
+async def test_saved_token_is_reused_after_restart(fake_seatable, request_count):
+    token = await get_base_token('HR')
+    _restart()
+
+    assert await get_base_token('HR') == token
+    assert request_count(TOKEN_PATH) == 1
+
+
+async def test_saved_token_is_skipped_after_api_key_change(fake_seatable, request_count, monkeypatch):
+    token = await get_base_token('HR')
+    fake_seatable.api_tokens['another-api-token'] = 'HR'
+    monkeypatch.setattr(Config, 'SEATABLE_API_APP_TOKEN', 'another-api-token')
+    _restart()
+
+    # Токен из файла выдан под прежний ключ — под новым он запрашивается заново
+    assert (await get_base_token('HR'))['access_token'] != token['access_token']
+    assert request_count(TOKEN_PATH) == 2
+
+
+async def test_expiring_token_is_refreshed_in_background(fake_seatable, request_count):
+    token = await get_base_token('PULSE')
+    saved = json.loads(open(Config.SEATABLE_TOKEN_CACHE_FILE, encoding='utf-8').read())
+    saved['PULSE']['timestamp'] -= api_base._TOKEN_TTL - Config.SEATABLE_TOKEN_REFRESH_MARGIN + 60
+    with open(Config.SEATABLE_TOKEN_CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(saved, f)
+    _restart()
+
+    # Токен скоро истечет: вызывающий сразу получает текущий, новый запрашивается в фоне
+    assert await get_base_token('PULSE') == token
+    await token_manager._entries['PULSE'].refresh_task
+    assert request_count(TOKEN_PATH) == 2
+    assert (await get_base_token('PULSE'))['access_token'] != token['access_token']
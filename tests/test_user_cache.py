@@ -0,0 +1,41 @@
+from unittest import mock
+
+from app.services import cache
+
+ACTIVE = 1001
+REVOKED = 1002
+NEWCOMER = 1003
+
+
+def _users(*user_ids):
+    return mock.AsyncMock(return_value=[{'ID_messenger': str(user_id), 'Role': 'employee'} for user_id in user_ids])
+
+
+async def test_stale_denial_does_not_hide_registered_user(monkeypatch):
+    check_id_messenger = mock.AsyncMock(return_value=(False, 'employee'))
+    monkeypatch.setattr(cache, 'check_id_messenger', check_id_messenger)
+    assert await cache.lookup_user(NEWCOMER) == (False, 'employee')
+
+    # Сотрудника зарегистрировали: после заполнения кешей /start пускает его, не дожидаясь конца отказа
+    monkeypatch.setattr(cache.users_replica, 'active_users', _users(ACTIVE, NEWCOMER))
+    await cache.prewarm_user_caches()
+
+    assert await cache.lookup_user(NEWCOMER) == (True, 'employee')
+    check_id_messenger.assert_awaited_once()
+
+
+async def test_revoked_user_loses_access_in_all_processes(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache.users_replica, 'active_users', _users(ACTIVE, REVOKED))
+    await cache.prewarm_user_caches()
+    assert await cache.check_user_cache(REVOKED)
+
+    # Сотрудника уволили: после следующего заполнения доступ не возвращается из общего кеша
+    monkeypatch.setattr(cache.users_replica, 'active_users', _users(ACTIVE))
+    check_id_messenger = mock.AsyncMock(return_value=(False, 'employee'))
+    monkeypatch.setattr(cache, 'check_id_messenger', check_id_messenger)
+    await cache.prewarm_user_caches()
+
+    assert await cache.shared_user_access.get(REVOKED) is None
+    assert await cache.shared_user_access.get(ACTIVE) == {'role': 'employee'}
+    assert not await cache.check_user_cache(REVOKED)
+    check_id_messenger.assert_awaited_once()